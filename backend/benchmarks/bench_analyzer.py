@@ -0,0 +1,83 @@
+"""
+Measures analyzer throughput against the stub Ollama server at several concurrency levels.
+
+Usage:
+    python benchmarks/bench_analyzer.py --items 200 --latency 0.05 --concurrency 1 4 16
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from storage.jsonl import legacy_records
+from stub_ollama import start_stub_server
+
+
+def synthetic_processed_data(n_items):
+    """Builds processed data with one post per ten comments"""
+    n_posts = max(1, n_items // 10)
+    posts = [
+        {
+            'id': f"p{i}",
+            'title': f"Post number {i} about the remaster review",
+            'created_UTC': 1700000000.0 + i,
+            'url': f"https://www.reddit.com/r/thelastofus/comments/p{i}/",
+            'score': 100 + i,
+        }
+        for i in range(n_posts)
+    ]
+    comments = [
+        {
+            'id': f"c{i}",
+            'body': f"Comment {i}: the pacing and story were great but combat felt repetitive",
+            'created_UTC': 1700000000.0 + i,
+            'score': 11 + i % 50,
+            'parent_id': f"p{i % n_posts}",
+            'parent_body': posts[i % n_posts]['title'],
+        }
+        for i in range(n_items - n_posts)
+    ]
+    return {'post_titles': posts, 'comment_bodies': comments}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sentiment analyzer against a stub Ollama server")
+    parser.add_argument("--items", type=int, default=200, help="Number of posts + comments to analyze")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per LLM call in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--fused", action="store_true", help="Also measure the single-call fused mode")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("analyzer", items=args.items, latency=args.latency)
+
+    server = start_stub_server(latency=args.latency)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    from sentiment_analysis import sentiment_analyzer
+    # Connect to the stub servers before timing, so the first run does not include creating the clients
+    sentiment_analyzer.get_pool()
+
+    records = list(legacy_records(synthetic_processed_data(args.items)))
+    baseline = None
+    modes = [False, True] if args.fused else [False]
+    print(f"\n{'mode':>6} {'concurrency':>11} {'seconds':>9} {'items/s':>9} {'speedup':>8}")
+    for fused, concurrency in [(fused, c) for fused in modes for c in args.concurrency]:
+        start = time.perf_counter()
+        analyzed = sentiment_analyzer.analyze_processed_data(records, concurrency, show_progress=False, fused=fused)
+        elapsed = time.perf_counter() - start
+        assert [r['id'] for r in analyzed] == [r['id'] for r in records], "output order changed"
+        throughput = len(analyzed) / elapsed
+        baseline = baseline or throughput
+        mode = 'fused' if fused else 'split'
+        print(f"{mode:>6} {concurrency:>11} {elapsed:>9.2f} {throughput:>9.1f} {throughput / baseline:>7.1f}x")
+        results.add({'mode': mode, 'concurrency': concurrency},
+                    seconds=elapsed, items_per_s=throughput, speedup=throughput / baseline)
+
+    server.shutdown()
+    results.write(args.json)
@@ -0,0 +1,122 @@
+"""
+Load-tests the query API in-process with and without the response cache.
+
+Requests go through httpx's ASGI transport, so no server or network is involved and
+the numbers are the cost of routing, building and serializing the responses.
+
+Usage:
+    python benchmarks/bench_api.py --items 100000 --requests 2000 --clients 16
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from api import main
+from api.data_store import DataStore
+from api.http_cache import ResponseCache
+from results import BenchmarkResults, add_json_argument
+from storage.jsonl import JsonlWriter
+from synthetic import synthetic_analyzed_records
+
+# The queries the frontend makes, plus a few heavier ones
+QUERIES = [
+    "/sentiment-analysis",
+    "/sentiment-analysis?start=2023-03-01&end=2023-06-30",
+    "/keywords?top_k=20",
+    "/keywords?top_k=20&sentiment=negative",
+    "/keywords",
+    "/top-posts?limit=20",
+    "/top-posts?limit=200&sentiment=positive",
+]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+
+async def run_load(n_requests, clients, revalidate=False):
+    """
+    Sends `n_requests` requests from `clients` concurrent clients
+
+    Returns:
+        tuple: Sorted latencies, latencies per query, and the elapsed seconds
+    """
+    latencies = []
+    by_query = {query: [] for query in QUERIES}
+    etags = {}
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        if revalidate:
+            for query in QUERIES:
+                etags[query] = (await client.get(query)).headers["etag"]
+
+        async def worker(offset):
+            for i in range(offset, n_requests, clients):
+                query = QUERIES[i % len(QUERIES)]
+                headers = {"If-None-Match": etags[query]} if revalidate else {}
+                start = time.perf_counter()
+                response = await client.get(query, headers=headers)
+                latency = time.perf_counter() - start
+                latencies.append(latency)
+                by_query[query].append(latency)
+                assert response.status_code == (304 if revalidate else 200), response.status_code
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(offset) for offset in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return sorted(latencies), {query: sorted(values) for query, values in by_query.items()}, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the API with and without the response cache")
+    parser.add_argument("--items", type=int, default=100000, help="Number of analyzed posts + comments")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--per-query", action="store_true", help="Also print the latency of each query")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("api", items=args.items, requests=args.requests, clients=args.clients)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = Path(tmp) / "analyzed_reddit_data.jsonl"
+        with JsonlWriter(data_file) as writer:
+            writer.write_all(synthetic_analyzed_records(args.items))
+        main.data_store = DataStore(data_file)
+        main.data_store.reload_if_changed()
+
+        modes = [
+            ("uncached", ResponseCache(max_bytes=0), False),
+            ("cached", ResponseCache(), False),
+            ("304", ResponseCache(), True),
+        ]
+        print(f"{'mode':>9} {'requests':>9} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+        for name, cache, revalidate in modes:
+            main.response_cache = cache
+            latencies, by_query, elapsed = asyncio.run(run_load(args.requests, args.clients, revalidate))
+            print(
+                f"{name:>9} {len(latencies):>9} {percentile(latencies, 0.5) * 1000:>8.2f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.2f} {len(latencies) / elapsed:>8.0f}"
+            )
+            results.add({'mode': name}, p50_ms=percentile(latencies, 0.5) * 1000,
+                        p99_ms=percentile(latencies, 0.99) * 1000, requests_per_s=len(latencies) / elapsed)
+            for query, query_latencies in by_query.items():
+                if not query_latencies:
+                    continue
+                if args.per_query:
+                    print(f"{'':>9} {len(query_latencies):>9} {percentile(query_latencies, 0.5) * 1000:>8.2f} "
+                          f"{percentile(query_latencies, 0.99) * 1000:>8.2f} {'':>8} {query}")
+                results.add({'mode': name, 'query': query}, p50_ms=percentile(query_latencies, 0.5) * 1000,
+                            p99_ms=percentile(query_latencies, 0.99) * 1000)
+
+    results.write(args.json)
@@ -0,0 +1,152 @@
+"""
+Kills a process appending to a JSONL file mid-record and checks that resuming loses nothing.
+
+A child process appends records to a checkpoint as the analyzer does, writes part of
+the next record's line, and is killed with SIGKILL, leaving the file without its
+final newline. The next child resumes from the checkpointed IDs. After every round
+the torn tail is counted, and once a last child has written every record, the
+checkpoint is compacted and each record is checked to be present and intact, as it
+was written. With `--file raw`, the child scrapes a fake Reddit client into the raw
+data file instead, and is killed after storing some of the submissions; the file
+must end up with every submission exactly once.
+
+Usage:
+    python benchmarks/bench_checkpoint.py --records 2000 --rounds 20
+    python benchmarks/bench_checkpoint.py --file raw --records 500 --rounds 20
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from fake_reddit import FakeReddit
+from results import BenchmarkResults, add_json_argument
+from scraping.reddit_scraper import load_job_spec, scrape
+from sentiment_analysis.checkpoint import checkpointed_ids, compact_checkpoint, open_checkpoint
+from storage.jsonl import iter_jsonl
+from synthetic import synthetic_submission
+
+
+def make_record(index, payload):
+    return {'id': f"item{index}", 'sentiment': "neutral", 'keywords': [], 'body': f"{index} " + "x" * payload}
+
+
+def tear(path, line):
+    """Appends half of `line` to `path` and kills this process, as a crash mid-write would"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line[:len(line) // 2])
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def write_checkpoint(path, records, payload, tear_after=None):
+    """Appends the records missing from the checkpoint; with `tear_after`, dies mid-line after that many"""
+    done = checkpointed_ids(path)
+    with open_checkpoint(path) as writer:
+        for index in range(records):
+            record = make_record(index, payload)
+            if record['id'] in done:
+                continue
+            if writer.count == tear_after:
+                tear(path, json.dumps(record) + "\n")
+            writer.write(record)
+
+
+def write_raw(path, records, tear_after=None):
+    """Scrapes the submissions missing from the raw data file; with `tear_after`, dies mid-line after that many"""
+    fixtures = {"thelastofus": [synthetic_submission(index, 5) for index in range(records)]}
+    job = dict(load_job_spec(), queries=[""], limit=records, submissions_per_minute=None, workers=1)
+    stored = 0
+
+    def on_post(reddit_post):
+        nonlocal stored
+        stored += 1
+        if stored == tear_after:
+            tear(path, json.dumps(reddit_post) + "\n")
+
+    reddit = FakeReddit(fixtures)
+    scrape(reddit, job, path, on_post=on_post, client_factory=reddit.clone)
+
+
+def verify_raw(path, records):
+    """Checks that the raw data file holds every submission once; returns how many are missing"""
+    ids = [submission['id'] for submission in iter_jsonl(path)]
+    assert len(ids) == len(set(ids)), "a submission was stored twice"
+    return records - len(ids)
+
+
+def verify_checkpoint(path, records, payload):
+    """Compacts the checkpoint and checks every record; returns how many are missing"""
+    output = path.with_name("analyzed_reddit_data.jsonl")
+    compact_checkpoint(path, output, [f"item{index}" for index in range(records)])
+    with open(output, encoding="utf-8") as f:
+        analyzed = [json.loads(line) for line in f]
+    lost = records - len({record['id'] for record in analyzed})
+    if not lost:
+        assert analyzed == [make_record(index, payload) for index in range(records)], "records changed"
+    return lost
+
+
+def torn(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark resuming a JSONL file after a kill mid-write")
+    parser.add_argument("--file", choices=("checkpoint", "raw"), default="checkpoint",
+                        help="Append to the analyzer checkpoint or scrape into the raw data file")
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=20, help="Children killed mid-write before the last one")
+    parser.add_argument("--payload", type=int, default=2000, help="Body characters per checkpoint record")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--tear-after", type=int, help=argparse.SUPPRESS)
+    add_json_argument(parser)
+    args = parser.parse_args()
+
+    if args.write:
+        if args.file == "raw":
+            write_raw(args.write, args.records, args.tear_after)
+        else:
+            write_checkpoint(args.write, args.records, args.payload, args.tear_after)
+        sys.exit()
+
+    results = BenchmarkResults("checkpoint", records=args.records, rounds=args.rounds, payload=args.payload)
+    rng = random.Random(args.seed)
+    command = [sys.executable, __file__, "--file", args.file, "--records", str(args.records),
+               "--payload", str(args.payload)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        name = "reddit_data.jsonl" if args.file == "raw" else "analyzed_reddit_data.checkpoint.jsonl"
+        path = Path(tmp) / name
+        torn_tails = 0
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            tear_after = rng.randint(1, max(1, args.records // (args.rounds + 1)))
+            child = subprocess.run(command + ["--write", str(path), "--tear-after", str(tear_after)],
+                                   capture_output=True)
+            assert child.returncode == -signal.SIGKILL, child.stderr.decode()
+            torn_tails += torn(path)
+        subprocess.run(command + ["--write", str(path)], capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+
+        assert not torn(path), f"{path.name} ends in an incomplete line"
+        lost = verify_raw(path, args.records) if args.file == "raw" else \
+            verify_checkpoint(path, args.records, args.payload)
+        assert lost == 0, f"{lost} records lost"
+
+    print(f"\n{'file':>10} {'rounds':>6} {'torn':>5} {'records':>8} {'lost':>5} {'seconds':>8}")
+    print(f"{args.file:>10} {args.rounds:>6} {torn_tails:>5} {args.records:>8} {lost:>5} {elapsed:>8.2f}")
+    results.add({'file': args.file, 'rounds': args.rounds}, torn_tails=torn_tails, lost=lost, seconds=elapsed)
+    results.write(args.json)
@@ -0,0 +1,76 @@
+"""
+Measures the comment tree flattener on synthetic wide, bushy and deep threads, and
+the whole clean stage, raw JSONL file to processed JSONL file, on corpora of growing size.
+
+Usage:
+    python benchmarks/bench_cleaner.py --comments 100000
+    python benchmarks/bench_cleaner.py --corpus 1000 100000 10000000 --max-depth 10
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from processing.data_cleaner import iter_processed_records
+from results import BenchmarkResults, add_json_argument
+from storage.jsonl import JsonlWriter, iter_records
+from synthetic import synthetic_corpus, synthetic_submission, write_corpus
+
+# name: (max_depth, reply_probability)
+SHAPES = {
+    "wide": (1, 0.0),
+    "bushy": (10, 0.6),
+    "deep": (10**9, 1.0),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the comment tree flattener")
+    parser.add_argument("--comments", type=int, default=100000, help="Comments in each synthetic thread")
+    parser.add_argument("--corpus", type=int, nargs="+", metavar="COMMENTS",
+                        help="Instead, clean raw corpus files with these total comment counts")
+    parser.add_argument("--max-depth", type=int, default=10, help="Reply depth of the corpus threads")
+    parser.add_argument("--comments-per-submission", type=int, default=500)
+    add_json_argument(parser)
+    args = parser.parse_args()
+
+    if args.corpus:
+        results = BenchmarkResults("cleaner_corpus", max_depth=args.max_depth,
+                                   comments_per_submission=args.comments_per_submission)
+        print(f"{'comments':>9} {'raw MB':>8} {'records':>9} {'seconds':>8} {'comments/s':>11}")
+        for n_comments in args.corpus:
+            with tempfile.TemporaryDirectory() as tmp:
+                raw_file = Path(tmp) / "reddit_data.jsonl"
+                write_corpus(synthetic_corpus(n_comments, args.comments_per_submission, args.max_depth), raw_file)
+
+                # What the clean stage does: stream the raw file, flatten, write the processed file
+                start = time.perf_counter()
+                with JsonlWriter(Path(tmp) / "processed_reddit_data.jsonl") as writer:
+                    records = writer.write_all(iter_processed_records(iter_records(raw_file)))
+                elapsed = time.perf_counter() - start
+                raw_mb = raw_file.stat().st_size / 1024 / 1024
+
+            print(f"{n_comments:>9} {raw_mb:>8.1f} {records:>9} {elapsed:>8.2f} {n_comments / elapsed:>11.0f}")
+            results.add({'comments': n_comments}, seconds=elapsed, comments_per_s=n_comments / elapsed)
+        results.write(args.json)
+        sys.exit()
+
+    results = BenchmarkResults("cleaner", comments=args.comments)
+    print(f"{'shape':>6} {'comments':>9} {'depth':>7} {'records':>8} {'seconds':>8} {'comments/s':>11}")
+    for name, (max_depth, reply_probability) in SHAPES.items():
+        submission = synthetic_submission(0, args.comments, max_depth, reply_probability)
+        depth = min(max_depth, args.comments)
+
+        start = time.perf_counter()
+        records = sum(1 for _ in iter_processed_records([submission], prune_filtered=False))
+        elapsed = time.perf_counter() - start
+
+        print(f"{name:>6} {args.comments:>9} {depth:>7} {records:>8} {elapsed:>8.3f} {args.comments / elapsed:>11.0f}")
+        results.add({'shape': name}, seconds=elapsed, comments_per_s=args.comments / elapsed)
+
+    results.write(args.json)
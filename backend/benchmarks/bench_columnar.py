@@ -0,0 +1,84 @@
+"""
+Compares loading the analyzed data from JSONL and from the mmapped columnar file.
+
+Each load runs in a fresh subprocess, so its peak RSS (Linux VmHWM) is measured on its own.
+
+Usage:
+    python benchmarks/bench_columnar.py --items 100000 1000000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from storage.columnar import ColumnarData, columnar_path, write_columnar
+from storage.jsonl import JsonlWriter, iter_records
+from storage.rollups import Rollups, rollups_path
+from synthetic import synthetic_analyzed_records
+
+
+def peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_load(path):
+    """Loads `path` into a SentimentDataModel in this process and returns the timing and peak RSS"""
+    from api.data_model import SentimentDataModel
+    from api.data_store import load_sentiment_data
+    from storage.rollups import load_rollups
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    data = load_sentiment_data(path)
+    model = SentimentDataModel(data, load_rollups(path, len(data)))
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'rss_mb': peak_rss_mb() - baseline, 'days': len(model.series['day'].starts)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSONL vs columnar loading of the analyzed data")
+    parser.add_argument("--items", type=int, nargs="+", default=[100000], help="Dataset sizes to measure")
+    parser.add_argument("--measure", type=Path, help=argparse.SUPPRESS)
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("columnar")
+
+    if args.measure:
+        print(json.dumps(measure_load(args.measure)))
+        sys.exit()
+
+    print(f"{'items':>9} {'format':>8} {'file MB':>8} {'load s':>7} {'RSS MB':>7}")
+    for n_items in args.items:
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl_file = Path(tmp) / "analyzed_reddit_data.jsonl"
+            with JsonlWriter(jsonl_file) as writer:
+                writer.write_all(synthetic_analyzed_records(n_items))
+            columns_file = columnar_path(jsonl_file)
+            write_columnar(iter_records(jsonl_file), columns_file)
+            # Saved by the analyzer alongside the data, as the API expects
+            Rollups.from_columns(ColumnarData.open(columns_file)).save(rollups_path(jsonl_file))
+
+            for name, path in (("jsonl", jsonl_file), ("columnar", columns_file)):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--measure", str(path)],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                size_mb = path.stat().st_size / 1024 / 1024
+                print(f"{n_items:>9} {name:>8} {size_mb:>8.1f} {result['seconds']:>7.2f} {result['rss_mb']:>7.1f}")
+                results.add({'items': n_items, 'format': name}, file_mb=size_mb, seconds=result['seconds'],
+                            rss_mb=result['rss_mb'])
+
+    results.write(args.json)
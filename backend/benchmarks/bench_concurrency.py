@@ -0,0 +1,209 @@
+"""
+Measures the tail latency of cheap requests while expensive ones are being built.
+
+The API runs under uvicorn in a subprocess and is queried over HTTP. Light clients
+repeat queries whose responses are cached; heavy clients at the same time send
+queries that are never cached (hourly timelines and keyword counts over random date
+ranges). With builds on the event loop (API_BUILD_THREADS=0) every light request
+waits for the heavy build in progress; with builds on the thread pool the loop keeps
+answering between GIL switches. Each thread count in `--threads` is measured, since
+more build threads contend for the GIL with the loop and with each other. Then bursts of identical uncached requests show how
+many requests coalescing lets share a build.
+
+Clients and server share the machine, so on few cores the numbers include the
+clients' own CPU use; compare the modes rather than the absolute latencies. The tail
+latencies of a single run vary by a few milliseconds, so use `--repeat` to compare
+medians.
+
+Usage:
+    python benchmarks/bench_concurrency.py --items 200000 --clients 4 --heavy-clients 2 --threads 1 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from storage.columnar import columnar_path, write_columnar
+from storage.jsonl import JsonlWriter, iter_records
+from synthetic import synthetic_analyzed_records
+
+LIGHT_QUERIES = ["/sentiment-analysis", "/keywords?top_k=20", "/top-posts?limit=20"]
+FIRST_DAY, LAST_DAY = 1670000000, 1670000000 + 365 * 86400
+
+
+def heavy_query(rng):
+    """A query over a random date range, so its response is never in the cache"""
+    start = rng.randint(FIRST_DAY, LAST_DAY - 90 * 86400)
+    end = start + rng.randint(30, 90) * 86400
+    return rng.choice([
+        f"/sentiment-analysis?granularity=hour&start_timestamp={start}&end_timestamp={end}&weighted=true",
+        f"/keywords?top_k=20&start_timestamp={start}&end_timestamp={end}",
+    ])
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[int(fraction * (len(sorted_values) - 1))] if sorted_values else 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(data_file, build_threads):
+    """Starts the API under uvicorn and waits until it has loaded the data; returns (process, base URL)"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(backend_dir / "src"),
+        "ANALYZED_DATA_FILE": str(data_file),
+        "API_BUILD_THREADS": str(build_threads),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/status").json()["snapshot_version"]:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The API did not start")
+
+
+async def mixed_load(base_url, light_requests, clients, heavy_clients):
+    """
+    Light clients send `light_requests` cached queries while heavy clients send uncached ones
+
+    Returns:
+        tuple: Sorted light latencies, sorted heavy latencies, elapsed seconds
+    """
+    light, heavy = [], []
+    done = asyncio.Event()
+    limits = httpx.Limits(max_connections=clients + heavy_clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as client:
+        for query in LIGHT_QUERIES:
+            assert (await client.get(query)).status_code == 200
+
+        async def light_client(offset):
+            for i in range(offset, light_requests, clients):
+                start = time.perf_counter()
+                response = await client.get(LIGHT_QUERIES[i % len(LIGHT_QUERIES)])
+                light.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.status_code
+
+        async def heavy_client(seed):
+            rng = random.Random(seed)
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get(heavy_query(rng))
+                heavy.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.status_code
+
+        heavy_tasks = [asyncio.create_task(heavy_client(seed)) for seed in range(heavy_clients)]
+        start = time.perf_counter()
+        await asyncio.gather(*(light_client(offset) for offset in range(clients)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*heavy_tasks)
+    return sorted(light), sorted(heavy), elapsed
+
+
+async def identical_burst(base_url, query, burst):
+    """Sends `burst` identical requests for an uncached response at once; returns sorted latencies"""
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=burst),
+                                 timeout=None) as client:
+        async def one():
+            start = time.perf_counter()
+            response = await client.get(query)
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - start
+        return sorted(await asyncio.gather(*(one() for _ in range(burst))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API tail latency under concurrent heavy queries")
+    parser.add_argument("--items", type=int, default=200000, help="Number of analyzed posts + comments")
+    parser.add_argument("--requests", type=int, default=2000, help="Light requests per mode")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent light clients")
+    parser.add_argument("--heavy-clients", type=int, default=2, help="Concurrent clients sending uncached queries")
+    parser.add_argument("--burst", type=int, default=32, help="Identical uncached requests sent at once")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4],
+                        help="API_BUILD_THREADS of the threaded servers; the bursts use the first")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per mode; the median of each measurement is reported")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("concurrency", items=args.items, requests=args.requests, clients=args.clients,
+                               heavy_clients=args.heavy_clients, burst=args.burst, repeat=args.repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = Path(tmp) / "analyzed_reddit_data.jsonl"
+        with JsonlWriter(data_file) as writer:
+            writer.write_all(synthetic_analyzed_records(args.items))
+        write_columnar(iter_records(data_file), columnar_path(data_file))
+
+        print(f"\nLight requests from {args.clients} clients, {args.heavy_clients} clients sending uncached queries"
+              f"{f', median of {args.repeat} runs' if args.repeat > 1 else ''}")
+        print(f"{'builds':>10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'req/s':>8} {'heavy':>6} {'heavy p50':>10}")
+        modes = [("on loop", 0)] + [(f"{threads} thread{'s' if threads > 1 else ''}", threads)
+                                    for threads in args.threads]
+        measured = {name: [] for name, _ in modes}
+        bursts = None
+        # The modes take turns, so a slow spell of the machine does not fall on one mode only
+        for _ in range(args.repeat):
+            for name, threads in modes:
+                process, base_url = start_server(data_file, threads)
+                try:
+                    light, heavy, elapsed = asyncio.run(
+                        mixed_load(base_url, args.requests, args.clients, args.heavy_clients)
+                    )
+                    if bursts is None and threads == args.threads[0]:
+                        rng = random.Random("burst")
+                        bursts = [asyncio.run(identical_burst(base_url, heavy_query(rng), args.burst))
+                                  for _ in range(3)]
+                        builds = httpx.get(f"{base_url}/status").json()["builds"]
+                finally:
+                    process.terminate()
+                    process.wait()
+                measured[name].append({
+                    'p50_ms': percentile(light, 0.5) * 1000, 'p99_ms': percentile(light, 0.99) * 1000,
+                    'max_ms': light[-1] * 1000, 'requests_per_s': len(light) / elapsed,
+                    'heavy_requests': len(heavy), 'heavy_p50_ms': percentile(heavy, 0.5) * 1000,
+                })
+
+        for name, _ in modes:
+            row = {metric: statistics.median(run[metric] for run in measured[name]) for metric in measured[name][0]}
+            print(f"{name:>10} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} "
+                  f"{row['requests_per_s']:>8.0f} {row['heavy_requests']:>6.0f} {row['heavy_p50_ms']:>10.1f}")
+            results.add({'scenario': "mixed", 'builds': name}, **row)
+
+        # Builds started by the heavy clients plus one per burst; the other burst requests joined a build
+        latencies = sorted(latency for burst in bursts for latency in burst)
+        print(f"\n3 bursts of {args.burst} identical uncached requests: p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+              f"max {latencies[-1] * 1000:.1f}ms; {builds['joined']} requests shared a build in progress "
+              f"({builds['started']} builds in total)")
+        results.add({'scenario': "burst"}, p50_ms=percentile(latencies, 0.5) * 1000, max_ms=latencies[-1] * 1000,
+                    joined=builds['joined'], builds=builds['started'])
+
+    results.write(args.json)
@@ -0,0 +1,77 @@
+"""
+Spreads analyzer work over several stub Ollama servers and stops one mid-run.
+
+Shows least-loaded scheduling across endpoints and redistribution of work from a
+failed endpoint, and prints per-endpoint throughput and latency.
+
+Usage:
+    python benchmarks/bench_endpoints.py --endpoints 3 --items 300 --latency 0.05 --kill-after 1.0
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from bench_analyzer import synthetic_processed_data
+from results import BenchmarkResults, add_json_argument
+from storage.jsonl import legacy_records
+from stub_ollama import start_stub_server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analyzer across several stub Ollama endpoints")
+    parser.add_argument("--endpoints", type=int, default=3)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.05],
+                        help="Stub latency per endpoint; the last value is reused for the rest")
+    parser.add_argument("--concurrency", type=int, default=None, help="Defaults to 4 per endpoint")
+    parser.add_argument("--kill-after", type=float, default=None,
+                        help="Stop the first endpoint after this many seconds")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("endpoints", endpoints=args.endpoints, items=args.items, latency=args.latency,
+                               kill_after=args.kill_after)
+
+    latencies = args.latency + [args.latency[-1]] * (args.endpoints - len(args.latency))
+    servers = [start_stub_server(latency=latency) for latency in latencies[:args.endpoints]]
+    os.environ["OLLAMA_HOSTS"] = ",".join(f"http://127.0.0.1:{server.server_port}" for server in servers)
+
+    from sentiment_analysis import sentiment_analyzer
+    # Connect to the stub servers before timing, so the first run does not include creating the clients
+    sentiment_analyzer.get_pool()
+
+    records = list(legacy_records(synthetic_processed_data(args.items)))
+    if args.kill_after is not None:
+        threading.Timer(args.kill_after, stop_server, [servers[0]]).start()
+
+    start = time.perf_counter()
+    analyzed = sentiment_analyzer.analyze_processed_data(
+        records, args.concurrency or 4 * args.endpoints, show_progress=False
+    )
+    elapsed = time.perf_counter() - start
+    assert len(analyzed) == len(records)
+
+    print(f"\nAnalyzed {len(analyzed)} items in {elapsed:.2f}s ({len(analyzed) / elapsed:.1f} items/s)")
+    results.add({'endpoint': 'all'}, seconds=elapsed, items_per_s=len(analyzed) / elapsed)
+    print(f"{'endpoint':>24} {'requests':>8} {'failures':>8} {'req/s':>7} {'mean':>6} {'p95':>6}")
+    for index, stats in enumerate(sentiment_analyzer.endpoint_report()):
+        print(f"{stats['url']:>24} {stats['requests']:>8} {stats['failures']:>8} {stats['throughput']:>7.1f} "
+              f"{stats['mean_latency']:>6.3f} {stats['p95_latency']:>6.3f}")
+        # Ports change between runs, so endpoints are matched by position
+        results.add({'endpoint': index}, requests_per_s=stats['throughput'], mean_latency_seconds=stats['mean_latency'],
+                    p95_latency_seconds=stats['p95_latency'])
+
+    for server in servers[1:] if args.kill_after is not None else servers:
+        stop_server(server)
+    results.write(args.json)
@@ -0,0 +1,102 @@
+"""
+Measures the import time of each entry point, and fails when one exceeds its budget.
+
+Every module is imported in a fresh interpreter under `python -X importtime`, so the
+time covers everything it loads on a cold start. Importing a module must not contact
+Reddit or Ollama, and must not load the clients the module only uses at run time:
+an entry point that loads one of `DEFERRED_MODULES`, or takes longer than its
+budget, is reported and makes the script exit with status 1.
+
+Usage:
+    python benchmarks/bench_imports.py --repeat 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+
+# Entry point: import budget in milliseconds, a few times what it takes on a laptop
+ENTRY_POINTS = {
+    "api.main": 1500,
+    "pipeline.orchestrator": 300,
+    "scraping.reddit_scraper": 300,
+    "processing.data_cleaner": 150,
+    "sentiment_analysis.sentiment_analyzer": 500,
+    "sentiment_analysis.ollama_config": 150,
+    "storage.rollups": 150,
+}
+# Clients loaded on first use only; langchain alone takes about a second to import
+DEFERRED_MODULES = ("langchain_ollama", "langchain_core", "ollama", "praw", "prawcore", "dotenv", "requests")
+# Timeout of one import; a module waiting for a server at import time hits it
+IMPORT_TIMEOUT = 60
+
+
+def import_profile(module):
+    """
+    Imports `module` in a fresh interpreter
+
+    Returns:
+        tuple: Milliseconds spent importing, and {module name: cumulative milliseconds}
+            of every module loaded
+    """
+    env = {**os.environ, "PYTHONPATH": str(backend_dir / "src")}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, timeout=IMPORT_TIMEOUT,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    total_us, loaded = 0, {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        total_us += int(own)
+        loaded[name.strip()] = int(cumulative) / 1000
+    return total_us / 1000, loaded
+
+
+def slowest(loaded, module, count=3):
+    """The dependencies of `module` that took longest to import, by cumulative time"""
+    names = sorted((name for name in loaded if name != module), key=loaded.get, reverse=True)
+    return ", ".join(f"{name} {loaded[name]:.0f}ms" for name in names[:count])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark and check the import time of the entry points")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module; the fastest one is reported")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="Multiplies every budget, for slow machines")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("imports", repeat=args.repeat)
+
+    failures = []
+    print(f"\n{'module':>38} {'import ms':>10} {'budget ms':>10}  slowest dependencies")
+    for module, budget in ENTRY_POINTS.items():
+        budget *= args.budget_scale
+        start = time.perf_counter()
+        profiles = [import_profile(module) for _ in range(args.repeat)]
+        elapsed = (time.perf_counter() - start) / args.repeat
+        import_ms, loaded = min(profiles, key=lambda profile: profile[0])
+        deferred = sorted(name for name in loaded if name.split(".")[0] in DEFERRED_MODULES)
+
+        print(f"{module:>38} {import_ms:>10.1f} {budget:>10.0f}  {slowest(loaded, module)}")
+        if import_ms > budget:
+            failures.append(f"{module} took {import_ms:.0f}ms to import, over its {budget:.0f}ms budget")
+        if deferred:
+            failures.append(f"{module} loads {', '.join(deferred[:5])} at import time")
+        results.add({'module': module}, import_ms=import_ms, process_ms=elapsed * 1000, modules=len(loaded))
+
+    results.write(args.json)
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
@@ -0,0 +1,123 @@
+"""
+Measures prompt lengths with parents sent verbatim against parents fitted to a token budget.
+
+Synthetic submissions are cleaned into processed records, and a share of the comments
+get a long review as their body, so their replies quote it as the parent, as a
+popular top comment would. The records are analyzed against the stub Ollama server
+with the budgets disabled, then with the default budgets, and with the budgets and
+sibling groups. The stub adds a prefill time per prompt token, so shorter prompts
+also answer faster.
+
+Usage:
+    python benchmarks/bench_prompts.py --comments 2000 --long-share 0.1 --long-words 800
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from stub_ollama import start_stub_server
+from synthetic import synthetic_corpus, synthetic_text
+
+# Budgets too large for any text, so every prompt is sent verbatim
+UNBOUNDED = 10 ** 9
+
+
+def long_review(rng, words):
+    """A review of about `words` words, in sentences of 6 to 25 words"""
+    sentences = []
+    while words > 0:
+        sentence = synthetic_text(rng, 6, 25)
+        sentences.append(sentence[0].upper() + sentence[1:] + rng.choice(".!?"))
+        words -= sentence.count(" ") + 1
+    return " ".join(sentences)
+
+
+def with_long_parents(records, share, words, seed=0):
+    """Gives a `share` of the comments a long body, and their replies the same parent body"""
+    rng = random.Random(seed)
+    long_bodies = {}
+    for record in records:
+        if record['kind'] == "comment":
+            if record.get('parent_id') in long_bodies:
+                record['parent_body'] = long_bodies[record['parent_id']]
+            if rng.random() < share:
+                record['body'] = long_bodies[record['id']] = long_review(rng, words)
+    return records
+
+
+def prompt_tokens(analyzer):
+    return sum(sample['value'] for sample in analyzer.LLM_TOKENS.snapshot() if sample['labels']['type'] == "prompt")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prompt lengths with and without token budgets")
+    parser.add_argument("--comments", type=int, default=2000, help="Number of comments to analyze")
+    parser.add_argument("--comments-per-submission", type=int, default=200)
+    parser.add_argument("--long-share", type=float, default=0.1, help="Share of comments with a long body")
+    parser.add_argument("--long-words", type=int, default=800, help="Words of a long body")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per LLM call in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.00005,
+                        help="Stub prefill seconds per prompt token")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--group-size", type=int, default=8)
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("prompts", comments=args.comments, long_share=args.long_share,
+                               long_words=args.long_words, latency=args.latency,
+                               token_latency=args.token_latency, concurrency=args.concurrency)
+
+    server = start_stub_server(latency=args.latency, token_latency=args.token_latency)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    from processing.data_cleaner import iter_processed_records
+    from sentiment_analysis import sentiment_analyzer
+    from sentiment_analysis.prompts import PromptBuilder
+
+    submissions = synthetic_corpus(args.comments, args.comments_per_submission)
+    records = with_long_parents(list(iter_processed_records(submissions, min_score=-1)),
+                                args.long_share, args.long_words)
+    endpoint = sentiment_analyzer.get_pool().endpoints[0]
+
+    modes = [
+        ("verbatim", UNBOUNDED, UNBOUNDED, None),
+        ("budgeted", sentiment_analyzer.PARENT_TOKENS, sentiment_analyzer.TEXT_TOKENS, None),
+        (f"budgeted, group {args.group_size}", sentiment_analyzer.PARENT_TOKENS, sentiment_analyzer.TEXT_TOKENS,
+         args.group_size),
+    ]
+    print(f"\n{'mode':>18} {'calls':>6} {'p50 tok':>8} {'p95 tok':>8} {'max tok':>8} {'stub tokens':>11} "
+          f"{'shortened':>9} {'seconds':>8} {'items/s':>8}")
+    for mode, parent_tokens, text_tokens, group_size in modes:
+        sentiment_analyzer.prompts = PromptBuilder(parent_tokens, text_tokens)
+        siblings = sentiment_analyzer.create_siblings(group_size is not None, group_size, fused=True)
+        calls_before, tokens_before = endpoint.requests, prompt_tokens(sentiment_analyzer)
+
+        start = time.perf_counter()
+        analyzed = sentiment_analyzer.analyze_processed_data(
+            records, args.concurrency, show_progress=False, fused=True, siblings=siblings
+        )
+        elapsed = time.perf_counter() - start
+        assert [r['id'] for r in analyzed] == [r['id'] for r in records], "output order changed"
+
+        report = sentiment_analyzer.prompts.report()
+        calls = endpoint.requests - calls_before
+        tokens = prompt_tokens(sentiment_analyzer) - tokens_before
+        shortened = report['shortened_parents'] + report['shortened_texts']
+        print(f"{mode:>18} {calls:>6} {report['p50_tokens']:>8} {report['p95_tokens']:>8} "
+              f"{report['max_tokens']:>8} {tokens:>11} {shortened:>9} {elapsed:>8.2f} "
+              f"{len(analyzed) / elapsed:>8.1f}")
+        results.add({'mode': mode}, llm_calls=calls, p50_prompt_tokens=report['p50_tokens'],
+                    p95_prompt_tokens=report['p95_tokens'], max_prompt_tokens=report['max_tokens'],
+                    prompt_tokens=tokens, shortened=shortened, seconds=elapsed,
+                    items_per_s=len(analyzed) / elapsed)
+
+    print(f"\nnum_ctx at the default budgets: {sentiment_analyzer.context_size()}")
+    server.shutdown()
+    results.write(args.json)
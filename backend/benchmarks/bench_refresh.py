@@ -0,0 +1,119 @@
+"""
+Measures a bulk score refresh against re-crawling every submission, on recorded fixtures.
+
+Synthetic submissions are scraped from a fake Reddit client into a temporary data
+directory, cleaned, and stored as analyzed data with placeholder sentiments. The
+scores of a share of the fixtures then change, and the refresh fetches them through
+the fake info endpoint and propagates them to the processed and analyzed data. The
+refreshed files are checked against the fixtures, and the saved rollups against
+rollups rebuilt from the data. A re-crawl of every submission, the only way to
+update scores before, is timed on the same fake client, loading
+`--comments-per-request` comments per "load more comments" round trip; Reddit's
+morechildren endpoint returns at most 100, and deep "continue this thread" links
+far fewer, so the default is the re-crawl's best case.
+
+Usage:
+    python benchmarks/bench_refresh.py --submissions 50 --comments 200 --latency 0.05
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from fake_reddit import FakeReddit
+from processing.data_cleaner import iter_comment_tree, iter_processed_records, record_fullname, save_to_jsonl
+from results import BenchmarkResults, add_json_argument
+from scraping.reddit_scraper import load_job_spec, scrape
+from storage.columnar import ColumnarData, columnar_path
+from storage.jsonl import JsonlWriter, iter_records
+from storage.rollups import Rollups, load_rollups
+from synthetic import synthetic_submission
+
+
+def drift_scores(submissions, share, seed=0):
+    """Changes the score of a `share` of the posts and comments; returns their new scores by fullname"""
+    rng = random.Random(seed)
+    changed = {}
+    for submission in submissions:
+        items = [("t3_", submission)] + [("t1_", comment) for comment in iter_comment_tree(submission["comments"])]
+        for prefix, item in items:
+            if rng.random() < share:
+                item["score"] += rng.randint(1, 50) * rng.choice((-1, 1))
+                changed[prefix + item["id"]] = item["score"]
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the bulk score refresh against a re-crawl")
+    parser.add_argument("--submissions", type=int, default=50)
+    parser.add_argument("--comments", type=int, default=200, help="Comments per submission")
+    parser.add_argument("--changed-share", type=float, default=0.2, help="Share of items whose score changes")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake Reddit request")
+    parser.add_argument("--comments-per-request", type=int, default=100,
+                        help="Comments a re-crawl loads per request")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("refresh", submissions=args.submissions, comments=args.comments,
+                               changed_share=args.changed_share, latency=args.latency,
+                               comments_per_request=args.comments_per_request)
+
+    from pipeline import orchestrator
+    from sentiment_analysis import sentiment_analyzer
+
+    fixtures = {"thelastofus": [synthetic_submission(i, args.comments) for i in range(args.submissions)]}
+    job = dict(load_job_spec(), queries=[""], limit=args.submissions, submissions_per_minute=None, workers=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        orchestrator.raw_file = data_dir / "raw" / "reddit_data.jsonl"
+        orchestrator.processed_file = data_dir / "processed" / "processed_reddit_data.jsonl"
+        sentiment_analyzer.analyzed_dir = data_dir / "analyzed"
+        sentiment_analyzer.analyzed_file = sentiment_analyzer.analyzed_dir / "analyzed_reddit_data.jsonl"
+        sentiment_analyzer.checkpoint_file = sentiment_analyzer.analyzed_dir / "analyzed_reddit_data.checkpoint.jsonl"
+
+        # The stored data: scraped, cleaned, and analyzed without the LLM
+        recrawl = FakeReddit(fixtures, latency=args.latency, comments_per_request=args.comments_per_request)
+        start = time.perf_counter()
+        scrape(recrawl, job, orchestrator.raw_file, client_factory=recrawl.clone)
+        recrawl_seconds = time.perf_counter() - start
+        save_to_jsonl(iter_processed_records(iter_records(orchestrator.raw_file)), orchestrator.processed_file)
+        with JsonlWriter(sentiment_analyzer.checkpoint_file) as writer:
+            for record in iter_records(orchestrator.processed_file):
+                analysis = {'sentiment': "neutral", 'keywords': []}
+                build = sentiment_analyzer.build_post_record if record['kind'] == "post" else \
+                    sentiment_analyzer.build_comment_record
+                writer.write(build(record, analysis, analysis))
+        ids = [record['id'] for record in iter_records(orchestrator.processed_file)]
+        sentiment_analyzer.publish_analyzed(ids)
+
+        expected = drift_scores(fixtures["thelastofus"], args.changed_share)
+        reddit = FakeReddit(fixtures, latency=args.latency)
+        start = time.perf_counter()
+        refresh = orchestrator.refresh_scores(reddit)
+        refresh_seconds = time.perf_counter() - start
+
+        # Every stored copy has the fixtures' scores, and the saved rollups match rebuilt ones
+        assert refresh['changed'] == len(expected), (refresh['changed'], len(expected))
+        for path in (orchestrator.processed_file, sentiment_analyzer.analyzed_file):
+            for record in iter_records(path):
+                fullname = record_fullname(record)
+                assert fullname not in expected or record['score'] == expected[fullname], (path, fullname)
+        rollups = load_rollups(columnar_path(sentiment_analyzer.analyzed_file))
+        rebuilt = Rollups.from_columns(ColumnarData.open(columnar_path(sentiment_analyzer.analyzed_file)))
+        assert rollups is not None and rollups.to_dict() == rebuilt.to_dict(), "rollups drifted from the data"
+
+    print(f"\n{'mode':>8} {'items':>8} {'requests':>8} {'seconds':>8}")
+    print(f"{'recrawl':>8} {refresh['items']:>8} {recrawl.counter.count:>8} {recrawl_seconds:>8.2f}")
+    print(f"{'refresh':>8} {refresh['items']:>8} {reddit.counter.count:>8} {refresh_seconds:>8.2f}")
+    print(f"\n{refresh['changed']} scores changed: {refresh['processed']} processed and "
+          f"{refresh['analyzed']} analyzed records updated, {refresh['missing']} items not returned")
+    results.add({'mode': "recrawl"}, items=refresh['items'], requests=recrawl.counter.count, seconds=recrawl_seconds)
+    results.add({'mode': "refresh"}, items=refresh['items'], requests=reddit.counter.count, seconds=refresh_seconds,
+                changed=refresh['changed'], processed=refresh['processed'], analyzed=refresh['analyzed'])
+    results.write(args.json)
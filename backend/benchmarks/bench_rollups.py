@@ -0,0 +1,97 @@
+"""
+Measures timeline queries from the rollups, and the cost of keeping the rollups current.
+
+Synthetic analyzed items are spread over several years. For each granularity the
+timeline of the whole data and of a range cutting buckets at both ends is queried,
+counted and score-weighted, and compared with bucketing the items per request;
+ranges before the first item and after the last are checked to come back empty.
+Adding a batch of new items to the rollups is compared with rebuilding them.
+
+Usage:
+    python benchmarks/bench_rollups.py --items 100000 1000000 --years 5
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from synthetic import synthetic_analyzed_records
+
+DAY = 86400
+
+
+def scan_timeline(model, granularity, weighted):
+    """The timeline of all items by bucketing each one, as a per-request computation would"""
+    from storage.rollups import bucket_start
+
+    buckets = {}
+    scores = model.data.scores
+    for index, (created, code) in enumerate(zip(model.timestamps, model.sentiment_codes)):
+        values = buckets.setdefault(bucket_start(created, granularity), [0] * 5)
+        values[code] += max(scores[index], 0) if weighted else 1
+    return buckets
+
+
+def timed(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rollup timelines and incremental rollup updates")
+    parser.add_argument("--items", type=int, nargs="+", default=[100000], help="Analyzed items")
+    parser.add_argument("--years", type=int, default=5, help="Years the items are spread over")
+    parser.add_argument("--new-items", type=float, default=0.01, help="Share of items added in a later run")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each timeline query is run")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("rollups", years=args.years, new_items=args.new_items, repeat=args.repeat)
+
+    from api.data_model import SentimentDataModel
+    from storage.columnar import ColumnarData
+    from storage.rollups import GRANULARITIES, Rollups
+
+    for n_items in args.items:
+        records = list(synthetic_analyzed_records(n_items, days=args.years * 365))
+        n_new = int(n_items * args.new_items)
+        data = ColumnarData.from_records(records)
+
+        rollups, rebuild_seconds = timed(lambda: Rollups.from_columns(data))
+        incremental = Rollups.from_columns(ColumnarData.from_records(records[:n_items - n_new]))
+        _, add_seconds = timed(lambda: [incremental.add_record(record) for record in records[n_items - n_new:]])
+        assert incremental.buckets == rollups.buckets, "incremental rollups differ from rebuilt ones"
+        print(f"\n{n_items} items over {args.years} years: rebuilding the rollups takes {rebuild_seconds:.2f}s, "
+              f"adding {n_new} new items {add_seconds * 1000:.1f}ms")
+        results.add({'items': n_items, 'query': "update"}, rebuild_seconds=rebuild_seconds,
+                    add_seconds=add_seconds, speedup=rebuild_seconds / add_seconds)
+
+        model = SentimentDataModel(data, rollups)
+        first, last = data.timestamps[0], data.timestamps[len(data) - 1]
+        # A range starting and ending mid-bucket, so the edge buckets are recounted
+        cut = (first + (last - first) * 0.1 + 1234.5, last - (last - first) * 0.1 - 4321.5)
+
+        print(f"{'granularity':>11} {'weighted':>8} {'range':>5} {'buckets':>8} {'rollup ms':>10} {'scan ms':>9}")
+        for granularity in GRANULARITIES:
+            for weighted in (False, True):
+                scan_seconds = timed(lambda: scan_timeline(model, granularity, weighted))[1]
+                for name, (start, end) in (("all", (None, None)), ("cut", cut)):
+                    (timeline, _), seconds = timed(
+                        lambda: model.sentiment_timeline(start, end, None, granularity, weighted), args.repeat
+                    )
+                    print(f"{granularity:>11} {str(weighted):>8} {name:>5} {len(timeline):>8} "
+                          f"{seconds * 1000:>10.2f} {scan_seconds * 1000:>9.1f}")
+                    results.add({'items': n_items, 'query': f"{granularity}/{'weighted' if weighted else 'count'}/{name}"},
+                                buckets=len(timeline), rollup_ms=seconds * 1000, scan_ms=scan_seconds * 1000)
+                # Ranges ending before the first item or starting after the last one hold nothing
+                for start, end in ((None, first - 1), (first - 2 * DAY, first - DAY), (last + 1, None)):
+                    timeline, overall = model.sentiment_timeline(start, end, None, granularity, weighted)
+                    assert not timeline and not any(overall.values()), (granularity, start, end, timeline)
+
+    results.write(args.json)
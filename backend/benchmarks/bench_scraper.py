@@ -0,0 +1,65 @@
+"""
+Measures scrape throughput against a fake Reddit client at several worker counts.
+
+Usage:
+    python benchmarks/bench_scraper.py --submissions 40 --latency 0.2 --workers 1 4 8
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from fake_reddit import FakeReddit
+from results import BenchmarkResults, add_json_argument
+from scraping.reddit_scraper import load_job_spec, scrape
+from storage.jsonl import iter_jsonl
+from synthetic import synthetic_submission
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Reddit scraper against recorded fixtures")
+    parser.add_argument("--submissions", type=int, default=40)
+    parser.add_argument("--comments", type=int, default=200, help="Comments per submission")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per replace_more call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("scraper", submissions=args.submissions, comments=args.comments, latency=args.latency)
+
+    fixtures = {"thelastofus": [synthetic_submission(i, args.comments) for i in range(args.submissions)]}
+    job = load_job_spec()
+    job.update(queries=[""], limit=args.submissions, submissions_per_minute=None)
+
+    baseline = None
+    print(f"{'workers':>7} {'stored':>6} {'seconds':>8} {'posts/s':>8} {'speedup':>8}")
+    for workers in args.workers:
+        reddit = FakeReddit(fixtures, latency=args.latency)
+        clients = []
+
+        def client_factory():
+            clients.append(reddit.clone())
+            return clients[-1]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl_file = Path(tmp) / "reddit_data.jsonl"
+            start = time.perf_counter()
+            stored = scrape(reddit, dict(job, workers=workers), jsonl_file, client_factory=client_factory)
+            elapsed = time.perf_counter() - start
+            assert sum(1 for _ in iter_jsonl(jsonl_file)) == stored == args.submissions
+            # Every worker thread fetched through a client of its own
+            assert 0 < len(clients) <= workers, (len(clients), workers)
+
+            # A second run over the same fixtures must not fetch anything again
+            assert scrape(reddit, dict(job, workers=workers), jsonl_file, client_factory=reddit.clone) == 0
+
+        throughput = stored / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>7} {stored:>6} {elapsed:>8.2f} {throughput:>8.1f} {throughput / baseline:>7.1f}x")
+        results.add({'workers': workers}, seconds=elapsed, posts_per_s=throughput, speedup=throughput / baseline)
+
+    results.write(args.json)
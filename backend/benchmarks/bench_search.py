@@ -0,0 +1,99 @@
+"""
+Measures keyword search through the posting lists against a linear scan of the items.
+
+The model is built from synthetic analyzed records, reporting the time and memory
+the keyword index adds to the load. Each query is then answered by
+SentimentDataModel.search and by a scan of every item's keyword refs, which must
+find the same number of items.
+
+Usage:
+    python benchmarks/bench_search.py --items 100000 1000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from synthetic import synthetic_analyzed_records
+
+# (keywords, sentiment, start_timestamp, end_timestamp)
+QUERIES = [
+    (["review"], None, None, None),
+    (["Reviews"], "negative", None, None),
+    (["joel", "ellie"], None, None, None),
+    (["joel", "ellie", "ending"], "positive", None, None),
+    (["stutter", "port"], None, 1680000000.0, 1690000000.0),
+]
+
+
+def linear_search(model, keywords, sentiment, start_timestamp, end_timestamp):
+    """Number of items matching the query, found by checking every item's keywords"""
+    from api.data_model import SENTIMENT_BUCKETS
+    from sentiment_analysis.keywords import keyword_stem
+
+    data = model.data
+    groups = [model.group_ids.get(keyword_stem(keyword)) for keyword in keywords]
+    code = SENTIMENT_BUCKETS.index(sentiment) if sentiment is not None else None
+    offsets, refs, timestamps = data.keyword_offsets, data.keyword_refs, data.timestamps
+    count = 0
+    for index in range(len(data)):
+        if code is not None and model.sentiment_codes[index] != code:
+            continue
+        created = timestamps[index]
+        if (start_timestamp and created < start_timestamp) or (end_timestamp and created > end_timestamp):
+            continue
+        item_groups = {model.keyword_groups.get(ref) for ref in refs[offsets[index]:offsets[index + 1]]}
+        if all(group in item_groups for group in groups):
+            count += 1
+    return count
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark keyword search against a linear scan")
+    parser.add_argument("--items", type=int, nargs="+", default=[100000], help="Analyzed items to search")
+    parser.add_argument("--repeat", type=int, default=5, help="Times each indexed query is run")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("search", repeat=args.repeat)
+
+    from api.data_model import SentimentDataModel
+    from storage.columnar import ColumnarData
+
+    for n_items in args.items:
+        data = ColumnarData.from_records(synthetic_analyzed_records(n_items))
+        start = time.perf_counter()
+        model = SentimentDataModel(data)
+        build_seconds = time.perf_counter() - start
+        index_mb = (sum(map(sys.getsizeof, model.postings)) + sys.getsizeof(model.keyword_groups)) / 1024 / 1024
+        print(f"\n{n_items} items: model built in {build_seconds:.2f}s, {index_mb:.1f} MB of keyword index")
+        results.add({'items': n_items, 'query': "build"}, seconds=build_seconds, index_mb=index_mb)
+
+        print(f"{'query':>40} {'matches':>8} {'index ms':>9} {'scan ms':>9} {'speedup':>8}")
+        for keywords, sentiment, start_timestamp, end_timestamp in QUERIES:
+            query = ",".join(keywords) + (f" [{sentiment}]" if sentiment else "") + \
+                (" [range]" if start_timestamp else "")
+            (_, total, _), index_seconds = timed(
+                lambda: model.search(keywords, sentiment, start_timestamp, end_timestamp, limit=20), args.repeat
+            )
+            scan_total, scan_seconds = timed(
+                lambda: linear_search(model, keywords, sentiment, start_timestamp, end_timestamp), 1
+            )
+            assert total == scan_total, f"{query}: search found {total} items, the scan {scan_total}"
+            print(f"{query:>40} {total:>8} {index_seconds * 1000:>9.2f} {scan_seconds * 1000:>9.1f} "
+                  f"{scan_seconds / index_seconds:>7.0f}x")
+            results.add({'items': n_items, 'query': query}, matches=total, index_ms=index_seconds * 1000,
+                        scan_ms=scan_seconds * 1000, speedup=scan_seconds / index_seconds)
+
+    results.write(args.json)
@@ -0,0 +1,85 @@
+"""
+Measures sibling-group prompts against one fused LLM call per comment.
+
+Synthetic submissions are cleaned into processed records, so comments reply to the
+post or to earlier comments as in real threads, and analyzed against the stub
+Ollama server once per item (fused mode) and in sibling groups of several sizes.
+The stub counts a prompt token per four characters; a run with `--drop-rate`
+leaves some comments out of the group answers, as malformed output would, so only
+those are split off and asked again.
+
+Usage:
+    python benchmarks/bench_siblings.py --comments 2000 --group-size 4 8 16 --drop-rate 0.1
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from stub_ollama import start_stub_server
+from synthetic import synthetic_corpus
+
+
+def prompt_tokens(analyzer):
+    return sum(sample['value'] for sample in analyzer.LLM_TOKENS.snapshot() if sample['labels']['type'] == "prompt")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sibling-group prompts against one call per comment")
+    parser.add_argument("--comments", type=int, default=2000, help="Number of comments to analyze")
+    parser.add_argument("--comments-per-submission", type=int, default=200)
+    parser.add_argument("--reply-probability", type=float, default=0.3,
+                        help="Chance a comment replies to the previous one rather than to the post or an earlier comment")
+    parser.add_argument("--group-size", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="Share of comments the stub leaves out of group answers")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub latency per LLM call in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("siblings", comments=args.comments, reply_probability=args.reply_probability,
+                               drop_rate=args.drop_rate, latency=args.latency, concurrency=args.concurrency)
+
+    server = start_stub_server(latency=args.latency, drop_rate=args.drop_rate)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    from processing.data_cleaner import iter_processed_records
+    from sentiment_analysis import sentiment_analyzer
+
+    submissions = synthetic_corpus(args.comments, args.comments_per_submission,
+                                   reply_probability=args.reply_probability)
+    records = list(iter_processed_records(submissions, min_score=-1))
+    endpoint = sentiment_analyzer.get_pool().endpoints[0]
+
+    baseline = None
+    print(f"\n{'mode':>10} {'LLM calls':>9} {'prompt tokens':>13} {'saved':>6} {'seconds':>8} {'items/s':>8}")
+    for group_size in [None, *args.group_size]:
+        siblings = sentiment_analyzer.create_siblings(group_size is not None, group_size, fused=True)
+        calls_before, tokens_before = endpoint.requests, prompt_tokens(sentiment_analyzer)
+
+        start = time.perf_counter()
+        analyzed = sentiment_analyzer.analyze_processed_data(
+            records, args.concurrency, show_progress=False, fused=True, siblings=siblings
+        )
+        elapsed = time.perf_counter() - start
+        assert [r['id'] for r in analyzed] == [r['id'] for r in records], "output order changed"
+
+        calls = endpoint.requests - calls_before
+        tokens = prompt_tokens(sentiment_analyzer) - tokens_before
+        baseline = baseline or tokens
+        mode = f"group {group_size}" if group_size else "per item"
+        print(f"{mode:>10} {calls:>9} {tokens:>13} {1 - tokens / baseline:>6.0%} {elapsed:>8.2f} "
+              f"{len(analyzed) / elapsed:>8.1f}")
+        results.add({'mode': mode}, llm_calls=calls, prompt_tokens=tokens, seconds=elapsed,
+                    items_per_s=len(analyzed) / elapsed)
+        if siblings is not None:
+            sentiment_analyzer.print_siblings_report(siblings)
+
+    server.shutdown()
+    results.write(args.json)
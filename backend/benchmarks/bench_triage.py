@@ -0,0 +1,108 @@
+"""
+Measures how much LLM work heuristic triage saves on a mix of trivial and real comments.
+
+The synthetic comments include short reactions, removed bodies, bare links, pure
+emoji and repeated replies alongside longer comments, under a few parents; the
+analyzer runs over them against the stub Ollama server with triage off and on.
+
+Usage:
+    python benchmarks/bench_triage.py --items 400 --latency 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(backend_dir / "src"))
+sys.path.insert(0, str(backend_dir / "benchmarks"))
+
+from results import BenchmarkResults, add_json_argument
+from stub_ollama import start_stub_server
+from synthetic import synthetic_text
+
+TRIVIAL_BODIES = [
+    "[removed]", "[deleted]", "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "😂😂😂", "🔥", "Well deserved.",
+    "Absolutely ruined.", "This is fantastic!", "Lmao fuckin losers", "Wtf...", "That is just beautiful",
+    "Worst port ever", "Masterpiece.", "Yes", "Agreed", "Same",
+]
+PARENT_BODIES = [
+    "What did you think of the remaster?", "Is the PC port fixed yet?", "Season 2 was better than season 1.",
+]
+
+
+def synthetic_comments(n_items, trivial_share=0.3, duplicate_share=0.1, seed=0):
+    """
+    Comment records for the analyzer: a share of trivial bodies, a share of repeats of an
+    earlier reply under the same parent, the rest longer texts
+    """
+    rng = random.Random(seed)
+    replies = []
+    for i in range(n_items):
+        roll = rng.random()
+        if roll < trivial_share:
+            replies.append((rng.choice(TRIVIAL_BODIES), rng.choice(PARENT_BODIES)))
+        elif roll < trivial_share + duplicate_share and replies:
+            body, parent_body = rng.choice(replies)
+            replies.append((body.upper(), parent_body))
+        else:
+            replies.append((synthetic_text(rng, 12, 40), rng.choice(PARENT_BODIES)))
+    return [
+        {
+            'kind': "comment",
+            'id': f"c{i}",
+            'body': body,
+            'created_UTC': 1700000000.0 + i,
+            'score': 11 + i % 50,
+            'parent_id': f"p{PARENT_BODIES.index(parent_body)}",
+            'parent_body': parent_body,
+        }
+        for i, (body, parent_body) in enumerate(replies)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analyzer with and without heuristic triage")
+    parser.add_argument("--items", type=int, default=400, help="Number of comments to analyze")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub latency per LLM call in seconds")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fused", action="store_true", help="Use one LLM call per item")
+    add_json_argument(parser)
+    args = parser.parse_args()
+    results = BenchmarkResults("triage", items=args.items, latency=args.latency, concurrency=args.concurrency)
+
+    server = start_stub_server(latency=args.latency)
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{server.server_port}"
+
+    from sentiment_analysis import sentiment_analyzer
+
+    records = synthetic_comments(args.items)
+    baseline = None
+    print(f"\n{'triage':>6} {'LLM calls':>9} {'avoided':>8} {'seconds':>8} {'items/s':>8} {'speedup':>8}")
+    for enabled in (False, True):
+        triage = sentiment_analyzer.create_triage(enabled, fused=args.fused)
+        endpoint = sentiment_analyzer.get_pool().endpoints[0]
+        calls_before = endpoint.requests
+
+        start = time.perf_counter()
+        analyzed = sentiment_analyzer.analyze_processed_data(
+            records, args.concurrency, show_progress=False, fused=args.fused, triage=triage
+        )
+        elapsed = time.perf_counter() - start
+        assert [r['id'] for r in analyzed] == [r['id'] for r in records], "output order changed"
+
+        calls = endpoint.requests - calls_before
+        avoided = triage.report()['llm_calls_avoided'] if triage else 0
+        throughput = len(analyzed) / elapsed
+        baseline = baseline or throughput
+        print(f"{'on' if enabled else 'off':>6} {calls:>9} {avoided:>8} {elapsed:>8.2f} {throughput:>8.1f} "
+              f"{throughput / baseline:>7.1f}x")
+        results.add({'triage': enabled}, llm_calls=calls, seconds=elapsed, items_per_s=throughput,
+                    speedup=throughput / baseline)
+        if triage:
+            sentiment_analyzer.print_triage_report(triage)
+
+    server.shutdown()
+    results.write(args.json)
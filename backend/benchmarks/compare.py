@@ -0,0 +1,81 @@
+"""
+Compares two benchmark results files, e.g. from run_suite.py on two commits.
+
+Rows are matched by benchmark and case; for each metric measured in both runs the
+relative change is printed, and a change for the worse beyond the threshold is
+flagged as a regression. Exits with status 1 if there is any regression.
+
+Usage:
+    python benchmarks/compare.py benchmarks/runs/<base>.json benchmarks/runs/<head>.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from results import higher_is_better, load_results
+
+
+def index_rows(benchmarks):
+    """Maps (benchmark, case) to the row's metrics"""
+    rows = {}
+    for benchmark in benchmarks:
+        for row in benchmark['rows']:
+            rows[(benchmark['benchmark'], json.dumps(row['case'], sort_keys=True))] = row['metrics']
+    return rows
+
+
+def compare(base_benchmarks, head_benchmarks, threshold=0.1):
+    """
+    Compares the metrics of the rows present in both runs
+
+    Returns:
+        list: (benchmark, case, metric, base value, head value, relative change, regressed) tuples
+    """
+    base_rows = index_rows(base_benchmarks)
+    head_rows = index_rows(head_benchmarks)
+    changes = []
+    for key, head_metrics in head_rows.items():
+        base_metrics = base_rows.get(key)
+        if base_metrics is None:
+            continue
+        for metric, head_value in head_metrics.items():
+            base_value = base_metrics.get(metric)
+            if not isinstance(base_value, (int, float)) or not isinstance(head_value, (int, float)) or not base_value:
+                continue
+            change = (head_value - base_value) / abs(base_value)
+            worse = -change if higher_is_better(metric) else change
+            changes.append((*key, metric, base_value, head_value, change, worse > threshold))
+    return changes
+
+
+def describe(env):
+    commit = (env.get('commit') or "unknown")[:12]
+    return f"{commit}{' (dirty)' if env.get('dirty') else ''}, Python {env.get('python')}, {env.get('cpu_count')} CPUs"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change for the worse that counts as a regression (default: 0.1)")
+    args = parser.parse_args()
+
+    base_env, base_benchmarks = load_results(args.base)
+    head_env, head_benchmarks = load_results(args.head)
+    print(f"base: {describe(base_env)}")
+    print(f"head: {describe(head_env)}")
+
+    changes = compare(base_benchmarks, head_benchmarks, args.threshold)
+    print(f"\n{'benchmark':>15} {'metric':>22} {'base':>11} {'head':>11} {'change':>8}  case")
+    for benchmark, case, metric, base_value, head_value, change, regressed in changes:
+        print(f"{benchmark:>15} {metric:>22} {base_value:>11.4g} {head_value:>11.4g} {change:>+8.1%}"
+              f"{' !' if regressed else '  '} {case}")
+
+    regressions = sum(1 for change in changes if change[-1])
+    print(f"\n{len(changes)} metrics compared, {regressions} regressed by more than {args.threshold:.0%}")
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,157 @@
+"""
+In-process stand-in for the parts of `praw.Reddit` the scraper uses, served from recorded fixtures.
+
+Fixtures are submissions in the raw `reddit_data.jsonl` format, e.g. a file written
+by a real scrape or by `synthetic.py`. Searches match the query against titles,
+and `replace_more` sleeps for a configurable latency to stand in for Reddit's
+"load more comments" round trips. `info` answers with the current scores of the
+fixtures, one request per 100 fullnames as PRAW sends them, so a benchmark can
+change fixture scores and refresh them. The scraper gives each worker thread its own
+client; `clone` makes one that serves the same fixtures and counts requests together.
+"""
+import threading
+import time
+
+
+class FakeComment:
+    def __init__(self, data, link_id):
+        self.id = data["id"]
+        self.body = data["body"]
+        self.created_utc = data["created_UTC"]
+        self.score = data["score"]
+        self.parent_id = ("t1_" if data["parent_id"] != link_id[3:] else "t3_") + data["parent_id"]
+        self.link_id = link_id
+        self.replies = [FakeComment(reply, link_id) for reply in data.get("replies", [])]
+
+
+class FakeCommentForest(list):
+    def __init__(self, comments, latency, counter, comments_per_request=None):
+        super().__init__(comments)
+        self.latency = latency
+        self.counter = counter
+        self.comments_per_request = comments_per_request
+
+    def replace_more(self, limit=None):
+        requests = 1
+        if self.comments_per_request:
+            stack, total = list(self), 0
+            while stack:
+                total += 1
+                stack.extend(stack.pop().replies)
+            requests = max(1, -(-total // self.comments_per_request))
+        for _ in range(requests):
+            self.counter.record()
+            time.sleep(self.latency)
+        return []
+
+
+class RequestCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self):
+        with self._lock:
+            self.count += 1
+
+
+class FakeSubmission:
+    def __init__(self, data, latency, counter, comments_per_request=None):
+        self._data = data
+        self._latency = latency
+        self._counter = counter
+        self._comments_per_request = comments_per_request
+        self.id = data["id"]
+        self.title = data["title"]
+        self.created_utc = data["created_UTC"]
+        self.score = data["score"]
+        self.permalink = data["url"].replace("https://www.reddit.com", "")
+
+    @property
+    def comments(self):
+        if not hasattr(self, "_comments"):
+            link_id = f"t3_{self.id}"
+            self._comments = FakeCommentForest(
+                [FakeComment(comment, link_id) for comment in self._data.get("comments", [])],
+                self._latency,
+                self._counter,
+                self._comments_per_request,
+            )
+        return self._comments
+
+
+class FakeThing:
+    """A post or comment returned by `info`, with the attributes a score refresh reads"""
+
+    def __init__(self, fullname, score):
+        self.fullname = fullname
+        self.id = fullname[3:]
+        self.score = score
+
+
+class FakeSubreddit:
+    def __init__(self, reddit, name):
+        self.reddit = reddit
+        self.display_name = name
+
+    def search(self, query, sort="relevance", time_filter="all", limit=100):
+        matches = [
+            submission for submission in self.reddit.fixtures.get(self.display_name, [])
+            if query.lower() in submission["title"].lower()
+        ]
+        for data in matches[:limit]:
+            yield FakeSubmission(data, self.reddit.latency, self.reddit.counter, self.reddit.comments_per_request)
+
+
+class FakeReddit:
+    """
+    Args:
+        fixtures (dict): Subreddit name to a list of raw submissions
+        latency (float): Seconds each request takes
+        comments_per_request (int): Comments loaded per "load more comments" request; by
+            default `replace_more` loads a whole comment tree in one request
+    """
+
+    def __init__(self, fixtures, latency=0.0, comments_per_request=None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.comments_per_request = comments_per_request
+        self.counter = RequestCounter()
+        self._things = None
+        self._submissions = None
+
+    def clone(self):
+        """A separate client over the same fixtures, sharing the request counter"""
+        clone = FakeReddit(self.fixtures, self.latency, self.comments_per_request)
+        clone.counter = self.counter
+        return clone
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+    def submission(self, id):
+        if self._submissions is None:
+            self._submissions = {
+                submission["id"]: submission for submissions in self.fixtures.values() for submission in submissions
+            }
+        return FakeSubmission(self._submissions[id], self.latency, self.counter, self.comments_per_request)
+
+    def info(self, fullnames=None):
+        if self._things is None:
+            self._things = {}
+            for submissions in self.fixtures.values():
+                for submission in submissions:
+                    self._things[f"t3_{submission['id']}"] = submission
+                    stack = list(submission.get("comments", []))
+                    while stack:
+                        comment = stack.pop()
+                        self._things[f"t1_{comment['id']}"] = comment
+                        stack.extend(comment.get("replies", []))
+
+        fullnames = list(fullnames or [])
+        for start in range(0, len(fullnames), 100):
+            self.counter.record()
+            time.sleep(self.latency)
+            for fullname in fullnames[start:start + 100]:
+                if fullname in self._things:
+                    yield FakeThing(fullname, self._things[fullname]["score"])
@@ -0,0 +1,106 @@
+"""
+Machine-readable benchmark results, for comparing runs across commits.
+
+Each benchmark records rows made of a `case` (the parameters that identify what was
+measured, e.g. `{'mode': 'cached'}`) and `metrics` (the measurements). Results are
+written as JSON together with the commit and machine they were measured on, so
+`compare.py` can match the rows of two runs by benchmark and case.
+
+Metric names carry their unit, and whether higher is better follows from it:
+throughputs end in `_per_s` and speedups in `speedup`; everything else (seconds,
+milliseconds, megabytes) is better when lower.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).resolve().parents[1]
+
+HIGHER_IS_BETTER_SUFFIXES = ("_per_s", "speedup")
+
+
+def higher_is_better(metric):
+    return metric.endswith(HIGHER_IS_BETTER_SUFFIXES)
+
+
+def _git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=backend_dir, capture_output=True, text=True, check=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    """The commit, interpreter and machine a benchmark ran on"""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        'commit': _git("rev-parse", "HEAD"),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.time(),
+    }
+
+
+def add_json_argument(parser):
+    parser.add_argument("--json", type=Path, metavar="PATH",
+                        help="Also write the results as JSON to this file, for compare.py")
+
+
+class BenchmarkResults:
+    """The rows measured by one benchmark run"""
+
+    def __init__(self, benchmark, **params):
+        """
+        Args:
+            benchmark (str): Benchmark name, e.g. "api"
+            params: The command line settings shared by every row
+        """
+        self.benchmark = benchmark
+        self.params = params
+        self.rows = []
+
+    def add(self, case, **metrics):
+        """
+        Records one measurement
+
+        Args:
+            case (dict): What was measured; rows are matched across runs by it
+            metrics: Measured values, named with their unit, e.g. `seconds` or `items_per_s`
+        """
+        self.rows.append({'case': case, 'metrics': metrics})
+
+    def to_dict(self):
+        return {'benchmark': self.benchmark, 'params': self.params, 'rows': self.rows}
+
+    def write(self, path):
+        """Writes the results with the current environment to `path`, if one is given"""
+        if path is None:
+            return
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), **self.to_dict()}, f, indent=2, default=str)
+            f.write("\n")
+
+
+def load_results(path):
+    """
+    Reads a results file written by a benchmark or by run_suite.py
+
+    Returns:
+        tuple: The environment dict and the list of benchmark dicts
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if 'benchmarks' in data:
+        return data.get('environment', {}), data['benchmarks']
+    benchmark = {key: value for key, value in data.items() if key != 'environment'}
+    return data.get('environment', {}), [benchmark]
@@ -0,0 +1,128 @@
+"""
+Runs every benchmark at a preset scale and collects their results in one JSON file.
+
+Each benchmark runs in its own process, so one's memory use or imported modules do
+not affect another. The results file is named after the commit, so runs on two
+commits can be compared with compare.py.
+
+Usage:
+    python benchmarks/run_suite.py --profile quick
+    python benchmarks/run_suite.py --profile full --only cleaner_corpus api
+    python benchmarks/compare.py benchmarks/runs/<base>.json benchmarks/runs/<head>.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+benchmarks_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(benchmarks_dir))
+
+from results import environment, load_results
+
+# name: (script, arguments) per profile; "quick" takes about a minute, "full" scales corpora to 10M comments
+PROFILES = {
+    "quick": {
+        "cleaner": ("bench_cleaner.py", ["--comments", "10000"]),
+        "cleaner_corpus": ("bench_cleaner.py", ["--corpus", "1000", "10000", "100000"]),
+        "scraper": ("bench_scraper.py", ["--submissions", "8", "--comments", "50", "--latency", "0.05",
+                                         "--workers", "1", "4"]),
+        "refresh": ("bench_refresh.py", ["--submissions", "10", "--comments", "100", "--latency", "0.01"]),
+        "checkpoint": ("bench_checkpoint.py", ["--records", "1000", "--rounds", "10"]),
+        "raw_append": ("bench_checkpoint.py", ["--file", "raw", "--records", "200", "--rounds", "10"]),
+        "analyzer": ("bench_analyzer.py", ["--items", "100", "--latency", "0.02", "--concurrency", "1", "8",
+                                           "--fused"]),
+        "endpoints": ("bench_endpoints.py", ["--endpoints", "2", "--items", "100", "--latency", "0.02"]),
+        "triage": ("bench_triage.py", ["--items", "200", "--latency", "0.02"]),
+        "siblings": ("bench_siblings.py", ["--comments", "500", "--latency", "0.01", "--drop-rate", "0.1"]),
+        "prompts": ("bench_prompts.py", ["--comments", "500", "--latency", "0.01"]),
+        "api": ("bench_api.py", ["--items", "10000", "--requests", "500"]),
+        "columnar": ("bench_columnar.py", ["--items", "10000"]),
+        "search": ("bench_search.py", ["--items", "100000"]),
+        "rollups": ("bench_rollups.py", ["--items", "100000"]),
+        "concurrency": ("bench_concurrency.py", ["--items", "50000", "--requests", "500"]),
+        "imports": ("bench_imports.py", ["--repeat", "1"]),
+    },
+    "full": {
+        "cleaner": ("bench_cleaner.py", ["--comments", "100000"]),
+        "cleaner_corpus": ("bench_cleaner.py", ["--corpus", "1000", "100000", "1000000", "10000000"]),
+        "scraper": ("bench_scraper.py", []),
+        "refresh": ("bench_refresh.py", ["--submissions", "100", "--comments", "500"]),
+        "checkpoint": ("bench_checkpoint.py", ["--records", "5000", "--rounds", "50"]),
+        "raw_append": ("bench_checkpoint.py", ["--file", "raw", "--records", "1000", "--rounds", "50"]),
+        "analyzer": ("bench_analyzer.py", ["--items", "500", "--concurrency", "1", "4", "16", "--fused"]),
+        "endpoints": ("bench_endpoints.py", ["--endpoints", "3", "--items", "300", "--kill-after", "1.0"]),
+        "triage": ("bench_triage.py", ["--items", "400"]),
+        "siblings": ("bench_siblings.py", ["--comments", "2000", "--drop-rate", "0.1"]),
+        "prompts": ("bench_prompts.py", ["--comments", "2000", "--long-words", "1500"]),
+        "api": ("bench_api.py", ["--items", "100000", "--requests", "2000"]),
+        "columnar": ("bench_columnar.py", ["--items", "100000", "1000000"]),
+        "search": ("bench_search.py", ["--items", "100000", "1000000"]),
+        "rollups": ("bench_rollups.py", ["--items", "100000", "1000000"]),
+        "concurrency": ("bench_concurrency.py", ["--items", "500000", "--repeat", "3"]),
+        "imports": ("bench_imports.py", ["--repeat", "5"]),
+    },
+}
+
+
+def run_benchmark(name, script, arguments, json_path):
+    """
+    Runs one benchmark script, passing its output through
+
+    Returns:
+        dict: The benchmark's results, or a record of its failure
+    """
+    print(f"\n== {name}: {script} {' '.join(arguments)}", flush=True)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, str(benchmarks_dir / script), *arguments, "--json", str(json_path)])
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0 or not json_path.exists():
+        print(f"== {name} failed with exit code {completed.returncode}")
+        return {'benchmark': name, 'params': {}, 'rows': [], 'error': f"exit code {completed.returncode}",
+                'seconds': elapsed}
+
+    _, (benchmark,) = load_results(json_path)
+    # Two entries can run the same script; the suite entry name keeps them apart
+    return {**benchmark, 'benchmark': name, 'script': script, 'arguments': arguments, 'seconds': elapsed}
+
+
+def default_output(env):
+    commit = (env['commit'] or "unknown")[:12]
+    suffix = "-dirty" if env['dirty'] else ""
+    return benchmarks_dir / "runs" / f"{commit}{suffix}.json"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write machine-readable results")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Run only these benchmarks")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/runs/<commit>.json)")
+    args = parser.parse_args()
+
+    selected = PROFILES[args.profile]
+    if args.only:
+        unknown = sorted(set(args.only) - set(selected))
+        if unknown:
+            parser.error(f"Unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(selected)})")
+        selected = {name: spec for name, spec in selected.items() if name in args.only}
+
+    env = environment()
+    benchmarks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (script, arguments) in selected.items():
+            benchmarks.append(run_benchmark(name, script, arguments, Path(tmp) / f"{name}.json"))
+
+    output = args.output or default_output(env)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': env, 'profile': args.profile, 'benchmarks': benchmarks}, f, indent=2, default=str)
+        f.write("\n")
+
+    failed = [benchmark['benchmark'] for benchmark in benchmarks if 'error' in benchmark]
+    print(f"\nWrote results of {len(benchmarks)} benchmarks to {output}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
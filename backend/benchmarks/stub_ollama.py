@@ -0,0 +1,145 @@
+"""
+Minimal stand-in for the Ollama HTTP API used by the benchmarks.
+
+Implements `/api/tags` and `/api/chat` (streaming and non-streaming) and answers
+every chat request with a JSON object containing both a sentiment and keywords
+taken from the user message, after an artificial per-request latency, plus an
+optional prefill time per prompt token as a model's grows with the prompt. A message
+of numbered comments ("Comment 1: ...") gets one such entry per comment, except
+for a deterministic `drop_rate` share of them, as a model's malformed output would.
+Requests are served on separate threads, like an Ollama server with
+OLLAMA_NUM_PARALLEL > 1.
+
+Run standalone:
+    python benchmarks/stub_ollama.py --port 11434 --latency 0.2
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SENTIMENTS = ["positive", "negative", "neutral"]
+COMMENT_PATTERN = re.compile(r"^Comment (\d+): (.*)$", re.MULTILINE)
+
+
+def fake_analysis(text):
+    words = re.findall(r"[A-Za-z]{4,}", text)
+    return {
+        "sentiment": SENTIMENTS[len(text) % len(SENTIMENTS)],
+        "keywords": [word.lower() for word in words[:3]],
+    }
+
+
+def fake_answer(messages, drop_rate=0.0):
+    """Builds a deterministic JSON answer from the last user message"""
+    text = messages[-1].get("content", "") if messages else ""
+    comments = COMMENT_PATTERN.findall(text)
+    if not comments:
+        return fake_analysis(text)
+    return {
+        "comments": [
+            {"comment": int(number), **fake_analysis(body)}
+            for number, body in comments
+            if zlib.crc32(body.encode("utf-8")) % 1000 >= drop_rate * 1000
+        ]
+    }
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    token_latency = 0.0
+    drop_rate = 0.0
+    model = "llama3.2"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": f"{self.model}:latest", "model": f"{self.model}:latest"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        messages = request.get("messages", [])
+        content = json.dumps(fake_answer(messages, self.drop_rate))
+        prompt_chars = sum(len(message.get("content", "")) for message in messages)
+        time.sleep(self.latency + self.token_latency * (prompt_chars // 4))
+        final = {
+            "model": request.get("model", self.model),
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": prompt_chars // 4,
+            "eval_count": len(content) // 4,
+        }
+
+        if not request.get("stream", True):
+            self._send_json(final)
+            return
+
+        # As in Ollama, only the final chunk carries the token counts
+        chunk = dict(final, message={"role": "assistant", "content": content}, done=False)
+        for key in ("done_reason", "prompt_eval_count", "eval_count"):
+            chunk.pop(key)
+        final["message"] = {"role": "assistant", "content": ""}
+        body = (json.dumps(chunk) + "\n" + json.dumps(final) + "\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_server(port=0, latency=0.0, drop_rate=0.0, token_latency=0.0):
+    """
+    Starts the stub server on a background thread
+
+    Args:
+        port (int): Port to listen on, 0 picks a free port
+        latency (float): Seconds to sleep before answering each chat request
+        drop_rate (float): Share of numbered comments left out of sibling-group answers
+        token_latency (float): Extra seconds per prompt token, counted as four characters
+
+    Returns:
+        ThreadingHTTPServer: The running server; its URL is `http://127.0.0.1:<server_port>`
+    """
+    handler = type("Handler", (StubOllamaHandler,), {
+        "latency": latency, "drop_rate": drop_rate, "token_latency": token_latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency)
+    print(f"Stub Ollama listening on http://127.0.0.1:{server.server_port} (latency {args.latency}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,185 @@
+"""
+Synthetic Reddit data in the raw `reddit_data.json` submission shape, for benchmarks.
+
+Corpora are reproducible from their seed and can be written to disk, e.g. to feed
+the pipeline or compare stages on the same input:
+
+    python benchmarks/synthetic.py raw --comments 1000000 --max-depth 10 --output data/raw/reddit_data.jsonl
+    python benchmarks/synthetic.py analyzed --items 1000000 --output data/analyzed/analyzed_reddit_data.jsonl
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from storage.jsonl import JsonlWriter
+
+WORDS = (
+    "the game story ending joel ellie ashley johnson remaster review combat pacing "
+    "graphics soundtrack boring amazing masterpiece overrated hbo episode season "
+    "bella ramsey pedro pascal abby naughty dog ps5 pc port stutter great bad"
+).split()
+
+
+def synthetic_text(rng, min_words=4, max_words=30):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def synthetic_submission(index, n_comments, max_depth=10, reply_probability=0.6, seed=0):
+    """
+    Builds one submission with a comment tree of the requested size and shape
+
+    Each new comment replies to the previous comment with `reply_probability`
+    (while that stays within `max_depth`), otherwise to a random earlier comment
+    or to the post. `max_depth=1` gives a flat thread; `reply_probability=1` with a
+    large `max_depth` gives a single deep chain. The tree is built without
+    recursion, so any depth is possible.
+
+    Args:
+        index (int): Submission number, used in IDs
+        n_comments (int): Total number of comments and replies
+        max_depth (int): Maximum nesting depth, 1 meaning top-level comments only
+        reply_probability (float): Chance a comment replies to the previous one
+        seed (int): Random seed, so corpora are reproducible
+
+    Returns:
+        dict: A submission with nested 'comments' and 'replies'
+    """
+    rng = random.Random(f"{seed}-{index}")
+    post_id = f"p{index}"
+    created = 1670000000.0 + index * 3600
+    submission = {
+        "id": post_id,
+        "title": synthetic_text(rng, 4, 15),
+        "created_UTC": created,
+        "url": f"https://www.reddit.com/r/thelastofus/comments/{post_id}/",
+        "score": rng.randint(0, 5000),
+        "comments": [],
+    }
+
+    nodes = []  # (comment, depth)
+    for i in range(n_comments):
+        comment = {
+            "id": f"{post_id}c{i}",
+            "body": "[deleted]" if rng.random() < 0.02 else synthetic_text(rng),
+            "created_UTC": created + rng.randint(0, 30 * 86400),
+            "replies": [],
+            "score": int(rng.paretovariate(1.2)) - 1 + rng.randint(0, 20),
+            "parent_id": post_id,
+            "link_id": f"t3_{post_id}",
+        }
+        parent = None
+        if nodes and nodes[-1][1] < max_depth and rng.random() < reply_probability:
+            parent = nodes[-1]
+        elif nodes and max_depth > 1 and rng.random() < 0.5:
+            candidate = rng.choice(nodes)
+            parent = candidate if candidate[1] < max_depth else None
+
+        if parent is None:
+            submission["comments"].append(comment)
+            nodes.append((comment, 1))
+        else:
+            comment["parent_id"] = parent[0]["id"]
+            parent[0]["replies"].append(comment)
+            nodes.append((comment, parent[1] + 1))
+
+    return submission
+
+
+def synthetic_corpus(n_comments, comments_per_submission=500, max_depth=10, reply_probability=0.6, seed=0):
+    """
+    Yields submissions until `n_comments` comments have been generated
+
+    Submissions are generated lazily, so corpora far larger than memory can be streamed.
+    """
+    index = 0
+    remaining = n_comments
+    while remaining > 0:
+        size = min(comments_per_submission, remaining)
+        yield synthetic_submission(index, size, max_depth, reply_probability, seed)
+        remaining -= size
+        index += 1
+
+
+def synthetic_analyzed_records(n_items, posts_per_comment=0.05, seed=0, days=365):
+    """
+    Yields records in the analyzed data format, about `posts_per_comment` posts per comment
+
+    Items are spread over `days` days and carry a sentiment and a few keywords each.
+    """
+    rng = random.Random(seed)
+    sentiments = ["positive", "negative", "neutral", "mixed"]
+    for i in range(n_items):
+        record = {
+            "id": f"a{i}",
+            "created_utc": 1670000000.0 + rng.randint(0, days * 86400),
+            "score": int(rng.paretovariate(1.2)) + rng.randint(0, 20),
+            "sentiment": rng.choices(sentiments, weights=[4, 4, 2, 1])[0],
+            "keywords": rng.sample(WORDS, rng.randint(1, 5)),
+        }
+        if rng.random() < posts_per_comment:
+            record["title"] = synthetic_text(rng, 4, 15)
+            record["url"] = f"https://www.reddit.com/r/thelastofus/comments/a{i}/"
+        else:
+            record["body"] = synthetic_text(rng)
+            record["parent_body"] = synthetic_text(rng)
+        yield record
+
+
+def write_corpus(records, path):
+    """
+    Streams records to `path`: a JSON array if it ends in .json, as the original
+    `reddit_data.json` was stored, otherwise JSONL
+
+    Returns:
+        int: Number of records written
+    """
+    path = Path(path)
+    if path.suffix != ".json":
+        with JsonlWriter(path) as writer:
+            return writer.write_all(records)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for record in records:
+            f.write(",\n" if count else "\n")
+            json.dump(record, f)
+            count += 1
+        f.write("\n]\n")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a reproducible synthetic Reddit corpus")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    raw_parser = subparsers.add_parser("raw", help="Submissions with comment trees, as scraped")
+    raw_parser.add_argument("--comments", type=int, default=100000, help="Total comments and replies")
+    raw_parser.add_argument("--comments-per-submission", type=int, default=500)
+    raw_parser.add_argument("--max-depth", type=int, default=10, help="Maximum reply depth, 1 for flat threads")
+    raw_parser.add_argument("--reply-probability", type=float, default=0.6,
+                            help="Chance a comment replies to the previous one")
+    analyzed_parser = subparsers.add_parser("analyzed", help="Analyzed posts and comments, as the API reads them")
+    analyzed_parser.add_argument("--items", type=int, default=100000, help="Posts + comments")
+    analyzed_parser.add_argument("--days", type=int, default=365, help="Days the items are spread over")
+    for subparser in (raw_parser, analyzed_parser):
+        subparser.add_argument("--seed", type=int, default=0)
+        subparser.add_argument("--output", type=Path, required=True, help=".jsonl, or .json for a JSON array")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "raw":
+        count = write_corpus(
+            synthetic_corpus(args.comments, args.comments_per_submission, args.max_depth, args.reply_probability, args.seed),
+            args.output,
+        )
+        print(f"Wrote {count} submissions with {args.comments} comments to {args.output} "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        count = write_corpus(synthetic_analyzed_records(args.items, seed=args.seed, days=args.days), args.output)
+        print(f"Wrote {count} analyzed items to {args.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,422 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import accumulate, chain, compress, repeat
+from math import inf, nextafter
+from operator import sub
+
+from sentiment_analysis.keywords import keyword_stem, normalize_keyword
+from sentiment_analysis.schema import Sentiment
+from storage.columnar import ColumnarData, KIND_POST
+from storage.rollups import GRANULARITIES, HOUR, Rollups, bucket_end, bucket_label
+
+# Sentiment buckets reported by the API, in code order; anything else counts as "others"
+SENTIMENT_BUCKETS = [sentiment.value for sentiment in Sentiment] + ["others"]
+SENTIMENT_CODES = {sentiment: code for code, sentiment in enumerate(SENTIMENT_BUCKETS[:-1])}
+OTHERS_CODE = len(SENTIMENT_BUCKETS) - 1
+
+
+def intersect_postings(candidates, postings):
+    """
+    Item indexes of the sorted candidates that are also in the sorted posting list
+
+    Few candidates are looked up with galloping bisects; otherwise the part of the
+    posting list spanning the candidates is made a set and the candidates filtered by it.
+    """
+    if not candidates:
+        return array('I')
+    lo = bisect_left(postings, candidates[0])
+    hi = bisect_right(postings, candidates[-1], lo)
+    if len(candidates) * 16 >= hi - lo:
+        return array('I', filter(set(postings[lo:hi]).__contains__, candidates))
+
+    kept = array('I')
+    position = lo
+    for index in candidates:
+        position = bisect_left(postings, index, position, hi)
+        if position == hi:
+            break
+        if postings[position] == index:
+            kept.append(index)
+    return kept
+
+
+class RollupSeries:
+    """
+    The rollup buckets of one granularity in time order
+
+    `counts[code][i]` and `weights[code][i]` are the item count and score weight of
+    sentiment bucket `code` in the i-th bucket, with prefix sums over the buckets.
+    """
+
+    def __init__(self, buckets, granularity):
+        """
+        Args:
+            buckets (dict): Bucket start -> {stored sentiment: [count, weight]}, as in Rollups.buckets
+            granularity (str): The granularity of the buckets
+        """
+        self.granularity = granularity
+        self.starts = array('q', sorted(buckets))
+        self.labels = [bucket_label(start, granularity) for start in self.starts]
+        counts = [[0] * len(self.starts) for _ in SENTIMENT_BUCKETS]
+        weights = [[0] * len(self.starts) for _ in SENTIMENT_BUCKETS]
+        for position, start in enumerate(self.starts):
+            for sentiment, (count, weight) in buckets[start].items():
+                code = SENTIMENT_CODES.get(sentiment, OTHERS_CODE)
+                counts[code][position] += count
+                weights[code][position] += weight
+        self.counts = [array('q', values) for values in counts]
+        self.weights = [array('q', values) for values in weights]
+        self.prefix_weights = [array('q', accumulate(values, initial=0)) for values in weights]
+
+
+class SentimentDataModel:
+    """
+    Read-only indexes over the analyzed data, built once when the data is loaded
+
+    Items are read from time-sorted columns, with prefix sums of each sentiment bucket,
+    so the counts of a date range cost two bisects and one subtraction per bucket.
+    Timelines come from the UTC hour/day/week/month rollups (see storage.rollups):
+    whole buckets are read as they are, and only the buckets cut by the range edges
+    are recounted, from the hourly rollup and the items of the partial hours. Keyword frequencies and the
+    score order of the posts are computed up front; records are only rebuilt for the
+    posts a response returns.
+
+    Keywords are grouped by their stem (see sentiment_analysis.keywords), so data
+    analyzed before normalization merges "Review" and "reviews" too; each group is
+    reported as its most frequent normalized form. Every group has a posting list of
+    the items mentioning it, in time order, for keyword search.
+    """
+
+    def __init__(self, data, rollups=None):
+        """
+        Args:
+            data (ColumnarData): The analyzed data, e.g. mmapped from analyzed_reddit_data.columns
+            rollups (Rollups): The data's time-bucketed rollups, built from the data if not given
+        """
+        self.data = data
+        self.timestamps = data.timestamps
+        n_items = len(data)
+
+        # Map each stored sentiment to its bucket code in one pass over the raw ids
+        bucket_table = bytes(
+            SENTIMENT_CODES.get(data.sentiments[sentiment_id], OTHERS_CODE) if sentiment_id < len(data.sentiments) else OTHERS_CODE
+            for sentiment_id in range(256)
+        )
+        self.sentiment_codes = bytes(data.sentiment_ids).translate(bucket_table)
+
+        # prefix_counts[code][i] is the number of items with that code among the first i items
+        self.prefix_counts = [
+            array('I', accumulate(map(code.__eq__, self.sentiment_codes), initial=0))
+            for code in range(len(SENTIMENT_BUCKETS))
+        ]
+
+        # Timeline buckets of every granularity, from the rollups saved with the data when they are current
+        if rollups is None:
+            rollups = Rollups.from_columns(data)
+        self.series = {
+            granularity: RollupSeries(rollups.buckets[granularity], granularity) for granularity in GRANULARITIES
+        }
+
+        # Keyword occurrences are counted by (sentiment bucket code, keyword ref) without touching the strings
+        keyword_counts = Counter(zip(self._occurrence_codes(0, n_items), data.keyword_refs))
+        ref_counts = Counter()
+        for (_, keyword_ref), count in keyword_counts.items():
+            ref_counts[keyword_ref] += count
+
+        # Each distinct keyword string is mapped to the group of its stem
+        self.keyword_groups = {}
+        self.group_ids = {}
+        group_forms = []
+        for keyword_ref, count in ref_counts.items():
+            keyword = normalize_keyword(data.string(keyword_ref))
+            stem = keyword_stem(keyword)
+            if not stem:
+                continue
+            group = self.group_ids.setdefault(stem, len(self.group_ids))
+            if group == len(group_forms):
+                group_forms.append(Counter())
+            group_forms[group][keyword] += count
+            self.keyword_groups[keyword_ref] = group
+        self.group_names = [forms.most_common(1)[0][0] for forms in group_forms]
+
+        keyword_counters = {}
+        all_keywords = Counter()
+        for (code, keyword_ref), count in keyword_counts.items():
+            group = self.keyword_groups.get(keyword_ref)
+            if group is None:
+                continue
+            keyword = self.group_names[group]
+            keyword_counters.setdefault(SENTIMENT_BUCKETS[code], Counter())[keyword] += count
+            all_keywords[keyword] += count
+        self.keywords_by_sentiment = {
+            sentiment: self._sorted_keywords(counter) for sentiment, counter in keyword_counters.items()
+        }
+        self.all_keywords = self._sorted_keywords(all_keywords)
+
+        # Posting list of each group: the indexes of the items mentioning it, ascending and so in time order
+        self.postings = [array('I') for _ in self.group_names]
+        last_item = [-1] * len(self.group_names)
+        offsets = data.keyword_offsets
+        occurrence_items = chain.from_iterable(map(repeat, range(n_items), map(sub, offsets[1:], offsets[:-1])))
+        for index, group in zip(occurrence_items, map(self.keyword_groups.get, data.keyword_refs)):
+            # An item naming two variants of a keyword is listed once
+            if group is not None and last_item[group] != index:
+                self.postings[group].append(index)
+                last_item[group] = index
+
+        # Item indexes of the posts, highest score first
+        self.post_order = array('I', sorted(
+            compress(range(n_items), map(KIND_POST.__eq__, data.kinds)),
+            key=data.scores.__getitem__,
+            reverse=True
+        ))
+        self.post_positions = {
+            data.string(data.id_refs[index]): position for position, index in enumerate(self.post_order)
+        }
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds the model from analyzed records, e.g. read from analyzed_reddit_data.jsonl"""
+        return cls(ColumnarData.from_records(records))
+
+    @property
+    def posts_by_score(self):
+        return [self.data.record(index) for index in self.post_order]
+
+    def _occurrence_codes(self, lo, hi):
+        """Sentiment bucket code of every keyword occurrence of items lo..hi, aligned with their keyword refs"""
+        offsets = self.data.keyword_offsets
+        counts = map(sub, offsets[lo + 1:hi + 1], offsets[lo:hi])
+        return chain.from_iterable(map(repeat, self.sentiment_codes[lo:hi], counts))
+
+    @staticmethod
+    def _sorted_keywords(counter):
+        return [{"keyword": kw, "frequency": freq} for kw, freq in counter.most_common()]
+
+    def index_range(self, start_timestamp=None, end_timestamp=None):
+        """Returns the [lo, hi) slice of time-sorted items created within the range"""
+        lo = bisect_left(self.timestamps, start_timestamp) if start_timestamp else 0
+        hi = bisect_right(self.timestamps, end_timestamp) if end_timestamp else len(self.timestamps)
+        return lo, max(lo, hi)
+
+    def range_values(self, start=None, end=None, weighted=False):
+        """
+        Item count, or score weight, of each sentiment bucket for items created at or after
+        `start` and before `end`
+
+        Counts come from the item prefix sums. Weights of the whole hours in the range
+        come from the hourly rollup, and those of the partial hours at either end from
+        their items.
+
+        Returns:
+            list: Values indexed by sentiment bucket code
+        """
+        timestamps = self.timestamps
+        lo = bisect_left(timestamps, start) if start is not None else 0
+        hi = bisect_left(timestamps, end) if end is not None else len(timestamps)
+        hi = max(lo, hi)
+        if not weighted:
+            return [prefix[hi] - prefix[lo] for prefix in self.prefix_counts]
+
+        hours = self.series["hour"]
+        first_hour = bisect_left(hours.starts, start) if start is not None else 0
+        end_hour = bisect_right(hours.starts, end - HOUR) if end is not None else len(hours.starts)
+        if first_hour >= end_hour:
+            return self._item_weights(lo, hi)
+        values = [prefix[end_hour] - prefix[first_hour] for prefix in hours.prefix_weights]
+        whole_lo = bisect_left(timestamps, hours.starts[first_hour], lo, hi)
+        whole_hi = bisect_left(timestamps, hours.starts[end_hour - 1] + HOUR, lo, hi)
+        for partial in (self._item_weights(lo, whole_lo), self._item_weights(whole_hi, hi)):
+            values = list(map(int.__add__, values, partial))
+        return values
+
+    def _item_weights(self, lo, hi):
+        values = [0] * len(SENTIMENT_BUCKETS)
+        for code, score in zip(self.sentiment_codes[lo:hi], self.data.scores[lo:hi]):
+            values[code] += max(score, 0)
+        return values
+
+    @staticmethod
+    def _bucket_values(values, only=None):
+        return {
+            sentiment: value if only is None or only == sentiment else 0
+            for sentiment, value in zip(SENTIMENT_BUCKETS, values)
+        }
+
+    def sentiment_timeline(self, start_timestamp=None, end_timestamp=None, sentiment=None, granularity="day",
+                           weighted=False):
+        """
+        Sentiment counts per UTC time bucket and overall for items created within the range
+
+        Args:
+            start_timestamp (float): Optional Unix timestamp of the range start
+            end_timestamp (float): Optional Unix timestamp of the range end, inclusive
+            sentiment (str): Optional bucket from SENTIMENT_BUCKETS; other buckets count as 0
+            granularity (str): "hour", "day", "week" (starting on Monday) or "month"
+            weighted (bool): Sum the items' scores, negative scores counting as 0, instead of counting them
+
+        Returns:
+            tuple: (timeline list of per-bucket values in time order, overall values dict)
+        """
+        series = self.series[granularity]
+        start = start_timestamp or None
+        # The range end is inclusive; internally ranges end before their end
+        end = nextafter(end_timestamp, inf) if end_timestamp else None
+
+        first = max(bisect_right(series.starts, start) - 1, 0) if start is not None else 0
+        last = bisect_left(series.starts, end) if end is not None else len(series.starts)
+        columns = [
+            column[first:last] if sentiment is None or sentiment == SENTIMENT_BUCKETS[code] else repeat(0)
+            for code, column in enumerate(series.weights if weighted else series.counts)
+        ]
+        timeline = [
+            {'date': label, 'timestamp': bucket, **dict(zip(SENTIMENT_BUCKETS, values))}
+            for bucket, label, *values in zip(series.starts[first:last], series.labels[first:last], *columns)
+        ]
+
+        overall = self._bucket_values(self.range_values(start, end, weighted), sentiment)
+        if not timeline:
+            return timeline, overall
+
+        # Only the first and last buckets can be cut by the range; they are recounted over the part within it
+        for position in sorted({0, len(timeline) - 1}, reverse=True):
+            bucket = timeline[position]['timestamp']
+            next_bucket = bucket_end(bucket, granularity)
+            part_start = max(start, bucket) if start is not None else bucket
+            part_end = min(end, next_bucket) if end is not None else next_bucket
+            if part_start == bucket and part_end == next_bucket:
+                continue
+            if any(self.range_values(part_start, part_end)):
+                timeline[position].update(self._bucket_values(self.range_values(part_start, part_end, weighted), sentiment))
+            else:
+                del timeline[position]
+        return timeline, overall
+
+    def top_keywords(self, sentiment=None, start_timestamp=None, end_timestamp=None):
+        """
+        Keyword frequencies, most frequent first, for items in the sentiment bucket and within the range
+
+        Without a date range the precomputed lists are returned as they are; with one,
+        only the items in the range are counted.
+        """
+        if not start_timestamp and not end_timestamp:
+            if sentiment is None:
+                return self.all_keywords
+            return self.keywords_by_sentiment.get(sentiment, [])
+
+        lo, hi = self.index_range(start_timestamp, end_timestamp)
+        data = self.data
+        refs = data.keyword_refs[data.keyword_offsets[lo]:data.keyword_offsets[hi]]
+        if sentiment is not None:
+            code = SENTIMENT_BUCKETS.index(sentiment)
+            refs = compress(refs, map(code.__eq__, self._occurrence_codes(lo, hi)))
+        counter = Counter()
+        for keyword_ref, count in Counter(refs).items():
+            group = self.keyword_groups.get(keyword_ref)
+            if group is not None:
+                counter[self.group_names[group]] += count
+        return self._sorted_keywords(counter)
+
+    def top_posts(self, sentiment=None, start_timestamp=None, end_timestamp=None, cursor=None, limit=None):
+        """
+        A page of posts sorted by score in descending order
+
+        Args:
+            sentiment (str): Optional bucket from SENTIMENT_BUCKETS the posts must be in
+            start_timestamp (float): Optional Unix timestamp of the range start
+            end_timestamp (float): Optional Unix timestamp of the range end
+            cursor (str): ID of the last post of the previous page, None for the first page
+            limit (int): Maximum number of posts on the page, None for all
+
+        Returns:
+            tuple: (posts on the page, total matching posts, cursor of the next page or None)
+
+        Raises:
+            KeyError: If the cursor is not the ID of a post
+        """
+        code = SENTIMENT_BUCKETS.index(sentiment) if sentiment is not None else None
+        sentiment_codes, timestamps = self.sentiment_codes, self.timestamps
+
+        def matches(index):
+            created = timestamps[index]
+            return (sentiment is None or sentiment_codes[index] == code) and \
+                (not start_timestamp or created >= start_timestamp) and \
+                (not end_timestamp or created <= end_timestamp)
+
+        filtered = sentiment is not None or start_timestamp or end_timestamp
+        start = self.post_positions[cursor] + 1 if cursor is not None else 0
+
+        page = []
+        next_cursor = None
+        for index in self.post_order[start:] if not filtered else filter(matches, self.post_order[start:]):
+            if limit is not None and len(page) == limit:
+                next_cursor = page[-1]['id']
+                break
+            page.append(self.data.record(index))
+
+        total = sum(1 for _ in filter(matches, self.post_order)) if filtered else len(self.post_order)
+        return page, total, next_cursor
+
+    def _cursor_index(self, cursor):
+        """Item index of a search cursor "<index>:<id>", checked against the item's ID"""
+        index, _, item_id = cursor.partition(":")
+        try:
+            index = int(index)
+        except ValueError:
+            raise KeyError(cursor)
+        if not 0 <= index < len(self.data) or self.data.string(self.data.id_refs[index]) != item_id:
+            raise KeyError(cursor)
+        return index
+
+    def search(self, keywords, sentiment=None, start_timestamp=None, end_timestamp=None, cursor=None, limit=None):
+        """
+        A page of the posts and comments mentioning all the keywords, newest first
+
+        The posting list of the rarest keyword is cut to the date range with two bisects
+        and intersected with the others, so the cost depends on the matching items
+        rather than on the size of the data.
+
+        Args:
+            keywords (list): Keywords the items must all mention, in any variant
+            sentiment (str): Optional bucket from SENTIMENT_BUCKETS the items must be in
+            start_timestamp (float): Optional Unix timestamp of the range start
+            end_timestamp (float): Optional Unix timestamp of the range end
+            cursor (str): `next_cursor` of the previous page, None for the first page
+            limit (int): Maximum number of items on the page, None for all
+
+        Returns:
+            tuple: (records on the page, total matching items, cursor of the next page or None)
+
+        Raises:
+            KeyError: If the cursor is not the cursor of an item
+        """
+        end = self._cursor_index(cursor) if cursor is not None else None
+        postings = []
+        for keyword in keywords:
+            group = self.group_ids.get(keyword_stem(keyword))
+            if group is None:
+                return [], 0, None
+            postings.append(self.postings[group])
+        if not postings:
+            return [], 0, None
+
+        postings.sort(key=len)
+        lo, hi = self.index_range(start_timestamp, end_timestamp)
+        rarest = postings[0]
+        matches = rarest[bisect_left(rarest, lo):bisect_left(rarest, hi)]
+        for other in postings[1:]:
+            matches = intersect_postings(matches, other)
+        if sentiment is not None:
+            code = SENTIMENT_BUCKETS.index(sentiment)
+            matches = array('I', compress(matches, map(code.__eq__, map(self.sentiment_codes.__getitem__, matches))))
+
+        # Matches are in time order; pages are taken from the end backwards
+        page_end = bisect_left(matches, end) if end is not None else len(matches)
+        page_start = max(0, page_end - limit) if limit is not None else 0
+        page = [self.data.record(index) for index in reversed(matches[page_start:page_end])]
+        next_cursor = None
+        if page_start > 0:
+            index = matches[page_start]
+            next_cursor = f"{index}:{self.data.string(self.data.id_refs[index])}"
+        return page, len(matches), next_cursor
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from api.data_model import SentimentDataModel
+from monitoring import metrics
+from storage.columnar import ColumnarData, columnar_path
+from storage.jsonl import iter_records, resolve_path
+from storage.rollups import load_rollups, rollups_path
+
+DATA_RELOADS = metrics.counter("data_store_reloads_total", "Loads of the analyzed data file, by outcome", ("outcome",))
+DATA_LOAD_SECONDS = metrics.histogram("data_store_load_seconds", "Time to load the analyzed data and build its indexes")
+DATA_ITEMS = metrics.gauge("data_store_items", "Items in the current data snapshot")
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """An immutable view of one version of the analyzed data file"""
+    version: int
+    data: ColumnarData
+    model: SentimentDataModel
+    file_signature: tuple
+    rollups_signature: Optional[tuple]
+    loaded_at: float
+    load_seconds: float
+
+
+def file_signature(path) -> Optional[tuple]:
+    """Identifies a version of a file by inode, modification time and size, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def resolve_data_path(path):
+    """
+    Returns the file to load the analyzed data from
+
+    The analyzer writes a columnar artifact next to the JSONL file, which loads by
+    mmap instead of parsing; it is used unless the JSON/JSONL file is newer.
+    """
+    json_path = resolve_path(path)
+    columns_path = columnar_path(path)
+    try:
+        columns_mtime = os.stat(columns_path).st_mtime_ns
+    except FileNotFoundError:
+        return json_path
+    try:
+        if os.stat(json_path).st_mtime_ns > columns_mtime:
+            return json_path
+    except FileNotFoundError:
+        pass
+    return columns_path
+
+
+def load_sentiment_data(path) -> ColumnarData:
+    """Load the analyzed sentiment data, memory-mapping a columnar file or streaming JSONL records."""
+    if Path(path).suffix == ".columns":
+        return ColumnarData.open(path)
+    return ColumnarData.from_records(iter_records(path))
+
+
+class DataStore:
+    """
+    Serves the latest analyzed data, reloading it in the background when the file changes
+
+    A watcher thread polls the inode/mtime/size of the file and of the rollups saved
+    next to it, which the analyzer replaces after the data. When either changes it loads the
+    file and builds a new `SentimentDataModel` off the request path, then swaps the
+    snapshot in with a single reference assignment, so readers always see either the
+    old or the new snapshot in full. A failed reload keeps serving the old snapshot.
+    """
+
+    def __init__(self, path, poll_interval=5.0):
+        """
+        Args:
+            path (Path): The analyzed JSONL file; its .columns artifact is read instead when up to date,
+                and its legacy .json sibling while neither exists
+            poll_interval (float): Seconds between checks for a changed file
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.snapshot: Optional[DataSnapshot] = None
+        self.last_error: Optional[Exception] = None
+        self.last_checked_at: Optional[float] = None
+        self.reload_count = 0
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def reload_if_changed(self) -> bool:
+        """
+        Loads the data file if it changed since the current snapshot
+
+        Returns:
+            bool: True if a new snapshot was swapped in
+        """
+        with self._reload_lock:
+            self.last_checked_at = time.time()
+            # Prefer the columnar artifact; fall back to a legacy analyzed_reddit_data.json
+            # until the pipeline writes JSONL
+            path = resolve_data_path(self.path)
+            signature = file_signature(path)
+            if signature is None:
+                self.last_error = FileNotFoundError(f"Sentiment data file not found: {self.path}")
+                return False
+            # A reload between the analyzer's two writes pairs the new data with the old
+            # rollups; the rollups' own signature brings the new ones in once they are saved
+            rollups_signature = file_signature(rollups_path(path))
+            if self.snapshot is not None and (self.snapshot.file_signature, self.snapshot.rollups_signature) == \
+                    (signature, rollups_signature):
+                return False
+
+            start = time.perf_counter()
+            try:
+                data = load_sentiment_data(path)
+                # The analyzer keeps the rollups up to date incrementally; stale ones are rebuilt from the data
+                model = SentimentDataModel(data, load_rollups(path, len(data)))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.last_error = e
+                DATA_RELOADS.inc(outcome="error")
+                return False
+
+            version = self.snapshot.version + 1 if self.snapshot else 1
+            self.snapshot = DataSnapshot(
+                version=version,
+                data=data,
+                model=model,
+                file_signature=signature,
+                rollups_signature=rollups_signature,
+                loaded_at=time.time(),
+                load_seconds=time.perf_counter() - start
+            )
+            self.last_error = None
+            self.reload_count += 1
+            DATA_RELOADS.inc(outcome="ok")
+            DATA_LOAD_SECONDS.observe(self.snapshot.load_seconds)
+            DATA_ITEMS.set(len(data))
+            return True
+
+    def current(self) -> Optional[DataSnapshot]:
+        """Returns the current snapshot, loading synchronously only if none was ever loaded"""
+        if self.snapshot is None:
+            self.reload_if_changed()
+        return self.snapshot
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload_if_changed()
+
+    def start(self):
+        """Loads the data and starts the background watcher thread"""
+        self.reload_if_changed()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="data-store-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def status(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "data_file": str(resolve_data_path(self.path)),
+            "watching": self._thread is not None,
+            "poll_interval": self.poll_interval,
+            "snapshot_version": snapshot.version if snapshot else None,
+            "items": len(snapshot.data) if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "load_seconds": snapshot.load_seconds if snapshot else None,
+            "reload_count": self.reload_count,
+            "last_checked_at": self.last_checked_at,
+            "last_error": str(self.last_error) if self.last_error else None,
+        }
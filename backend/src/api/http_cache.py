@@ -0,0 +1,193 @@
+import asyncio
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+from api.data_store import DataSnapshot
+
+
+def snapshot_etag(snapshot: DataSnapshot, path: str, query_params) -> str:
+    """
+    Strong ETag for a response computed from a snapshot
+
+    The tag covers the identity of the data and rollups files and the request, so it
+    changes whenever the pipeline rewrites either file or the query asks for something else.
+
+    Args:
+        snapshot (DataSnapshot): The snapshot the response is computed from
+        path (str): The request path
+        query_params: The request's query parameters, as (name, value) pairs
+
+    Returns:
+        str: The quoted ETag
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((snapshot.file_signature, snapshot.rollups_signature)).encode())
+    digest.update(path.encode())
+    digest.update(repr(sorted(query_params)).encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def snapshot_last_modified(snapshot: DataSnapshot) -> str:
+    """HTTP date of the last modification of the data file or its rollups"""
+    mtime_ns = max(snapshot.file_signature[1], snapshot.rollups_signature[1] if snapshot.rollups_signature else 0)
+    return formatdate(mtime_ns // 1_000_000_000, usegmt=True)
+
+
+def is_not_modified(headers, etag: str, last_modified: str) -> bool:
+    """
+    Whether the client's cached copy is still current
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def accepts_gzip(headers) -> bool:
+    """Whether the client's Accept-Encoding allows a gzip body"""
+    for coding in headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") != "q=0"
+    return False
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    """A serialized response body, and its gzip encoding if it was worth compressing"""
+    body: bytes
+    gzipped: Optional[bytes]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzipped or b"")
+
+
+class ResponseCache:
+    """
+    Serialized response bodies of the current data snapshot, bounded by size
+
+    Entries are keyed by request path and query, and belong to one snapshot version:
+    the first lookup for a newer version drops everything cached for the old one.
+    When the bodies exceed `max_bytes` the least recently used are evicted.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, gzip_min_bytes=1024, gzip_level=6):
+        """
+        Args:
+            max_bytes (int): Total size of the cached bodies, 0 to disable caching
+            gzip_min_bytes (int): Bodies at least this large are also stored gzipped, None to never gzip
+            gzip_level (int): gzip compression level
+        """
+        self.max_bytes = max_bytes
+        self.gzip_min_bytes = gzip_min_bytes
+        self.gzip_level = gzip_level
+        self.version = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _switch_version(self, version):
+        # Snapshot versions only grow, so a request still holding an older snapshot keeps the cache
+        if self.version is None or version > self.version:
+            self._entries.clear()
+            self.size = 0
+            self.version = version
+
+    def get(self, version, key) -> Optional[CachedBody]:
+        with self._lock:
+            self._switch_version(version)
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, version, key, body: bytes) -> CachedBody:
+        """Stores a serialized body, gzipping it if large enough, and returns the entry"""
+        gzipped = None
+        if self.gzip_min_bytes is not None and len(body) >= self.gzip_min_bytes:
+            gzipped = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        entry = CachedBody(body, gzipped)
+
+        with self._lock:
+            self._switch_version(version)
+            # A body from an older snapshot, or too large to ever fit, is served but not kept
+            if version != self.version or entry.size > self.max_bytes:
+                return entry
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class RequestCoalescer:
+    """
+    Shares one computation between concurrent requests for the same key
+
+    The first request for a key starts the computation as a task; requests for the
+    key arriving before it finishes await the same task instead of starting their own.
+    A waiter that is cancelled, e.g. because its client disconnected, does not cancel
+    the computation the others are waiting for.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.joined = 0
+        self._in_flight = {}
+
+    def __contains__(self, key) -> bool:
+        return key in self._in_flight
+
+    async def run(self, key, compute: Callable[[], Awaitable]):
+        """Returns the result of `compute()`, or of the computation already in flight for `key`"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.started += 1
+        else:
+            self.joined += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {'in_flight': len(self._in_flight), 'started': self.started, 'joined': self.joined}
@@ -1,17 +1,83 @@
-from fastapi import FastAPI, HTTPException
-import json
-from datetime import datetime
-from typing import Optional, Dict
-from enum import Enum
-from collections import Counter
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+import asyncio
+import orjson
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Callable, Optional, Dict, List
 from pathlib import Path
-from functools import lru_cache
 from fastapi.middleware.cors import CORSMiddleware
+from sentiment_analysis.schema import Sentiment
+from api.data_model import SENTIMENT_BUCKETS, SentimentDataModel
+from storage.rollups import GRANULARITIES
+from api.data_store import DataSnapshot, DataStore
+from api.http_cache import (
+    RequestCoalescer, ResponseCache, accepts_gzip, is_not_modified, snapshot_etag, snapshot_last_modified
+)
+from api.request_metrics import RequestMetricsMiddleware
+from sentiment_analysis.keywords import normalize_keyword
+from monitoring import metrics
+
+# Constants
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATA_FILE = Path(os.environ.get("ANALYZED_DATA_FILE", "/app/data/analyzed/analyzed_reddit_data.jsonl"))
+DATA_RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", 5))
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+RESPONSE_CACHE_MAX_MB = float(os.environ.get("RESPONSE_CACHE_MAX_MB", 64))
+RESPONSE_CACHE_GZIP = os.environ.get("RESPONSE_CACHE_GZIP", "1") != "0"
+API_BUILD_THREADS = int(os.environ.get("API_BUILD_THREADS", 1))
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RESPONSE_CACHE_LOOKUPS = metrics.counter(
+    "api_response_cache_total",
+    "Cached responses: bodies served from cache, built, shared with a concurrent build, or answered with 304",
+    ("result",)
+)
+
+# Reloads the analyzed data in the background whenever the pipeline rewrites it
+data_store = DataStore(DATA_FILE, poll_interval=DATA_RELOAD_INTERVAL)
+
+# Serialized responses of the current snapshot, so repeat queries skip building and encoding them
+response_cache = ResponseCache(
+    max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+    gzip_min_bytes=1024 if RESPONSE_CACHE_GZIP else None,
+)
+
+# Data loads and response builds run on these threads, so a slow one does not hold up the event loop;
+# API_BUILD_THREADS=0 runs them on the event loop instead. Builds are CPU-bound Python and hold the GIL,
+# so a second build thread adds no throughput, only more GIL contention for the event loop: builds run
+# one at a time by default
+build_executor = ThreadPoolExecutor(API_BUILD_THREADS, thread_name_prefix="api-build") if API_BUILD_THREADS > 0 else None
+
+# Concurrent requests for a response that is not cached yet share one build
+build_coalescer = RequestCoalescer()
+
+async def run_off_loop(function: Callable, *args):
+    """Run a blocking function on the build threads and wait for its result without blocking the event loop."""
+    if build_executor is None:
+        return function(*args)
+    return await asyncio.get_running_loop().run_in_executor(build_executor, function, *args)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the data and build its indexes before serving the first request
+    await run_off_loop(data_store.start)
+    yield
+    await run_off_loop(data_store.stop)
 
 app = FastAPI(
     docs="/",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# Per-route request counts and latency for /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -21,29 +87,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class Sentiment(str, Enum):
-    POSITIVE = "positive"
-    NEGATIVE = "negative"
-    NEUTRAL = "neutral"
-
-# Constants
-DATE_FORMAT = "%Y-%m-%d"
-DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
-DATA_FILE = Path("/app/data/analyzed/analyzed_reddit_data.json")
-
-@lru_cache()
-def load_sentiment_data() -> list:
-    """Load and cache the sentiment data."""
-    try:
-        with open(DATA_FILE, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Sentiment data file not found")
-    except json.JSONDecodeError:
+async def get_snapshot() -> DataSnapshot:
+    """Return the current data snapshot, or raise if no data could be loaded."""
+    snapshot = data_store.snapshot
+    if snapshot is None:
+        # Nothing loaded at startup, e.g. the file did not exist yet: try again off the event loop
+        snapshot = await run_off_loop(data_store.current)
+    if snapshot is None:
+        if isinstance(data_store.last_error, FileNotFoundError):
+            raise HTTPException(status_code=404, detail="Sentiment data file not found")
         raise HTTPException(status_code=500, detail="Error parsing sentiment data")
+    return snapshot
 
 def parse_date(date_str: Optional[str], is_end_date: bool = False) -> Optional[float]:
-    """Parse date string to timestamp with validation."""
+    """Parse a UTC date string to a timestamp with validation."""
     if not date_str:
         return None
     
@@ -52,141 +109,283 @@ def parse_date(date_str: Optional[str], is_end_date: bool = False) -> Optional[f
             dt = datetime.strptime(f"{date_str} 23:59:59", DATETIME_FORMAT)
         else:
             dt = datetime.strptime(date_str, DATE_FORMAT)
-        return dt.timestamp()
+        return dt.replace(tzinfo=timezone.utc).timestamp()
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid date format. Please use {DATE_FORMAT}"
         )
 
+def validate_sentiment(sentiment: Optional[str]) -> None:
+    """Reject a sentiment filter that is not a reported bucket; other stored sentiments are in "others"."""
+    if sentiment is not None and sentiment not in SENTIMENT_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sentiment. Please use one of {', '.join(SENTIMENT_BUCKETS)}"
+        )
+
+
+def build_body(snapshot: DataSnapshot, key: tuple, build: Callable[[SentimentDataModel], Dict]):
+    """Build, serialize and cache a response body; runs on the build threads."""
+    return response_cache.put(snapshot.version, key, orjson.dumps(build(snapshot.model)))
+
+async def cached_response(request: Request, build: Callable[[SentimentDataModel], Dict]) -> Response:
+    """
+    Serve the response built from the current snapshot, from the response cache if possible.
+
+    Sets ETag and Last-Modified so clients can revalidate, answering 304 while their copy
+    is current. Otherwise the body comes from the cache, or is built with `build`, serialized
+    with orjson and cached. Builds run off the event loop, and concurrent requests for the
+    same uncached response wait for one shared build. Clients accepting gzip get the
+    pre-compressed body.
+    """
+    snapshot = await get_snapshot()
+    query_params = sorted(request.query_params.multi_items())
+    etag = snapshot_etag(snapshot, request.url.path, query_params)
+    last_modified = snapshot_last_modified(snapshot)
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Cache-Control": "no-cache"}
+    if RESPONSE_CACHE_GZIP:
+        headers["Vary"] = "Accept-Encoding"
+
+    if is_not_modified(request.headers, etag, last_modified):
+        RESPONSE_CACHE_LOOKUPS.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    key = (request.url.path, tuple(query_params))
+    cached = response_cache.get(snapshot.version, key)
+    if cached is None:
+        build_key = (snapshot.version, key)
+        RESPONSE_CACHE_LOOKUPS.inc(result="coalesced" if build_key in build_coalescer else "miss")
+        cached = await build_coalescer.run(build_key, lambda: run_off_loop(build_body, snapshot, key, build))
+    else:
+        RESPONSE_CACHE_LOOKUPS.inc(result="hit")
+
+    if cached.gzipped is not None and accepts_gzip(request.headers):
+        headers["Content-Encoding"] = "gzip"
+        return Response(cached.gzipped, media_type="application/json", headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+def resolve_range(
+    start_timestamp: Optional[float],
+    end_timestamp: Optional[float],
+    start: Optional[str],
+    end: Optional[str]
+) -> tuple:
+    """Combine timestamp and date string range parameters, the timestamps taking precedence."""
+    if start_timestamp is None:
+        start_timestamp = parse_date(start)
+    if end_timestamp is None:
+        end_timestamp = parse_date(end, is_end_date=True)
+    return start_timestamp, end_timestamp
+
 
 @app.get("/sentiment-analysis")
 async def get_sentiment_analysis(
+    request: Request,
     start_timestamp: Optional[float] = None,
-    end_timestamp: Optional[float] = None
+    end_timestamp: Optional[float] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    granularity: str = "day",
+    weighted: bool = False
 ) -> Dict:
     """
-    Get sentiment analysis with optional date range filtering.
-    Returns daily sentiment counts for graphing.
+    Get sentiment analysis with optional date range and sentiment filtering.
+    Returns sentiment counts per UTC hour, day, week or month for graphing.
     
     Args:
         start_timestamp: Optional Unix timestamp for start date
         end_timestamp: Optional Unix timestamp for end date
+        start: Optional start date (YYYY-MM-DD, UTC), used if start_timestamp is not given
+        end: Optional end date (YYYY-MM-DD, UTC, inclusive), used if end_timestamp is not given
+        sentiment: Optional sentiment to count; the other sentiments are reported as 0
+        granularity: Timeline bucket size: hour, day, week (starting on Monday) or month
+        weighted: Report the summed scores of the posts and comments instead of their number
     
     Returns:
         Dict containing:
-        - timeline: List of daily sentiment counts
+        - timeline: List of sentiment counts per time bucket
         - overall: Total sentiment counts for the period
     """
-    # Load data
-    data = load_sentiment_data()
-    
-    # Initialize counters
-    daily_sentiments = {}
-    overall_counter = Counter()
-    
-    # Define standard sentiment values
-    standard_sentiments = [Sentiment.POSITIVE, Sentiment.NEGATIVE, Sentiment.NEUTRAL, "others"]
-    
-    for item in data:
-        created_time = item['created_utc']
-        
-        # Skip if outside date range
-        if (start_timestamp and created_time < start_timestamp) or \
-           (end_timestamp and created_time > end_timestamp):
-            continue
-            
-        # Convert timestamp to date string for grouping
-        date_str = datetime.fromtimestamp(created_time).strftime('%Y-%m-%d')
-        
-        # Initialize counter for new dates
-        if date_str not in daily_sentiments:
-            daily_sentiments[date_str] = {
-                'date': date_str,
-                **{sentiment: 0 for sentiment in standard_sentiments}
+    validate_sentiment(sentiment)
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid granularity. Please use one of {', '.join(GRANULARITIES)}"
+        )
+    start_timestamp, end_timestamp = resolve_range(start_timestamp, end_timestamp, start, end)
+
+    def build(model: SentimentDataModel) -> Dict:
+        # Whole buckets are read from the precomputed rollups
+        timeline, overall = model.sentiment_timeline(start_timestamp, end_timestamp, sentiment, granularity, weighted)
+        return {
+            "granularity": granularity,
+            "weighted": weighted,
+            "timeline": timeline,
+            "overall": {
+                **overall,
+                "total": sum(overall.values())
             }
-        
-        # Categorize sentiment
-        sentiment = item['sentiment']
-        if sentiment not in [Sentiment.POSITIVE, Sentiment.NEGATIVE, Sentiment.NEUTRAL]:
-            sentiment = "others"
-        
-        # Update both counters
-        daily_sentiments[date_str][sentiment] += 1
-        overall_counter[sentiment] += 1
-    
-    # Convert daily sentiments to sorted list
-    timeline = sorted(daily_sentiments.values(), key=lambda x: x['date'])
-    
-    return {
-        "timeline": timeline,
-        "overall": {
-            **{sentiment: overall_counter[sentiment] for sentiment in standard_sentiments},
-            "total": sum(overall_counter.values())
         }
-    }
+
+    return await cached_response(request, build)
 
 @app.get("/keywords")
-async def get_top_keywords_frequencies(sentiment: Optional[str] = None) -> Dict:
+async def get_top_keywords_frequencies(
+    request: Request,
+    sentiment: Optional[str] = None,
+    top_k: Optional[int] = Query(None, ge=1),
+    start_timestamp: Optional[float] = None,
+    end_timestamp: Optional[float] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Dict:
     """
     Get keywords frequencies. If sentiment is specified, filter by that sentiment.
     Otherwise, return frequencies across all sentiments.
     
     Args:
-        sentiment: Optional sentiment to filter by (positive/negative/neutral)
+        sentiment: Optional sentiment to filter by (positive/negative/neutral/others)
+        top_k: Optional number of most frequent keywords to return
+        start_timestamp: Optional Unix timestamp for start date
+        end_timestamp: Optional Unix timestamp for end date
+        start: Optional start date (YYYY-MM-DD), used if start_timestamp is not given
+        end: Optional end date (YYYY-MM-DD, inclusive), used if end_timestamp is not given
     
     Returns:
-        Dict containing sorted keywords and their frequencies
+        Dict containing sorted keywords and their frequencies, and the number of distinct keywords
     """
-    
-    # Load data
-    data = load_sentiment_data()
-    
-    # Count keyword frequencies
-    keyword_counter = Counter()
-    
-    for item in data:
-        # If sentiment is specified, only count keywords for that sentiment
-        if sentiment is None or item['sentiment'] == sentiment:
-            keyword_counter.update(item['keywords'])
-    
-    # Sort keywords by frequency in descending order
-    sorted_keywords = [
-        {"keyword": kw, "frequency": freq}
-        for kw, freq in keyword_counter.most_common()
-    ]
-    
-    return {
-        "sentiment": sentiment if sentiment else "all",
-        "keywords": sorted_keywords,
-        "total_keywords": len(sorted_keywords)
-    }
+    validate_sentiment(sentiment)
+    start_timestamp, end_timestamp = resolve_range(start_timestamp, end_timestamp, start, end)
+
+    def build(model: SentimentDataModel) -> Dict:
+        # Without a date range, keywords are counted and sorted once, when the data is loaded
+        sorted_keywords = model.top_keywords(sentiment, start_timestamp, end_timestamp)
+        return {
+            "sentiment": sentiment if sentiment else "all",
+            "keywords": sorted_keywords[:top_k] if top_k else sorted_keywords,
+            "total_keywords": len(sorted_keywords)
+        }
+
+    return await cached_response(request, build)
 
 @app.get("/top-posts")
-async def get_top_posts() -> Dict:
+async def get_top_posts(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    start_timestamp: Optional[float] = None,
+    end_timestamp: Optional[float] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Dict:
     """
-    Get all posts sorted by score in descending order.
+    Get a page of posts sorted by score in descending order.
+    
+    Args:
+        limit: Number of posts per page
+        cursor: Optional `next_cursor` of the previous page
+        sentiment: Optional sentiment to filter by
+        start_timestamp: Optional Unix timestamp for start date
+        end_timestamp: Optional Unix timestamp for end date
+        start: Optional start date (YYYY-MM-DD), used if start_timestamp is not given
+        end: Optional end date (YYYY-MM-DD, inclusive), used if end_timestamp is not given
     
     Returns:
-        Dict containing sorted posts and total count
+        Dict containing the posts of the page, the number of matching posts and
+        the cursor of the next page (null on the last page)
+    """
+    validate_sentiment(sentiment)
+    start_timestamp, end_timestamp = resolve_range(start_timestamp, end_timestamp, start, end)
+
+    def build(model: SentimentDataModel) -> Dict:
+        # Posts are sorted by score in descending order when the data is loaded
+        try:
+            posts, total_posts, next_cursor = model.top_posts(
+                sentiment, start_timestamp, end_timestamp, cursor, limit
+            )
+        except KeyError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return {
+            "posts": posts,
+            "total_posts": total_posts,
+            "next_cursor": next_cursor
+        }
+
+    return await cached_response(request, build)
+
+@app.get("/search")
+async def search_items(
+    request: Request,
+    keyword: List[str] = Query(..., min_length=1),
+    sentiment: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    start_timestamp: Optional[float] = None,
+    end_timestamp: Optional[float] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> Dict:
     """
-    # Load data
-    data = load_sentiment_data()
+    Get a page of the posts and comments mentioning all the keywords, newest first.
+    Variants of a keyword match too, e.g. "reviews" finds items with "Review" or "reviewed".
     
-    # Filter for posts (items with 'title' field)
-    posts = [item for item in data if 'title' in item]
+    Args:
+        keyword: Keywords to search for, repeated or comma-separated
+        sentiment: Optional sentiment to filter by
+        limit: Number of items per page
+        cursor: Optional `next_cursor` of the previous page
+        start_timestamp: Optional Unix timestamp for start date
+        end_timestamp: Optional Unix timestamp for end date
+        start: Optional start date (YYYY-MM-DD), used if start_timestamp is not given
+        end: Optional end date (YYYY-MM-DD, inclusive), used if end_timestamp is not given
     
-    # Sort posts by score in descending order
-    sorted_posts = sorted(
-        posts,
-        key=lambda x: x['score'],
-        reverse=True
-    )
+    Returns:
+        Dict containing the normalized keywords, the items of the page, the number of
+        matching items and the cursor of the next page (null on the last page)
+    """
+    keywords = [part for value in keyword for part in value.split(",") if normalize_keyword(part)]
+    if not keywords:
+        raise HTTPException(status_code=400, detail="No keyword to search for")
+    validate_sentiment(sentiment)
+    start_timestamp, end_timestamp = resolve_range(start_timestamp, end_timestamp, start, end)
+
+    def build(model: SentimentDataModel) -> Dict:
+        # Answered from the keyword posting lists built when the data is loaded
+        try:
+            items, total_items, next_cursor = model.search(
+                keywords, sentiment, start_timestamp, end_timestamp, cursor, limit
+            )
+        except KeyError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return {
+            "keywords": [normalize_keyword(part) for part in keywords],
+            "items": items,
+            "total_items": total_items,
+            "next_cursor": next_cursor
+        }
+
+    return await cached_response(request, build)
+
+@app.get("/status")
+async def get_status() -> Dict:
+    """
+    Get the state of the data store.
     
-    return {
-        "posts": sorted_posts,
-        "total_posts": len(sorted_posts)
-    }
+    Returns:
+        Dict containing the snapshot version, item count, load timing, the last reload error,
+        and the response cache and build statistics
+    """
+    return {**data_store.status(), "response_cache": response_cache.stats(), "builds": build_coalescer.stats()}
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """
+    Get the request, cache and data store metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.REGISTRY.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,401 @@
+"""
+Runs the scrape -> clean -> analyze pipeline as concurrent, streaming stages.
+
+Each stage runs in its own thread and hands its output to the next stage through a
+bounded queue, so cleaning starts on the first scraped submission and analysis on
+the first cleaned record, while a slow stage holds back the ones before it instead
+of letting work pile up in memory. A stage whose upstream stage is not selected
+reads that stage's last output file instead.
+"""
+import argparse
+import asyncio
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from monitoring import metrics
+from storage.jsonl import JsonlWriter, iter_records
+
+# Stages in dependency order; each consumes the output of the one before it
+STAGES = ("scrape", "clean", "analyze")
+QUEUE_SIZE = 256
+
+backend_dir = Path(__file__).resolve().parents[2]
+data_dir = backend_dir / "data"
+raw_file = data_dir / "raw" / "reddit_data.jsonl"
+processed_file = data_dir / "processed" / "processed_reddit_data.jsonl"
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """Raised in a stage when another stage failed, so it stops without committing its output"""
+
+
+@dataclass
+class StageReport:
+    """Timing and item count of one stage"""
+    name: str
+    items: int = 0
+    started_at: Optional[float] = None
+    first_item_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def record_item(self):
+        if self.first_item_at is None:
+            self.first_item_at = time.perf_counter()
+        self.items += 1
+
+    @property
+    def seconds(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+    def to_dict(self, started_at):
+        """The report with times relative to the pipeline start, for the JSON run report"""
+        def relative(moment):
+            return moment - started_at if moment is not None else None
+        return {
+            **asdict(self),
+            'started_at': relative(self.started_at),
+            'first_item_at': relative(self.first_item_at),
+            'finished_at': relative(self.finished_at),
+            'seconds': self.seconds,
+            'items_per_second': self.items / self.seconds if self.seconds else 0.0,
+        }
+
+
+class Channel:
+    """
+    Bounded queue between two stages
+
+    Puts block while the queue is full and gets while it is empty, both giving up
+    with `PipelineAborted` once the pipeline's abort event is set.
+    """
+
+    def __init__(self, abort, maxsize=QUEUE_SIZE):
+        self.abort = abort
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self.abort.is_set():
+                    raise PipelineAborted()
+
+    def close(self):
+        self.put(_DONE)
+
+    def get(self):
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.abort.is_set():
+                    raise PipelineAborted()
+
+    def __iter__(self):
+        while (item := self.get()) is not _DONE:
+            yield item
+
+    async def __aiter__(self):
+        # Wait in a worker thread, so the event loop keeps handling finished LLM calls
+        while (item := await asyncio.to_thread(self.get)) is not _DONE:
+            yield item
+
+
+def run_scrape(report, emit, job_path=None, since=None, workers=None):
+    """
+    Scrapes new submissions into the raw data file
+
+    When a downstream stage is listening, it first receives the submissions already
+    in the archive, then each new one as soon as it is stored, so the cleaner sees
+    the complete raw data without re-reading a file that is being appended to.
+    """
+    from scraping.reddit_scraper import create_reddit_client, load_job_spec, scrape
+
+    job = load_job_spec(job_path)
+    if since is not None:
+        job["since"] = since
+    if workers is not None:
+        job["workers"] = workers
+
+    reddit = create_reddit_client()
+    if emit is not None and (raw_file.exists() or raw_file.with_suffix(".json").exists()):
+        for submission in iter_records(raw_file):
+            emit(submission)
+
+    def on_post(submission):
+        report.record_item()
+        if emit is not None:
+            emit(submission)
+
+    scrape(reddit, job, raw_file, on_post=on_post)
+
+
+def run_clean(report, submissions, emit, min_score=None):
+    """Flattens submissions into post and comment records and rewrites the processed data file"""
+    from processing.data_cleaner import MIN_COMMENT_SCORE, iter_processed_records
+
+    min_score = MIN_COMMENT_SCORE if min_score is None else min_score
+    # The writer only replaces the processed file if the whole stream was cleaned
+    with JsonlWriter(processed_file) as writer:
+        for record in iter_processed_records(submissions, min_score):
+            writer.write(record)
+            report.record_item()
+            if emit is not None:
+                emit(record)
+
+
+def run_analyze(report, records, concurrency=None, fused=False, since=None, restart=False, triage=None,
+                siblings=None):
+    """Analyzes the pending records and rewrites the analyzed data files"""
+    # Imported here, so runs without the analyze stage do not load the analyzer
+    from sentiment_analysis import sentiment_analyzer
+
+    analyzed_ids = sentiment_analyzer.prepare_checkpoint(restart)
+    sentiment_analyzer.run_analysis(
+        records,
+        analyzed_ids,
+        concurrency or sentiment_analyzer.DEFAULT_CONCURRENCY,
+        fused=fused,
+        since=since,
+        show_progress=False,
+        on_record=lambda record: report.record_item(),
+        triage=triage,
+        siblings=siblings,
+    )
+
+
+def refresh_scores(reddit=None, since=None, batch_size=None):
+    """
+    Refreshes the scores of the stored posts and comments, and propagates them downstream
+
+    The current scores are fetched in bulk from Reddit's info endpoint into the raw
+    data, then set on the processed and analyzed data in place. Nothing is scraped,
+    cleaned or analyzed again.
+
+    Args:
+        reddit (praw.Reddit): The Reddit client, created from the credentials if not given
+        since (float): Optional Unix timestamp; older items keep their scores
+        batch_size (int): Fullnames per info request, at most 100
+
+    Returns:
+        dict: The raw refresh report, with the numbers of 'processed' and 'analyzed'
+            records whose score changed
+    """
+    from scraping.refresh import INFO_BATCH_SIZE, refresh_raw_scores
+
+    if reddit is None:
+        from scraping.reddit_scraper import create_reddit_client
+        reddit = create_reddit_client()
+
+    changed, report = refresh_raw_scores(reddit, raw_file, since, batch_size or INFO_BATCH_SIZE)
+    report['processed'] = report['analyzed'] = 0
+    if changed and (processed_file.exists() or processed_file.with_suffix(".json").exists()):
+        from processing.data_cleaner import refresh_scores as refresh_processed_scores
+        report['processed'] = refresh_processed_scores(processed_file, changed)
+    if changed:
+        from sentiment_analysis import sentiment_analyzer
+        report['analyzed'] = sentiment_analyzer.refresh_scores(changed)
+    return report
+
+
+def run_pipeline(stages=STAGES, since=None, job_path=None, workers=None, concurrency=None, fused=False,
+                 restart=False, min_score=None, use_cache=True, triage=True, triage_threshold=None,
+                 triage_sample=None, group_siblings=False, group_size=None):
+    """
+    Runs the selected stages concurrently, streaming records between adjacent ones
+
+    Args:
+        stages (iterable): Names from STAGES to run
+        since (float): Optional Unix timestamp; older submissions are not scraped and
+            older items are not analyzed
+        job_path (Path): Optional scrape job spec
+        workers (int): Scraper worker threads, overriding the job spec
+        concurrency (int): Items analyzed at once
+        fused (bool): Use one combined sentiment + keywords call per item
+        restart (bool): Discard the analyzer checkpoint and re-analyze every item
+        min_score (int): Minimum comment score kept by the cleaner
+        use_cache (bool): Reuse cached LLM answers
+        triage (bool): Label trivial items and reuse answers for duplicates without the LLM
+        triage_threshold (float): Lexicon confidence at which triage labels an item
+        triage_sample (float): Fraction of triaged items also sent to the LLM to measure agreement
+        group_siblings (bool): Send comments replying to the same parent in one LLM call
+        group_size (int): Most comments sent in one sibling-group call
+
+    Returns:
+        list: A StageReport per selected stage, in pipeline order. When a stage fails, the
+            stages still running are stopped without replacing their output files; their
+            reports record "aborted" and the failed stage's report its error.
+    """
+    selected = [name for name in STAGES if name in set(stages)]
+    abort = threading.Event()
+    reports = {name: StageReport(name) for name in selected}
+
+    # A channel feeds each selected stage whose upstream stage is also selected
+    channels = {
+        name: Channel(abort)
+        for previous, name in zip(STAGES, STAGES[1:])
+        if name in reports and previous in reports
+    }
+
+    def output_of(name):
+        downstream = STAGES.index(name) + 1
+        if downstream < len(STAGES) and STAGES[downstream] in channels:
+            return channels[STAGES[downstream]]
+        return None
+
+    def input_of(name, path):
+        return channels[name] if name in channels else iter_records(path)
+
+    def run_stage(name, target):
+        report = reports[name]
+        report.started_at = time.perf_counter()
+        output = output_of(name)
+        try:
+            target(report, output.put if output is not None else None)
+            if output is not None:
+                output.close()
+        except PipelineAborted:
+            report.error = "aborted"
+        except Exception as e:
+            report.error = f"{type(e).__name__}: {e}"
+            abort.set()
+        finally:
+            report.finished_at = time.perf_counter()
+
+    targets = {
+        "scrape": lambda report, emit: run_scrape(report, emit, job_path, since, workers),
+        "clean": lambda report, emit: run_clean(report, input_of("clean", raw_file), emit, min_score),
+        "analyze": lambda report, emit: run_analyze(
+            report, input_of("analyze", processed_file), concurrency, fused, since, restart, triager,
+            batcher
+        ),
+    }
+
+    analyzer = triager = batcher = None
+    if "analyze" in reports:
+        from sentiment_analysis import sentiment_analyzer as analyzer
+        if use_cache:
+            analyzer.open_inference_cache()
+        triager = analyzer.create_triage(triage, triage_threshold, triage_sample, fused)
+        batcher = analyzer.create_siblings(group_siblings, group_size, fused)
+
+    try:
+        threads = [
+            threading.Thread(target=run_stage, args=(name, targets[name]), name=f"pipeline-{name}")
+            for name in selected
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        if analyzer is not None:
+            analyzer.print_endpoint_report()
+            analyzer.print_triage_report(triager)
+            analyzer.print_siblings_report(batcher)
+            analyzer.print_prompt_report()
+            analyzer.close_inference_cache()
+
+    return [reports[name] for name in selected]
+
+
+def print_reports(reports, started_at):
+    print(f"\n{'stage':>8} {'items':>8} {'seconds':>8} {'first item s':>13} {'items/s':>8}")
+    for report in reports:
+        first_item = f"{report.first_item_at - started_at:.2f}" if report.first_item_at else "-"
+        rate = report.items / report.seconds if report.seconds else 0.0
+        print(f"{report.name:>8} {report.items:>8} {report.seconds:>8.2f} {first_item:>13} {rate:>8.1f}"
+              f"{f'  ({report.error})' if report.error else ''}")
+
+
+def parse_since(value):
+    """Accepts a Unix timestamp or a YYYY-MM-DD date, read as midnight UTC like the rest of the pipeline"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the scrape, clean and analyze stages as a streaming pipeline")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma-separated stages to run (default: {','.join(STAGES)})")
+    parser.add_argument("--since", type=parse_since,
+                        help="Skip submissions and items created before this Unix timestamp or YYYY-MM-DD date (UTC)")
+    parser.add_argument("--job", type=Path, help="JSON scrape job spec")
+    parser.add_argument("--workers", type=int, help="Number of submissions fetched at once")
+    parser.add_argument("--concurrency", type=int, help="Maximum number of items analyzed at once")
+    parser.add_argument("--fused", action="store_true",
+                        help="Get sentiment and keywords from a single LLM call per item")
+    parser.add_argument("--restart", action="store_true",
+                        help="Discard the analyzer checkpoint and re-analyze every item")
+    parser.add_argument("--min-score", type=int, help="Keep comments with a score strictly above this")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the LLM instead of reusing cached answers")
+    parser.add_argument("--no-triage", action="store_true",
+                        help="Send every item to the LLM, including trivial ones and duplicates")
+    parser.add_argument("--triage-threshold", type=float,
+                        help="Lexicon confidence at which an item is labelled without the LLM")
+    parser.add_argument("--triage-sample", type=float,
+                        help="Fraction of lexicon-labelled and duplicate items also sent to the LLM to measure agreement")
+    parser.add_argument("--group-siblings", action="store_true",
+                        help="Send comments replying to the same parent in one LLM call, with the parent once")
+    parser.add_argument("--group-size", type=int, help="Most comments sent in one sibling-group call")
+    parser.add_argument("--refresh-scores", action="store_true",
+                        help="Only refresh the scores of stored items from Reddit, in the raw, processed and "
+                             "analyzed data, instead of running the stages")
+    parser.add_argument("--report", type=Path,
+                        help="Write a JSON run report with per-stage timings and the run's metrics to this file")
+    args = parser.parse_args()
+
+    if args.refresh_scores:
+        refresh = refresh_scores(since=args.since)
+        print(f"Refreshed the scores of {refresh['items']} items in {refresh['requests']} requests "
+              f"({refresh['seconds']:.2f}s): {refresh['changed']} changed, {refresh['unchanged']} unchanged, "
+              f"{refresh['missing']} not returned; updated {refresh['processed']} processed and "
+              f"{refresh['analyzed']} analyzed records")
+        if args.report:
+            metrics.write_run_report(args.report, refresh=refresh)
+            print(f"Wrote run report to {args.report}")
+        raise SystemExit(0)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = sorted(set(stages) - set(STAGES))
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    started_at = time.perf_counter()
+    reports = run_pipeline(
+        stages, since=args.since, job_path=args.job, workers=args.workers,
+        concurrency=args.concurrency, fused=args.fused, restart=args.restart,
+        min_score=args.min_score, use_cache=not args.no_cache, triage=not args.no_triage,
+        triage_threshold=args.triage_threshold, triage_sample=args.triage_sample,
+        group_siblings=args.group_siblings, group_size=args.group_size,
+    )
+    print_reports(reports, started_at)
+
+    if args.report:
+        metrics.write_run_report(
+            args.report,
+            seconds=time.perf_counter() - started_at,
+            stages=[report.to_dict(started_at) for report in reports],
+        )
+        print(f"Wrote run report to {args.report}")
+
+    if any(report.error for report in reports):
+        print(f"Pipeline failed after {time.perf_counter() - started_at:.2f}s")
+        raise SystemExit(1)
+    print(f"Pipeline completed in {time.perf_counter() - started_at:.2f}s")
@@ -1,12 +1,128 @@
-import json
+import argparse
+import time
 from pathlib import Path
 
-def retrieve_comments_body(json_data):
+from monitoring import metrics
+from storage.jsonl import JsonlWriter, iter_records, resolve_path
+from storage.records import is_post
+
+# Default filters applied to comments; the post title is always kept
+MIN_COMMENT_SCORE = 10
+EXCLUDED_BODIES = frozenset({'[deleted]'})
+# Reddit's type prefixes, which make post and comment IDs unique across both kinds
+POST_PREFIX = "t3_"
+COMMENT_PREFIX = "t1_"
+
+SUBMISSIONS_CLEANED = metrics.counter("cleaner_submissions_total", "Raw submissions flattened into records")
+RECORDS_CLEANED = metrics.counter("cleaner_records_total", "Post and comment records kept by the cleaner", ("kind",))
+CLEAN_SECONDS = metrics.histogram(
+    "cleaner_submission_seconds", "Time to flatten one submission",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+)
+
+def iter_comment_tree(comments, descend=None):
+    """
+    Walks a comment tree depth-first with an explicit stack
+
+    Comments are yielded before their replies, in the order Reddit returned them,
+    and thread depth is not limited by Python's recursion limit.
+
+    Args:
+        comments (list): Top-level comments, each with an optional 'replies' list
+        descend (callable): Optional predicate; replies of comments for which it
+            returns False are skipped
+
+    Yields:
+        dict: Every comment and reply in the tree
+    """
+    stack = list(reversed(comments)) if isinstance(comments, list) else []
+    while stack:
+        comment = stack.pop()
+        if not isinstance(comment, dict):
+            continue
+        yield comment
+        replies = comment.get('replies')
+        if isinstance(replies, list) and replies and (descend is None or descend(comment)):
+            stack.extend(reversed(replies))
+
+def build_body_index(submission):
+    """
+    Maps the submission ID to its title and every comment ID to its body, whatever its score
+
+    Args:
+        submission (dict): A raw Reddit submission
+
+    Returns:
+        dict: ID to title or body text
+    """
+    body_index = {}
+    if 'title' in submission:
+        body_index[submission['id']] = submission['title']
+    for comment in iter_comment_tree(submission.get('comments', [])):
+        if 'body' in comment:
+            body_index[comment['id']] = comment['body']
+    return body_index
+
+def iter_submission_records(submission, min_score=MIN_COMMENT_SCORE, excluded_bodies=EXCLUDED_BODIES,
+                            prune_filtered=True):
+    """
+    Flattens one submission into its post record and the comment records that pass the filters
+
+    A first pass indexes every comment body so each record's parent_body resolves
+    even when the parent itself is filtered out; a second pass emits records lazily.
+
+    Args:
+        submission (dict): A raw Reddit submission
+        min_score (int): Comments need a score strictly above this to be kept
+        excluded_bodies (set): Comment bodies that are dropped, such as '[deleted]'
+        prune_filtered (bool): Also drop the replies of filtered-out comments, as
+            the cleaner always has; turn off to keep every reply that passes
+
+    Yields:
+        dict: The post record tagged `'kind': 'post'`, then comment records tagged
+            `'kind': 'comment'` in thread order
+    """
+    if not isinstance(submission, dict):
+        return
+
+    body_index = build_body_index(submission)
+
+    if 'title' in submission:
+        yield {
+            'kind': 'post',
+            'id': submission['id'],
+            'title': submission['title'],
+            'created_UTC': submission['created_UTC'],
+            'url': submission['url'],
+            'score': submission['score'],
+        }
+
+    def keep(comment):
+        return 'body' in comment and comment.get('score', 0) > min_score and comment['body'] not in excluded_bodies
+
+    for comment in iter_comment_tree(submission.get('comments', []), keep if prune_filtered else None):
+        if not keep(comment):
+            continue
+        yield {
+            'kind': 'comment',
+            'id': comment['id'],
+            'body': comment['body'],
+            'created_UTC': comment['created_UTC'],
+            'score': comment['score'],
+            'parent_id': comment['parent_id'],
+            'parent_body': body_index.get(comment['parent_id'], "Parent content not available")
+        }
+
+def retrieve_comments_body(json_data, min_score=MIN_COMMENT_SCORE, excluded_bodies=EXCLUDED_BODIES,
+                           prune_filtered=True):
     """
     Retrieves both post titles and comment bodies from Reddit JSON data
     
     Args:
         json_data (dict): The Reddit JSON data containing posts and comments
+        min_score (int): Comments need a score strictly above this to be kept
+        excluded_bodies (set): Comment bodies that are dropped
+        prune_filtered (bool): Also drop the replies of filtered-out comments
         
     Returns:
         dict: A dictionary containing lists of post titles and comment bodies
@@ -16,113 +132,118 @@ def retrieve_comments_body(json_data):
         'comment_bodies': []
     }
     
-    # Create a mapping of comment IDs to their bodies
-    comment_body_map = {}
-    
     # Handle case where json_data might be a list of submissions
     submissions = json_data if isinstance(json_data, list) else [json_data]
-    
-    for submission in submissions:
-        # Extract post title
-        if isinstance(submission, dict) and 'title' in submission:
-            post_dict = {
-                'id': submission['id'],
-                'title': submission['title'],
-                'created_UTC': submission['created_UTC'],
-                'url': submission['url'],
-                'score': submission['score'],
-            }
-            retrieved_data['post_titles'].append(post_dict)
-            comment_body_map[submission['id']] = submission['title']  # Store submission title for top-level comments
-        
-        # Extract comments
-        comments = submission.get('comments', [])
-        if isinstance(comments, list):
-            for comment in comments:
-                if isinstance(comment, dict) and 'body' in comment:
-                    if comment['score'] > 10 and comment['body'] != '[deleted]':
-                        # Store comment body in mapping
-                        comment_body_map[comment['id']] = comment['body']
-                        
-                        # Process main comment
-                        comment_dict = {
-                            'id': comment['id'],
-                            'body': comment['body'],
-                            'created_UTC': comment['created_UTC'],
-                            'score': comment['score'],
-                            'parent_id': comment['parent_id'],
-                            'parent_body': comment_body_map.get(comment['parent_id'], "Parent content not available")
-                        }
-                        retrieved_data['comment_bodies'].append(comment_dict)
-                
-                        # Process replies recursively
-                        def process_replies(comment_data):
-                            replies_list = comment_data.get('replies', [])
-                            if isinstance(replies_list, list):
-                                for reply in replies_list:
-                                    if isinstance(reply, dict) and reply.get('score', 0) > 10 and reply.get('body') != '[deleted]':
-                                        # Store reply body in mapping
-                                        comment_body_map[reply['id']] = reply['body']
-                                        
-                                        reply_dict = {
-                                            'id': reply['id'],
-                                            'body': reply['body'],
-                                            'created_UTC': reply['created_UTC'],
-                                            'score': reply['score'],
-                                            'parent_id': reply['parent_id'],
-                                            'parent_body': comment_body_map.get(reply['parent_id'], "Parent content not available")
-                                        }
-                                        retrieved_data['comment_bodies'].append(reply_dict)
-                                        # Recursively process nested replies
-                                        process_replies(reply)
-                        
-                        process_replies(comment)
+
+    for record in iter_processed_records(submissions, min_score, excluded_bodies, prune_filtered):
+        kind = record.pop('kind')
+        retrieved_data['post_titles' if kind == 'post' else 'comment_bodies'].append(record)
     
     return retrieved_data
 
+def iter_processed_records(submissions, min_score=MIN_COMMENT_SCORE, excluded_bodies=EXCLUDED_BODIES,
+                           prune_filtered=True):
+    """
+    Streams the post titles and comment bodies of each submission as tagged records
+
+    Submissions are processed one at a time, so memory use does not grow with the
+    size of the archive. Comments only ever reply within their own submission, so
+    parent lookups are unaffected.
+
+    Args:
+        submissions (iterable): Raw Reddit submissions
+        min_score (int): Comments need a score strictly above this to be kept
+        excluded_bodies (set): Comment bodies that are dropped
+        prune_filtered (bool): Also drop the replies of filtered-out comments
+
+    Yields:
+        dict: Post records tagged `'kind': 'post'`, each followed by its comment
+            records tagged `'kind': 'comment'`
+    """
+    for submission in submissions:
+        # Timed while flattening only, not while the consumer handles the records
+        start = time.perf_counter()
+        records = list(iter_submission_records(submission, min_score, excluded_bodies, prune_filtered))
+        CLEAN_SECONDS.observe(time.perf_counter() - start)
+        SUBMISSIONS_CLEANED.inc()
+        comments = sum(record['kind'] == 'comment' for record in records)
+        RECORDS_CLEANED.inc(len(records) - comments, kind="post")
+        RECORDS_CLEANED.inc(comments, kind="comment")
+        yield from records
+
+def record_fullname(record):
+    """The Reddit fullname of a processed record (tagged with 'kind') or an analyzed record (posts have a 'title')"""
+    return (POST_PREFIX if is_post(record) else COMMENT_PREFIX) + record['id']
+
+def refresh_scores(processed_path, scores):
+    """
+    Rewrites the processed data with refreshed scores, keeping every other field and the record order
+
+    Comments whose new score moves them across the cleaner's score filter are only
+    added or dropped by the next clean.
+
+    Args:
+        processed_path (Path): The processed data file
+        scores (dict): Reddit fullname to new score
+
+    Returns:
+        int: Number of records whose score changed
+    """
+    changed = 0
+    with JsonlWriter(processed_path) as writer:
+        for record in iter_records(processed_path):
+            score = scores.get(record_fullname(record))
+            if score is not None and score != record.get('score'):
+                record['score'] = score
+                changed += 1
+            writer.write(record)
+    return changed
+
 def import_reddit_data(json_file_path):
     """
-    Imports Reddit JSON data from a file and processes it to extract titles and comments
+    Streams Reddit submissions from a JSONL file, or from a legacy JSON file
     
     Args:
-        json_file_path (str): Path to the JSON file containing Reddit data
+        json_file_path (str): Path to the JSONL file containing Reddit data
         
     Returns:
-        dict: A dictionary containing lists of post titles and comment bodies
+        iterator: The Reddit submissions, read lazily
         
     Raises:
-        FileNotFoundError: If the specified JSON file doesn't exist
-        json.JSONDecodeError: If the file contains invalid JSON
+        FileNotFoundError: If neither the file nor its legacy .json sibling exists
     """
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            json_data = json.load(file)
-            # Debug print to see the structure
-            print("JSON Data Keys:", json_data.keys() if isinstance(json_data, dict) else "Data is a list")
-            return json_data
-    except FileNotFoundError:
-        print(f"Error: File not found at {json_file_path}")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON format in {json_file_path}")
-        return None
+    return iter_records(json_file_path)
 
-def save_to_json(data, output_path):
+def save_to_jsonl(records, output_path):
     """
-    Save the retrieved data to a JSON file
+    Stream records to a JSONL file, replacing it only once every record is written
     
     Args:
-        data (dict): The data to save
-        output_path (str): Path where to save the JSON file
+        records (iterable): The records to save
+        output_path (str): Path where to save the JSONL file
+
+    Returns:
+        int: Number of records written, or None if saving failed
     """
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        with JsonlWriter(output_path) as writer:
+            count = writer.write_all(records)
         print(f"Data successfully saved to {output_path}")
+        return count
     except Exception as e:
         print(f"Error saving data to {output_path}: {str(e)}")
+        return None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flatten raw Reddit data into post and comment records")
+    parser.add_argument("--min-score", type=int, default=MIN_COMMENT_SCORE,
+                        help="Keep comments with a score strictly above this")
+    parser.add_argument("--exclude-body", action="append", default=sorted(EXCLUDED_BODIES),
+                        help="Drop comments with exactly this body (repeatable)")
+    parser.add_argument("--keep-replies-of-filtered", action="store_true",
+                        help="Keep replies that pass the filters even when their parent comment does not")
+    args = parser.parse_args()
+
     # Get the backend directory path
     backend_dir = Path(__file__).resolve().parents[2]
     
@@ -136,16 +257,21 @@ if __name__ == "__main__":
     processed_dir.mkdir(parents=True, exist_ok=True)
     
     # Define file paths
-    json_file_path = raw_dir / "reddit_data.json"
-    output_path = processed_dir / "processed_reddit_data.json"
+    json_file_path = raw_dir / "reddit_data.jsonl"
+    output_path = processed_dir / "processed_reddit_data.jsonl"
     
-    try:
-        data = import_reddit_data(str(json_file_path))
-        if data is not None:
-            processed_data = retrieve_comments_body(data)
-            save_to_json(processed_data, str(output_path))
-            print(f"Data processed successfully and saved to {output_path}")
-        else:
-            print("No data to process.")
-    except Exception as e:
-        print(f"Error: {str(e)}")
\ No newline at end of file
+    if not resolve_path(json_file_path).exists():
+        print(f"Error: File not found at {json_file_path}")
+        print("No data to process.")
+    else:
+        try:
+            data = import_reddit_data(str(json_file_path))
+            count = save_to_jsonl(
+                iter_processed_records(data, args.min_score, frozenset(args.exclude_body),
+                                       prune_filtered=not args.keep_replies_of_filtered),
+                str(output_path)
+            )
+            if count is not None:
+                print(f"Processed {count} records successfully and saved to {output_path}")
+        except Exception as e:
+            print(f"Error: {str(e)}")
@@ -1,81 +1,287 @@
-import praw
-import os
+import argparse
 import json
-from dotenv import load_dotenv
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
+from monitoring import metrics
+from processing.data_cleaner import iter_comment_tree
+from storage.jsonl import JsonlWriter, convert_json_to_jsonl, iter_jsonl
+
 # Get the backend directory
 backend_dir = Path(__file__).resolve().parents[2]
-load_dotenv(backend_dir / ".env")
 
-reddit = praw.Reddit(
-    client_id=os.environ['CLIENT_ID'],
-    client_secret=os.environ['CLIENT_SECRET'],
-    user_agent=os.environ['USER_AGENT']
+# Used when no job file is given: the posts this scraper has always collected
+DEFAULT_JOB = {
+    "subreddits": ["thelastofus"],
+    "queries": ["review"],  # Look for posts that include the word 'review'
+    "limit": 30,
+    "sort": "relevance",
+    "time_filter": "all",
+    "since": None,
+    "workers": 4,
+    "submissions_per_minute": 30,
+}
+
+SUBMISSIONS = metrics.counter(
+    "reddit_submissions_total", "Search results handled, by outcome (stored, error, known or old)", ("outcome",)
+)
+COMMENTS_FETCHED = metrics.counter("reddit_comments_total", "Comments fetched with their submissions")
+FETCH_SECONDS = metrics.histogram("reddit_fetch_seconds", "Time to fetch a submission's comment tree")
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram(
+    "reddit_rate_limit_wait_seconds", "Time a fetch waited for the submission rate limit",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
 )
 
+def count_comments(comments):
+    """Counts the comments and replies of a tree without recursing, so deep threads cannot overflow the stack"""
+    return sum(1 for _ in iter_comment_tree(comments))
+
+def create_reddit_client():
+    """Create a PRAW client from the Reddit credentials in the environment or `backend/.env`"""
+    # Imported here, so the scraper's helpers can be used without loading PRAW
+    import praw
+    from dotenv import load_dotenv
+
+    load_dotenv(backend_dir / ".env")
+    return praw.Reddit(
+        client_id=os.environ['CLIENT_ID'],
+        client_secret=os.environ['CLIENT_SECRET'],
+        user_agent=os.environ['USER_AGENT']
+    )
+
+def load_job_spec(job_path=None):
+    """
+    Loads a scrape job spec, filling in defaults for anything it leaves out
+
+    A job file is JSON with any of the keys of `DEFAULT_JOB`: the subreddits and
+    search queries to combine, the result limit per query, the search sort and
+    time filter, `since` (a Unix timestamp; older submissions are skipped), the
+    number of worker threads and the submission fetch rate.
+
+    Args:
+        job_path (Path): Optional job file
+
+    Returns:
+        dict: The complete job spec
+    """
+    job = dict(DEFAULT_JOB)
+    if job_path is not None:
+        with open(job_path, 'r', encoding='utf-8') as f:
+            job.update(json.load(f))
+    return job
+
+class RateLimiter:
+    """Spaces calls at least `60 / per_minute` seconds apart across all threads"""
+
+    def __init__(self, per_minute=None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        RATE_LIMIT_WAIT_SECONDS.observe(max(0.0, slot - now))
+        time.sleep(max(0.0, slot - now))
+
+def is_more_comments(comment):
+    """Whether an entry of a comment forest is a "load more comments" link rather than a comment"""
+    from praw.models import MoreComments
+
+    return isinstance(comment, MoreComments)
+
 def process_comment(comment):
+    """A comment in the raw data format, with its replies still to be filled in"""
     return {
         "id": comment.id,
         "body": comment.body,
         "created_UTC": comment.created_utc,
-        "replies": [process_comment(reply) for reply in comment.replies if isinstance(reply, praw.models.Comment)],
+        "replies": [],
         "score": comment.score,
         "parent_id": comment.parent_id[3:],
         "link_id": comment.link_id
     }
 
-def get_thelastofus_posts():
-    subreddit = reddit.subreddit("thelastofus")
-    query = 'review' # Look for posts that include the word 'review'
-    
+def process_comments(comments):
+    """
+    Converts a comment forest to the raw data format with an explicit stack
+
+    Each comment's replies keep Reddit's order, and thread depth is not limited by
+    Python's recursion limit.
+
+    Returns:
+        list: The top-level comments, each with its converted 'replies'
+    """
+    converted = []
+    stack = [(comments, converted)]
+    while stack:
+        forest, siblings = stack.pop()
+        for comment in forest:
+            if is_more_comments(comment):
+                continue
+            reply = process_comment(comment)
+            siblings.append(reply)
+            stack.append((comment.replies, reply["replies"]))
+    return converted
+
+def fetch_submission(submission):
+    """
+    Fetches a submission's full comment tree and converts it to the raw data format
+
+    This is the slow part of a scrape, as `replace_more` issues one request per
+    collapsed "load more comments" link.
+    """
+    reddit_post = {
+        "id": submission.id,
+        "title": submission.title,
+        "created_UTC": submission.created_utc,
+        "url": f"https://www.reddit.com{submission.permalink}",
+        "score": submission.score,
+        "comments": []
+    }
+
+    # Get all comments including replies
+    submission.comments.replace_more(limit=None)
+    reddit_post["comments"] = process_comments(submission.comments)
+    return reddit_post
+
+def iter_new_submissions(reddit, job, existing_ids):
+    """
+    Yields search results for every subreddit and query in the job, skipping known and old posts
+
+    Args:
+        reddit (praw.Reddit): The Reddit client
+        job (dict): The scrape job spec
+        existing_ids (set): IDs already stored; also updated with each yielded ID, so a
+            post matched by several queries is fetched once
+    """
+    since = job.get("since")
+    for subreddit_name in job["subreddits"]:
+        subreddit = reddit.subreddit(subreddit_name)
+        for query in job["queries"]:
+            for submission in subreddit.search(query, sort=job["sort"], time_filter=job["time_filter"], limit=job["limit"]):
+                # Skip if post already exists
+                if submission.id in existing_ids:
+                    print(f"Post with ID {submission.id} already exists. Skipping...")
+                    SUBMISSIONS.inc(outcome="known")
+                    continue
+                if since and submission.created_utc < since:
+                    SUBMISSIONS.inc(outcome="old")
+                    continue
+                existing_ids.add(submission.id)
+                yield submission
+
+def scrape(reddit, job, jsonl_file, on_post=None, client_factory=create_reddit_client):
+    """
+    Runs a scrape job, fetching comment trees on a bounded worker pool
+
+    Search results are consumed lazily and at most two submissions per worker are
+    queued at a time. Each finished submission is appended to the JSONL file
+    straight away, so an interrupted scrape keeps everything fetched so far.
+
+    A `praw.Reddit` instance must not be shared across threads, so the search runs
+    on `reddit` in the calling thread and only hands submission IDs to the workers.
+    Each worker creates its own client with `client_factory` on first use and
+    fetches the submission through it.
+
+    Args:
+        reddit (praw.Reddit): The Reddit client used for searching, or any object with the same interface
+        job (dict): The scrape job spec
+        jsonl_file (Path): The raw data file to append to
+        on_post (callable): Optional callback receiving each submission once it is stored
+        client_factory (callable): Creates the Reddit client of each worker thread
+
+    Returns:
+        int: Number of submissions stored
+    """
+    # Posts are stored one per line; carry over a reddit_data.json from before the switch
+    legacy_file = jsonl_file.with_suffix(".json")
+    if not jsonl_file.exists() and legacy_file.exists():
+        try:
+            convert_json_to_jsonl(legacy_file, jsonl_file)
+        except ValueError:
+            print("Error reading JSON file, starting with empty list")
+
+    # PRAW itself waits out Reddit's per-request limits; this additionally paces
+    # the comment tree fetches, which issue many requests each
+    rate_limiter = RateLimiter(job.get("submissions_per_minute"))
+    workers = max(1, int(job.get("workers", 1)))
+
+    clients = threading.local()
+
+    def worker_client():
+        if not hasattr(clients, "reddit"):
+            clients.reddit = client_factory()
+        return clients.reddit
+
+    def fetch(submission_id):
+        rate_limiter.acquire()
+        with FETCH_SECONDS.time():
+            return fetch_submission(worker_client().submission(id=submission_id))
+
+    stored = 0
+    pending = set()
+
+    def store_finished(futures):
+        nonlocal stored
+        for future in futures:
+            try:
+                reddit_post = future.result()
+            except Exception as e:
+                # Not stored, so the next run fetches it again
+                print(f"Error fetching Reddit post: {str(e)}")
+                SUBMISSIONS.inc(outcome="error")
+                continue
+            # Append the new post as a single line instead of rewriting the whole file
+            writer.write(reddit_post)
+            stored += 1
+            SUBMISSIONS.inc(outcome="stored")
+            COMMENTS_FETCHED.inc(count_comments(reddit_post["comments"]))
+            print(f"Successfully stored Reddit post with ID: {reddit_post['id']}")
+            if on_post is not None:
+                on_post(reddit_post)
+
+    # Opening the file cuts off a line left incomplete by an interrupted scrape, so that
+    # submission is not among the existing IDs and is fetched again
+    with JsonlWriter(jsonl_file, mode='a') as writer, ThreadPoolExecutor(max_workers=workers) as executor:
+        # Get existing post IDs, streaming through the file one submission at a time
+        existing_ids = {post.get('id') for post in iter_jsonl(jsonl_file) if isinstance(post, dict)}
+        for submission in iter_new_submissions(reddit, job, existing_ids):
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                store_finished(done)
+            pending.add(executor.submit(fetch, submission.id))
+        store_finished(wait(pending).done)
+
+    return stored
+
+def get_thelastofus_posts(job=None):
     # Create data directories if they don't exist
     data_dir = backend_dir / "data"
     raw_dir = data_dir / "raw"
     raw_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Load existing data if file exists
-    json_file = raw_dir / "reddit_data.json"
-    existing_posts = []
-    if json_file.exists():
-        try:
-            with open(json_file, 'r') as f:
-                existing_posts = json.load(f)
-                if not isinstance(existing_posts, list):
-                    existing_posts = [existing_posts]  # Convert single post to list
-        except json.JSONDecodeError:
-            print("Error reading JSON file, starting with empty list")
-            existing_posts = []
-    
-    # Get existing post IDs
-    existing_ids = {post.get('id') for post in existing_posts if isinstance(post, dict)}
-    
-    for submission in subreddit.search(query, sort='relevance', time_filter='all', limit=30):  # change the limit as needed
-        # Skip if post already exists
-        if submission.id in existing_ids:
-            print(f"Post with ID {submission.id} already exists. Skipping...")
-            continue
-            
-        reddit_post = {
-            "id": submission.id,
-            "title": submission.title,
-            "created_UTC": submission.created_utc,
-            "url": f"https://www.reddit.com{submission.permalink}",
-            "score": submission.score,
-            "comments": []
-        }
-
-        # Get all comments including replies
-        submission.comments.replace_more(limit=None)
-        reddit_post["comments"] = [process_comment(comment) for comment in submission.comments if isinstance(comment, praw.models.Comment)]
-
-        # Add new post to existing posts
-        existing_posts.append(reddit_post)
-        
-        # Save all posts to JSON file
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_posts, f, ensure_ascii=False, indent=2)
-        print(f"Successfully stored Reddit post with ID: {submission.id}")
+
+    return scrape(create_reddit_client(), job or load_job_spec(), raw_dir / "reddit_data.jsonl")
 
 if __name__ == "__main__":
-    get_thelastofus_posts()
+    parser = argparse.ArgumentParser(description="Scrape Reddit submissions and their comment trees")
+    parser.add_argument("--job", type=Path, help="JSON scrape job spec (defaults to r/thelastofus 'review')")
+    parser.add_argument("--since", type=float, help="Skip submissions created before this Unix timestamp")
+    parser.add_argument("--workers", type=int, help="Number of submissions fetched at once")
+    args = parser.parse_args()
+
+    job = load_job_spec(args.job)
+    if args.since is not None:
+        job["since"] = args.since
+    if args.workers is not None:
+        job["workers"] = args.workers
+
+    stored = get_thelastofus_posts(job)
+    print(f"Stored {stored} new Reddit posts")
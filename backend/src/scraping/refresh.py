@@ -0,0 +1,151 @@
+"""
+Refreshes the scores of already scraped posts and comments in bulk.
+
+The scraper skips submissions it already stored, so their scores stay as they were
+on the day they were fetched, and re-crawling a comment tree costs a
+`replace_more` round trip per collapsed thread. Instead, the fullnames of every
+stored post (`t3_<id>`) and comment (`t1_<id>`) are sent to Reddit's info endpoint
+(`/api/info`) 100 at a time, which answers with each item's current score, and the
+raw data file is rewritten with the new scores. Items Reddit no longer returns keep
+their last known score.
+
+Only scores are refreshed: an edited title or body would also need its sentiment
+analyzed again, which is left to a regular scrape.
+"""
+import time
+
+from monitoring import metrics
+from processing.data_cleaner import COMMENT_PREFIX, POST_PREFIX, iter_comment_tree
+from storage.jsonl import JsonlWriter, iter_records
+
+# Most fullnames Reddit accepts in one info request
+INFO_BATCH_SIZE = 100
+
+INFO_REQUESTS = metrics.counter("reddit_info_requests_total", "Requests to the info endpoint for score refreshes")
+INFO_SECONDS = metrics.histogram("reddit_info_seconds", "Time to fetch the scores of one batch of fullnames")
+SCORES_REFRESHED = metrics.counter(
+    "reddit_scores_refreshed_total", "Stored items whose score was refreshed, by outcome (changed, unchanged or missing)",
+    ("outcome",)
+)
+
+
+def post_fullname(post_id):
+    return POST_PREFIX + post_id
+
+
+def comment_fullname(comment_id):
+    return COMMENT_PREFIX + comment_id
+
+
+def known_fullnames(raw_file, since=None):
+    """
+    Lists the fullnames of the posts and comments stored in the raw data file
+
+    Args:
+        raw_file (Path): The raw data file, or its legacy JSON sibling
+        since (float): Optional Unix timestamp; items created before it are left out
+
+    Returns:
+        list: Fullnames, each post followed by its comments in thread order
+    """
+    return [
+        fullname
+        for submission in iter_records(raw_file) if isinstance(submission, dict)
+        for fullname, item in scored_items(submission)
+        if not since or item.get('created_UTC', 0) >= since
+    ]
+
+
+def info_batch_size(batch_size):
+    return max(1, min(int(batch_size), INFO_BATCH_SIZE))
+
+
+def fetch_scores(reddit, fullnames, batch_size=INFO_BATCH_SIZE):
+    """
+    Gets the current scores of posts and comments from Reddit's info endpoint
+
+    Args:
+        reddit (praw.Reddit): The Reddit client, or any object with the same `info` method
+        fullnames (list): Fullnames of the items to refresh
+        batch_size (int): Fullnames per request, at most 100
+
+    Returns:
+        dict: Fullname to current score, for the items Reddit returned
+    """
+    batch_size = info_batch_size(batch_size)
+    scores = {}
+    for start in range(0, len(fullnames), batch_size):
+        batch = fullnames[start:start + batch_size]
+        with INFO_SECONDS.time():
+            # PRAW requests up to 100 fullnames at once, so each batch is a single request
+            for thing in reddit.info(fullnames=batch):
+                scores[thing.fullname] = thing.score
+        INFO_REQUESTS.inc()
+    return scores
+
+
+def scored_items(submission):
+    """Yields (fullname, item) for a raw submission and every comment of its tree"""
+    yield post_fullname(submission['id']), submission
+    for comment in iter_comment_tree(submission.get('comments', [])):
+        if 'id' in comment:
+            yield comment_fullname(comment['id']), comment
+
+
+def update_submission_scores(submission, scores):
+    """
+    Sets the refreshed scores on a raw submission and its comment tree, in place
+
+    Returns:
+        dict: Fullname to new score, of the items whose score changed
+    """
+    changed = {}
+    for fullname, item in scored_items(submission):
+        score = scores.get(fullname)
+        if score is not None and score != item.get('score'):
+            item['score'] = changed[fullname] = score
+    return changed
+
+
+def refresh_raw_scores(reddit, raw_file, since=None, batch_size=INFO_BATCH_SIZE):
+    """
+    Fetches the current scores of every stored item and rewrites the raw data file with them
+
+    The file is replaced only once every submission is written, so an interrupted
+    refresh leaves it as it was.
+
+    Args:
+        reddit (praw.Reddit): The Reddit client
+        raw_file (Path): The raw data file
+        since (float): Optional Unix timestamp; items created before it are not refreshed
+        batch_size (int): Fullnames per info request
+
+    Returns:
+        tuple: {fullname: score} of the items whose score changed, and a report with the
+            number of items asked for, requests made, and items changed, unchanged or missing
+    """
+    start = time.perf_counter()
+    fullnames = known_fullnames(raw_file, since)
+    scores = fetch_scores(reddit, fullnames, batch_size)
+
+    changed = {}
+    with JsonlWriter(raw_file.with_suffix(".jsonl")) as writer:
+        for submission in iter_records(raw_file):
+            if isinstance(submission, dict):
+                changed.update(update_submission_scores(submission, scores))
+            writer.write(submission)
+
+    missing = len(fullnames) - len(scores)
+    SCORES_REFRESHED.inc(len(changed), outcome="changed")
+    SCORES_REFRESHED.inc(len(scores) - len(changed), outcome="unchanged")
+    SCORES_REFRESHED.inc(missing, outcome="missing")
+    report = {
+        'items': len(fullnames),
+        'requests': -(-len(fullnames) // info_batch_size(batch_size)),
+        'changed': len(changed),
+        'unchanged': len(scores) - len(changed),
+        'missing': missing,
+        'seconds': time.perf_counter() - start,
+    }
+    return changed, report
+
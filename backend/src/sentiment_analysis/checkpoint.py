@@ -0,0 +1,94 @@
+import json
+
+from storage.jsonl import JsonlWriter, iter_jsonl, iter_records
+
+
+def checkpointed_ids(checkpoint_path):
+    """
+    Returns the IDs of the items recorded in an append-only JSONL checkpoint
+
+    A line cut short by a crash mid-write is ignored, so its item is analyzed again.
+
+    Args:
+        checkpoint_path (Path): The checkpoint file
+
+    Returns:
+        set: IDs of the analyzed items
+    """
+    if not checkpoint_path.exists():
+        return set()
+    return {record['id'] for record in iter_jsonl(checkpoint_path)}
+
+
+def open_checkpoint(checkpoint_path):
+    """Opens the checkpoint for appending, making each record durable as it is written"""
+    return JsonlWriter(checkpoint_path, mode='a', durable=True)
+
+
+def seed_checkpoint(checkpoint_path, analyzed_path):
+    """
+    Creates a checkpoint from previously written analyzed data
+
+    Lets runs that predate checkpointing resume without re-analyzing everything.
+    Does nothing if the checkpoint already exists or there is no analyzed data.
+
+    Args:
+        checkpoint_path (Path): The checkpoint file
+        analyzed_path (Path): The analyzed JSONL file, or its legacy JSON sibling
+
+    Returns:
+        int: Number of records copied into the checkpoint
+    """
+    if checkpoint_path.exists():
+        return 0
+
+    try:
+        records = iter_records(analyzed_path)
+        with JsonlWriter(checkpoint_path) as writer:
+            return writer.write_all(records)
+    except FileNotFoundError:
+        return 0
+    except json.JSONDecodeError:
+        print(f"Error: Invalid JSON format in {analyzed_path}, starting a fresh checkpoint")
+        return 0
+
+
+def compact_checkpoint(checkpoint_path, output_path, ordered_ids):
+    """
+    Writes the latest checkpointed record of each item as the JSONL file the API reads
+
+    Only the byte offset of each item's latest line is held in memory, and each
+    record is read back from the checkpoint when it is written out. The output is
+    written to a temporary file and renamed into place, so readers never see a
+    half-written file.
+
+    Args:
+        checkpoint_path (Path): The checkpoint file
+        output_path (Path): The analyzed JSONL file to produce
+        ordered_ids (list): IDs in output order; checkpointed records for other IDs
+            follow in checkpoint order
+
+    Returns:
+        int: Number of records written
+    """
+    offsets = {}
+    with open(checkpoint_path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                offsets[json.loads(line)['id']] = offset
+            except (json.JSONDecodeError, KeyError):
+                pass
+            offset += len(line)
+
+    with open(checkpoint_path, 'rb') as f, JsonlWriter(output_path) as writer:
+        def copy_line(item_offset):
+            f.seek(item_offset)
+            writer.write(json.loads(f.readline()))
+
+        for item_id in ordered_ids:
+            if item_id in offsets:
+                copy_line(offsets.pop(item_id))
+        for item_offset in sorted(offsets.values()):
+            copy_line(item_offset)
+        return writer.count
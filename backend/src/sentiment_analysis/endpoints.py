@@ -0,0 +1,156 @@
+import threading
+import time
+
+import httpx
+
+from monitoring import metrics
+
+# Errors that mean the endpoint itself is unreachable or broken, as opposed to a bad answer
+ENDPOINT_ERRORS = (OSError, httpx.TransportError)
+
+OLLAMA_REQUESTS = metrics.counter(
+    "ollama_requests_total", "Chat requests sent to each Ollama endpoint, by outcome", ("endpoint", "outcome")
+)
+OLLAMA_LATENCY = metrics.histogram(
+    "ollama_request_seconds", "Latency of successful Ollama chat requests", ("endpoint",)
+)
+OLLAMA_IN_FLIGHT = metrics.gauge("ollama_requests_in_flight", "Chat requests awaiting an answer", ("endpoint",))
+
+
+class OllamaEndpoint:
+    """One Ollama server, with its JSON-mode client and per-endpoint statistics"""
+
+    def __init__(self, url, model, **llm_kwargs):
+        # Imported here, as langchain takes about a second to import
+        from langchain_ollama import ChatOllama
+
+        self.url = url.rstrip("/")
+        self.llm = ChatOllama(model=model, temperature=0, format="json", base_url=self.url, **llm_kwargs)
+        self.healthy = False
+        self.down_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.latencies = []
+
+    def check_health(self, timeout=2):
+        try:
+            self.healthy = httpx.get(f"{self.url}/api/tags", timeout=timeout).status_code == 200
+        except httpx.HTTPError:
+            self.healthy = False
+        return self.healthy
+
+    def stats(self, elapsed):
+        latencies = sorted(self.latencies)
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'requests': self.requests,
+            'failures': self.failures,
+            'throughput': self.requests / elapsed if elapsed else 0.0,
+            'mean_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'p95_latency': latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+        }
+
+
+class EndpointPool:
+    """
+    Spreads LLM calls over several Ollama servers
+
+    Each call goes to the healthy endpoint with the fewest calls in flight. When an
+    endpoint fails with a connection error it is taken out of rotation for
+    `retry_after` seconds and the call is sent to another endpoint, so work from a
+    server that dies mid-run is redistributed without using up the item's retries.
+    """
+
+    def __init__(self, urls, model, retry_after=30.0, **llm_kwargs):
+        """
+        Args:
+            urls (list): Base URLs of the Ollama servers
+            model (str): Model name, e.g. "llama3.2"
+            retry_after (float): Seconds a failed endpoint stays out of rotation
+            llm_kwargs: Extra `ChatOllama` options shared by every endpoint
+        """
+        self.endpoints = [OllamaEndpoint(url, model, **llm_kwargs) for url in urls]
+        self.retry_after = retry_after
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    def check_health(self):
+        """Checks every endpoint and returns the healthy ones; the others sit out `retry_after` seconds"""
+        healthy = []
+        for endpoint in self.endpoints:
+            if endpoint.check_health():
+                healthy.append(endpoint)
+            else:
+                endpoint.down_until = time.time() + self.retry_after
+        return healthy
+
+    def _acquire(self):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.perf_counter()
+            now = time.time()
+            candidates = [e for e in self.endpoints if e.healthy or e.down_until <= now]
+            if not candidates:
+                raise ConnectionError("No healthy Ollama endpoint available")
+            endpoint = min(candidates, key=lambda e: (e.in_flight, e.requests))
+            endpoint.in_flight += 1
+            OLLAMA_IN_FLIGHT.set(endpoint.in_flight, endpoint=endpoint.url)
+            return endpoint
+
+    def _release(self, endpoint, start=None, error=None):
+        """Records a finished call: a success if `start` is given, an endpoint failure if `error` is"""
+        with self._lock:
+            endpoint.in_flight -= 1
+            OLLAMA_IN_FLIGHT.set(endpoint.in_flight, endpoint=endpoint.url)
+            if error is None and start is not None:
+                latency = time.perf_counter() - start
+                endpoint.healthy = True
+                endpoint.requests += 1
+                endpoint.latencies.append(latency)
+                OLLAMA_REQUESTS.inc(endpoint=endpoint.url, outcome="ok")
+                OLLAMA_LATENCY.observe(latency, endpoint=endpoint.url)
+            elif error is None:
+                OLLAMA_REQUESTS.inc(endpoint=endpoint.url, outcome="error")
+            else:
+                OLLAMA_REQUESTS.inc(endpoint=endpoint.url, outcome="unreachable")
+                endpoint.failures += 1
+                endpoint.healthy = False
+                endpoint.down_until = time.time() + self.retry_after
+                print(f"\nOllama endpoint {endpoint.url} failed ({error}), redistributing its work")
+
+    def invoke(self, messages):
+        while True:
+            endpoint = self._acquire()
+            start = time.perf_counter()
+            try:
+                answer = endpoint.llm.invoke(messages)
+            except ENDPOINT_ERRORS as e:
+                self._release(endpoint, start, e)
+                continue
+            except Exception:
+                self._release(endpoint)
+                raise
+            self._release(endpoint, start)
+            return answer
+
+    async def ainvoke(self, messages):
+        while True:
+            endpoint = self._acquire()
+            start = time.perf_counter()
+            try:
+                answer = await endpoint.llm.ainvoke(messages)
+            except ENDPOINT_ERRORS as e:
+                self._release(endpoint, start, e)
+                continue
+            except BaseException:
+                self._release(endpoint)
+                raise
+            self._release(endpoint, start)
+            return answer
+
+    def report(self):
+        """Per-endpoint request counts, failures, throughput and latency since the first call"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return [endpoint.stats(elapsed) for endpoint in self.endpoints]
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from monitoring import metrics
+
+CACHE_LOOKUPS = metrics.counter("inference_cache_lookups_total", "Inference cache lookups, by result", ("result",))
+CACHE_EVICTIONS = metrics.counter("inference_cache_evictions_total", "Answers evicted from the inference cache")
+
+
+class InferenceCache:
+    """
+    Persistent SQLite cache of LLM answers, keyed by a hash of everything that determines the answer
+
+    The key covers the model name, a prompt version, the system prompt and the user
+    message, so editing a prompt or switching models never serves a stale answer.
+    Entries are evicted by age and, once the cache grows past its byte budget, by
+    least recent use.
+    """
+
+    # Answers are committed in groups so a crash loses at most this many
+    COMMIT_EVERY = 50
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, max_age_days=90):
+        """
+        Args:
+            path (Path): SQLite database file, created if missing
+            max_bytes (int): Total size of stored answers to keep after eviction
+            max_age_days (float): Entries not used for this many days are evicted
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, prompt_version, system_prompt, human_content):
+        digest = hashlib.sha256()
+        for part in (model, prompt_version, system_prompt, human_content):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached answer for `key`, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self.hits += 1
+            CACHE_LOOKUPS.inc(result="hit")
+            self._conn.execute("UPDATE answers SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key, answer):
+        encoded = json.dumps(answer, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now)
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= self.COMMIT_EVERY:
+                self._conn.commit()
+                self._uncommitted = 0
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used ones until the cache fits its byte budget
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed = self._conn.execute("DELETE FROM answers WHERE last_used_at < ?", (cutoff,)).rowcount
+
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            if total > self.max_bytes:
+                stale_keys = []
+                for key, size in self._conn.execute("SELECT key, size FROM answers ORDER BY last_used_at"):
+                    if total <= self.max_bytes:
+                        break
+                    stale_keys.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM answers WHERE key = ?", stale_keys)
+                removed += len(stale_keys)
+
+            self._conn.commit()
+            CACHE_EVICTIONS.inc(removed)
+            return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
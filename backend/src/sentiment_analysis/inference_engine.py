@@ -0,0 +1,87 @@
+import asyncio
+
+
+async def run_concurrent(items, worker, concurrency=4, on_result=None, keep_results=True):
+    """
+    Runs an async worker over items with a bounded number of calls in flight
+
+    Items are pulled lazily, so at most `concurrency` tasks exist at any time and a
+    slow Ollama server applies backpressure instead of queueing the whole dataset.
+    Results are returned in input order regardless of completion order.
+
+    Args:
+        items (iterable): The items to process; may be a generator or an async iterable
+        worker (callable): Async function called as `await worker(item)`
+        concurrency (int): Maximum number of worker calls running at once
+        on_result (callable): Optional callback `on_result(index, item, result)`,
+            invoked in completion order as soon as each item finishes
+        keep_results (bool): Collect and return the results; turn off when
+            `on_result` consumes them, to keep memory flat on long streams
+
+    Returns:
+        list: The worker results in the same order as `items`, or None if
+            `keep_results` is off
+
+    Raises:
+        Exception: The first exception raised by a worker. Remaining in-flight
+            tasks are cancelled before it is re-raised.
+    """
+    concurrency = max(1, int(concurrency))
+    results = {}
+    pending = {}
+    is_async = hasattr(items, "__aiter__")
+    iterator = aiter(items) if is_async else iter(items)
+    next_index = 0
+    exhausted = False
+    # Task awaiting the next item of an async iterable, so completed work is handled
+    # while a slow producer is still preparing it
+    fetch = None
+
+    def start(item):
+        nonlocal next_index
+        task = asyncio.ensure_future(worker(item))
+        pending[task] = (next_index, item)
+        next_index += 1
+
+    def fill():
+        nonlocal exhausted, fetch
+        while not exhausted and fetch is None and len(pending) < concurrency:
+            if is_async:
+                fetch = asyncio.ensure_future(anext(iterator))
+                return
+            try:
+                start(next(iterator))
+            except StopIteration:
+                exhausted = True
+
+    try:
+        fill()
+
+        while pending or fetch is not None:
+            waiting = set(pending) if fetch is None else {*pending, fetch}
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is fetch:
+                    fetch = None
+                    try:
+                        start(task.result())
+                    except StopAsyncIteration:
+                        exhausted = True
+                    continue
+                index, item = pending.pop(task)
+                result = task.result()
+                if keep_results:
+                    results[index] = result
+                if on_result is not None:
+                    on_result(index, item, result)
+            fill()
+    finally:
+        cancelled = [*pending, fetch] if fetch is not None else list(pending)
+        for task in cancelled:
+            task.cancel()
+        if cancelled:
+            await asyncio.gather(*cancelled, return_exceptions=True)
+
+    if not keep_results:
+        return None
+    return [results[index] for index in range(len(results))]
@@ -0,0 +1,147 @@
+"""
+Keyword normalization, so variants of one keyword are counted and searched together.
+
+The LLM returns keywords as they appear in the text: "Review", "reviews", "TLOU2",
+"The Last of Us Part II". Two levels of normalization are applied:
+
+* `normalize_keyword` gives the form the analyzer stores: case-folded, without
+  surrounding punctuation or possessives, with plural nouns made singular and known
+  synonyms merged ("reviews" -> "review", "tlou2" -> "the last of us part ii").
+  It only makes changes that keep a readable word, as keywords are shown to users.
+* `keyword_stem` gives the key keywords are grouped and searched by. It also strips
+  verb endings ("loved", "loving" -> "lov") and may not be a word; each group is
+  displayed as its most frequent normalized form.
+
+The lemmatizer is rule-based with small exception lists, so it needs no language data.
+"""
+import re
+import unicodedata
+
+# Phrase -> canonical phrase, matched after case-folding, cleanup and singularization
+SYNONYMS = {
+    "tlou": "the last of us",
+    "last of us": "the last of us",
+    "tlou1": "the last of us part i",
+    "tlou 1": "the last of us part i",
+    "tlou part 1": "the last of us part i",
+    "tlou part i": "the last of us part i",
+    "the last of us part 1": "the last of us part i",
+    "last of us part 1": "the last of us part i",
+    "last of us part i": "the last of us part i",
+    "tlou2": "the last of us part ii",
+    "tlou 2": "the last of us part ii",
+    "tlou part 2": "the last of us part ii",
+    "tlou part ii": "the last of us part ii",
+    "tlou ii": "the last of us part ii",
+    "the last of us 2": "the last of us part ii",
+    "the last of us part 2": "the last of us part ii",
+    "last of us 2": "the last of us part ii",
+    "last of us part 2": "the last of us part ii",
+    "last of us part ii": "the last of us part ii",
+    "playstation 5": "ps5",
+    "playstation 4": "ps4",
+    "nd": "naughty dog",
+    "goty": "game of the year",
+    "tv show": "show",
+    "hbo show": "show",
+    "joel miller": "joel",
+    "ellie williams": "ellie",
+    "review bomb": "review bombing",
+    "review-bombing": "review bombing",
+}
+
+# Plurals that do not follow the suffix rules
+IRREGULAR_PLURALS = {
+    "children": "child", "men": "man", "women": "woman", "feet": "foot", "teeth": "tooth", "mice": "mouse",
+    "lives": "life", "wives": "wife", "knives": "knife", "wolves": "wolf", "thieves": "thief", "selves": "self",
+    "heroes": "hero", "potatoes": "potato", "tomatoes": "tomato", "echoes": "echo",
+    "criteria": "criterion", "phenomena": "phenomenon",
+}
+# Words ending in s that are not plurals, or have no singular in use
+NOT_PLURAL = frozenset({
+    "always", "besides", "does", "goes", "perhaps", "sometimes", "towards", "afterwards", "whereas", "yes",
+    "news", "series", "species", "lots", "thanks", "pants", "glasses", "scissors", "politics", "graphics",
+    "mechanics", "physics", "ethics", "economics", "analytics", "cutscenes", "vibes", "chills", "feels",
+    "less", "unless", "bias", "alias", "atlas", "canvas", "chaos", "lens", "ps", "pros", "cons", "dlcs",
+})
+# Nouns ending in -ie, whose plurals the -ies rule would turn into -y
+IE_NOUNS = frozenset({
+    "movie", "zombie", "cookie", "rookie", "selfie", "hippie", "freebie", "genie", "pie", "tie", "lie", "die",
+    "indie", "goalie", "calorie", "newbie", "cutie", "aussie", "boogie", "sortie", "hoodie", "baddie",
+})
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s'’-]+")
+CONSONANTS = frozenset("bcdfghjklmnpqrstvwxz")
+
+
+def singularize(word):
+    """The singular of a plural noun, or the word unchanged if it does not look like one"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word in NOT_PLURAL or not word.endswith("s") or not word.isalpha():
+        return word
+    if word.endswith(("ss", "us", "is", "ics")):
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-1] if word[:-1] in IE_NOUNS else word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes", "zzes")):
+        return word[:-2]
+    return word[:-1]
+
+
+def normalize_keyword(keyword):
+    """
+    The stored form of a keyword
+
+    Returns:
+        str: The normalized keyword, or "" if nothing is left of it
+    """
+    text = unicodedata.normalize("NFKC", str(keyword)).casefold()
+    text = PUNCTUATION_PATTERN.sub(" ", text).replace("’", "'")
+    words = [word.strip("'-") for word in text.split()]
+    words = [word[:-2] if word.endswith("'s") else word for word in words if word.strip("'-")]
+    if not words:
+        return ""
+    phrase = " ".join(words)
+    if phrase in SYNONYMS:
+        return SYNONYMS[phrase]
+    # Only the head noun of a phrase is plural: "game reviews" -> "game review"
+    words[-1] = singularize(words[-1])
+    phrase = " ".join(words)
+    return SYNONYMS.get(phrase, phrase)
+
+
+def normalize_keywords(keywords):
+    """Normalizes a keyword list, dropping empty and repeated keywords but keeping the order"""
+    normalized = []
+    for keyword in keywords:
+        keyword = normalize_keyword(keyword)
+        if keyword and keyword not in normalized:
+            normalized.append(keyword)
+    return normalized
+
+
+def stem_word(word):
+    """Strips inflectional endings in the spirit of Porter's first step: -s, -ed, -ing and a final -e"""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    word = singularize(word)
+    for suffix in ("ing", "ed"):
+        # Keep a vowel in the remaining stem, so "sing" and "red" stay as they are
+        if word.endswith(suffix) and any(vowel in word[:-len(suffix)] for vowel in "aeiouy"):
+            word = word[:-len(suffix)]
+            if len(word) > 2 and word[-1] == word[-2] and word[-1] in CONSONANTS and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def keyword_stem(keyword):
+    """The key a keyword is grouped and searched by; its last word is stemmed"""
+    words = normalize_keyword(keyword).split()
+    if not words:
+        return ""
+    words[-1] = stem_word(words[-1])
+    return " ".join(words)
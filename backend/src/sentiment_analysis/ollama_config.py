@@ -1,38 +1,49 @@
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, SystemMessage
-
-# this is used to test if ollama is correctly configured
+"""
+Checks that Ollama is correctly configured, by sending a chat and a JSON-mode prompt.
 
+Nothing is sent when the module is imported; run it as a script:
+    python src/sentiment_analysis/ollama_config.py
+"""
 local_llm = "llama3.2"
-llm = ChatOllama(
-    model=local_llm,
-    temperature=0,
-)
-
-llm_json_mode = ChatOllama(
-    model=local_llm,
-    temperature=0,
-    format="json"
-)
 
 # Prompt
 instructions = "You are a helpful assistant."
 
-llm_chat = llm.invoke(
-    [SystemMessage(content=instructions)]
-    + [
-        HumanMessage(content="Why is the sky blue?")
-    ]
-)
 
-print(llm_chat)
+def check_ollama(model=local_llm):
+    """Sends a plain and a JSON-mode prompt to the model and prints the answers"""
+    from langchain_ollama import ChatOllama
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    llm = ChatOllama(
+        model=model,
+        temperature=0,
+    )
+
+    llm_json_mode = ChatOllama(
+        model=model,
+        temperature=0,
+        format="json"
+    )
+
+    llm_chat = llm.invoke(
+        [SystemMessage(content=instructions)]
+        + [
+            HumanMessage(content="Why is the sky blue?")
+        ]
+    )
+
+    print(llm_chat)
+
+    llm_json_chat = llm_json_mode.invoke(
+        [SystemMessage(content=instructions)]
+        + [
+            HumanMessage(content="Is the sky blue? Return JSON with a single key, that is 'yes' or 'no'")
+        ]
+    )
 
-llm_json_chat = llm_json_mode.invoke(
-    [SystemMessage(content=instructions)]
-    + [
-        HumanMessage(content="Is the sky blue? Return JSON with a single key, that is 'yes' or 'no'")
-    ]
-)
+    print(llm_json_chat)
 
-print(llm_json_chat)
 
+if __name__ == "__main__":
+    check_ollama()
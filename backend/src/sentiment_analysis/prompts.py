@@ -0,0 +1,198 @@
+"""
+Token budgets for the texts the analyzer puts in its prompts.
+
+Post titles, comment bodies and parent bodies used to be sent verbatim, so one long
+review quoted as a parent inflated the prompt of every reply and could overflow the
+model's context, which Ollama answers with truncated input or a slow retry. The
+`PromptBuilder` fits each text to a budget counted in tokens:
+
+* Tokens are estimated locally from the text's words, numbers and symbols, at about
+  the rate of the Llama 3 tokenizer on English text, so no tokenizer is loaded.
+* A text over its budget keeps its first sentences and its last one, joined by
+  " [...] ", as the opening and the conclusion of a review carry its sentiment.
+  Parents are shortened once and reused for every reply.
+* The context window (`num_ctx`) is pinned to fit the longest prompt at full
+  budgets, so every call runs with the same, bounded context.
+
+Every prompt sent is counted, and the run reports the distribution of prompt lengths.
+"""
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+from monitoring import metrics
+
+DEFAULT_PARENT_TOKENS = 256
+DEFAULT_TEXT_TOKENS = 1024
+# Tokens of a single JSON answer, and of each comment's entry in a sibling-group answer
+ANSWER_TOKENS = 128
+COMMENT_ANSWER_TOKENS = 40
+# Parents shortened so far, reused for their other replies
+MEMO_SIZE = 4096
+ELLIPSIS = " [...] "
+
+# Latin words, digit runs, line breaks or runs of spaces, single symbols, other letters
+TOKEN_PATTERN = re.compile(r"([A-Za-z]+)|(\d+)|(\s*\n\s*|\s{2,})|([^\w\s])|([^\W\d_]+)")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+PROMPT_TOKENS = metrics.histogram(
+    "llm_prompt_tokens", "Estimated tokens of each prompt sent to the LLM", ("task",),
+    buckets=(64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 4096, 8192)
+)
+TEXTS_SHORTENED = metrics.counter("llm_texts_shortened_total", "Prompt texts cut to their token budget", ("kind",))
+
+
+def count_tokens(text):
+    """
+    Estimates the number of tokens of a text
+
+    Common words are one token and longer ones one per six letters; numbers take a
+    token per three digits, as Llama 3 splits them; every symbol, line break and
+    non-Latin letter counts as at least one. The estimate errs on the high side.
+    """
+    tokens = 0
+    for word, digits, space, symbol, other in TOKEN_PATTERN.findall(text):
+        if word:
+            tokens += (len(word) + 5) // 6
+        elif digits:
+            tokens += (len(digits) + 2) // 3
+        elif space:
+            tokens += 1
+        elif symbol:
+            tokens += 1 if symbol.isascii() else 2
+        else:
+            tokens += len(other)
+    return tokens
+
+
+def cut_to_tokens(text, budget):
+    """The longest prefix of `text` estimated at no more than `budget` tokens, cut between words"""
+    tokens = 0
+    end = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        tokens += count_tokens(match.group())
+        if tokens > budget:
+            break
+        end = match.end()
+    return text[:end].rstrip()
+
+
+def shorten(text, budget):
+    """
+    Fits a text to `budget` tokens, keeping its first sentences and its last one
+
+    Returns:
+        str: The text unchanged if it fits, otherwise the kept sentences joined by " [...] "
+    """
+    if count_tokens(text) <= budget:
+        return text
+    budget -= count_tokens(ELLIPSIS)
+    sentences = SENTENCE_END.split(text.strip())
+    last = sentences.pop() if len(sentences) > 1 else ""
+    tail_tokens = count_tokens(last)
+    if tail_tokens > budget // 3:
+        last, tail_tokens = "", 0
+
+    head, head_tokens = [], 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence) + 1
+        if head_tokens + tokens > budget - tail_tokens:
+            break
+        head.append(sentence)
+        head_tokens += tokens
+    if not head:
+        # The first sentence alone is over budget: keep as many of its words as fit
+        head = [cut_to_tokens(sentences[0] if sentences else last, budget - tail_tokens)]
+    return " ".join(head) + ELLIPSIS + last if last else " ".join(head) + ELLIPSIS.rstrip()
+
+
+class PromptBuilder:
+    """
+    Fits the texts of a run's prompts to their token budgets and records the prompt lengths
+
+    One instance serves the analyzer process; its lengths make up the run's prompt report.
+    """
+
+    def __init__(self, parent_tokens=DEFAULT_PARENT_TOKENS, text_tokens=DEFAULT_TEXT_TOKENS):
+        """
+        Args:
+            parent_tokens (int): Budget of a parent body, which only gives context
+            text_tokens (int): Budget of the title or comment being analyzed; sibling
+                groups share it between their comments and their answers
+        """
+        self.parent_tokens = parent_tokens
+        self.text_tokens = text_tokens
+        self.shortened = {'parent': 0, 'text': 0}
+        self.lengths = array('I')
+        self._parents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def text(self, text):
+        """A title or comment body, fitted to the text budget"""
+        shortened = shorten(text, self.text_tokens)
+        if shortened is not text:
+            self._count_shortened("text")
+        return shortened
+
+    def parent(self, text):
+        """A parent body, fitted to the parent budget; shortened parents are reused for their other replies"""
+        with self._lock:
+            if text in self._parents:
+                self._parents.move_to_end(text)
+                return self._parents[text]
+        shortened = shorten(text, self.parent_tokens)
+        if shortened is not text:
+            self._count_shortened("parent")
+        with self._lock:
+            self._parents[text] = shortened
+            if len(self._parents) > MEMO_SIZE:
+                self._parents.popitem(last=False)
+        return shortened
+
+    def _count_shortened(self, kind):
+        with self._lock:
+            self.shortened[kind] += 1
+        TEXTS_SHORTENED.inc(kind=kind)
+
+    def record(self, task, system_prompt, human_content):
+        """Counts a prompt about to be sent; returns its estimated tokens"""
+        tokens = count_tokens(system_prompt) + count_tokens(human_content)
+        with self._lock:
+            self.lengths.append(tokens)
+        PROMPT_TOKENS.observe(tokens, task=task)
+        return tokens
+
+    def context_size(self, system_prompts):
+        """
+        The `num_ctx` that fits any prompt at full budgets with its answer
+
+        The longest system prompt, a parent and a text at their budgets and an answer,
+        rounded up to a multiple of 512 tokens.
+        """
+        longest = max(count_tokens(prompt) for prompt in system_prompts)
+        # Labels such as "Comment Body: " and "Parent Body: " around the texts
+        needed = longest + self.parent_tokens + self.text_tokens + ANSWER_TOKENS + 32
+        return -(-needed // 512) * 512
+
+    def report(self):
+        """Prompts sent, their length distribution in estimated tokens, and the texts shortened"""
+        with self._lock:
+            lengths = sorted(self.lengths)
+            shortened = dict(self.shortened)
+
+        def percentile(fraction):
+            return lengths[int(fraction * (len(lengths) - 1))] if lengths else 0
+
+        return {
+            'prompts': len(lengths),
+            'mean_tokens': sum(lengths) / len(lengths) if lengths else 0.0,
+            'p50_tokens': percentile(0.5),
+            'p95_tokens': percentile(0.95),
+            'p99_tokens': percentile(0.99),
+            'max_tokens': lengths[-1] if lengths else 0,
+            'shortened_parents': shortened['parent'],
+            'shortened_texts': shortened['text'],
+            'parent_budget': self.parent_tokens,
+            'text_budget': self.text_tokens,
+        }
@@ -0,0 +1,34 @@
+from enum import Enum
+
+
+class Sentiment(str, Enum):
+    POSITIVE = "positive"
+    NEGATIVE = "negative"
+    NEUTRAL = "neutral"
+
+
+def validate_analysis(answer):
+    """
+    Validates a fused sentiment + keywords answer from the model
+
+    Args:
+        answer (dict): The parsed JSON answer
+
+    Returns:
+        dict: The answer with a lower-cased sentiment and a list of keyword strings
+
+    Raises:
+        ValueError: If the sentiment is not a `Sentiment` value or keywords is not a list of strings
+    """
+    if not isinstance(answer, dict):
+        raise ValueError(f"Expected a JSON object, got {type(answer).__name__}")
+
+    sentiment = str(answer.get('sentiment', '')).strip().lower()
+    if sentiment not in {s.value for s in Sentiment}:
+        raise ValueError(f"Invalid sentiment: {answer.get('sentiment')!r}")
+
+    keywords = answer.get('keywords')
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise ValueError(f"Invalid keywords: {keywords!r}")
+
+    return {'sentiment': sentiment, 'keywords': keywords}
@@ -1,9 +1,27 @@
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, SystemMessage
+import argparse
+import asyncio
 import json
+import os
+import threading
 from pathlib import Path
 import time
-import requests
+
+from processing.data_cleaner import record_fullname
+from sentiment_analysis.checkpoint import checkpointed_ids, compact_checkpoint, open_checkpoint, seed_checkpoint
+from sentiment_analysis.endpoints import EndpointPool
+from sentiment_analysis.inference_cache import InferenceCache
+from sentiment_analysis.inference_engine import run_concurrent
+from sentiment_analysis.keywords import normalize_keywords
+from sentiment_analysis.prompts import DEFAULT_PARENT_TOKENS, DEFAULT_TEXT_TOKENS, PromptBuilder
+from sentiment_analysis.schema import validate_analysis
+from sentiment_analysis.siblings import (CHARS_PER_TOKEN, DEFAULT_GROUP_SIZE, SiblingBatcher, parse_sibling_answer,
+                                         siblings_content)
+from sentiment_analysis.triage import DEFAULT_SAMPLE_RATE, DEFAULT_THRESHOLD, Triage
+from monitoring import metrics
+from storage.columnar import ColumnarData, columnar_path
+from storage.jsonl import iter_jsonl, iter_records
+from storage.records import is_post
+from storage.rollups import Rollups, load_rollups, rollups_path
 
 # Get the backend directory path
 backend_dir = Path(__file__).resolve().parents[2]
@@ -12,70 +30,114 @@ backend_dir = Path(__file__).resolve().parents[2]
 data_dir = backend_dir / "data"
 processed_dir = data_dir / "processed"
 analyzed_dir = data_dir / "analyzed"
+cache_dir = data_dir / "cache"
+
+processed_file = processed_dir / "processed_reddit_data.jsonl"
+analyzed_file = analyzed_dir / "analyzed_reddit_data.jsonl"
+checkpoint_file = analyzed_dir / "analyzed_reddit_data.checkpoint.jsonl"
+
+# Comma-separated Ollama base URLs; work is shared between all of them
+OLLAMA_HOSTS = [
+    host.strip()
+    for host in os.environ.get("OLLAMA_HOSTS", os.environ.get("OLLAMA_HOST", "http://localhost:11434")).split(",")
+    if host.strip()
+]
+DEFAULT_CONCURRENCY = int(os.environ.get("ANALYZER_CONCURRENCY", 4 * len(OLLAMA_HOSTS)))
+# Token budgets of a parent body and of the title or comment analyzed; longer ones are shortened
+PARENT_TOKENS = int(os.environ.get("ANALYZER_PARENT_TOKENS", DEFAULT_PARENT_TOKENS))
+TEXT_TOKENS = int(os.environ.get("ANALYZER_TEXT_TOKENS", DEFAULT_TEXT_TOKENS))
+# Context window of the model; 0 sizes it to the longest prompt the budgets allow
+NUM_CTX = int(os.environ.get("ANALYZER_NUM_CTX", 0))
+
+local_llm = "llama3.2"
 
-# Create directories if they don't exist
-processed_dir.mkdir(parents=True, exist_ok=True)
-analyzed_dir.mkdir(parents=True, exist_ok=True)
+# Created on first use by `get_pool`, so importing this module does not contact Ollama
+_pool = None
+_pool_error = None
+_pool_lock = threading.Lock()
 
-def wait_for_ollama(max_retries=5, retry_delay=2):
-    """Wait for Ollama service to be ready"""
+def wait_for_ollama(pool, max_retries=5, retry_delay=2):
+    """Wait for at least one Ollama endpoint of the pool to be ready"""
     for i in range(max_retries):
-        try:
-            response = requests.get("http://localhost:11434/api/tags")
-            if response.status_code == 200:
-                print("Successfully connected to Ollama")
-                return True
-        except requests.exceptions.ConnectionError:
-            if i < max_retries - 1:
-                print(f"Waiting for Ollama to be ready... (attempt {i + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            continue
+        healthy = pool.check_health()
+        if healthy:
+            print(f"Successfully connected to Ollama ({len(healthy)}/{len(pool.endpoints)} endpoints healthy)")
+            for endpoint in pool.endpoints:
+                if endpoint not in healthy:
+                    print(f"Ollama endpoint {endpoint.url} is not responding, skipping it for now")
+            return True
+        if i < max_retries - 1:
+            print(f"Waiting for Ollama to be ready... (attempt {i + 1}/{max_retries})")
+            time.sleep(retry_delay)
     raise Exception("Could not connect to Ollama service")
 
-# Wait for Ollama to be ready
-wait_for_ollama()
+def get_pool():
+    """
+    The pool of Ollama endpoints, created and checked on the first LLM call
 
-local_llm = "llama3.2"
-llm = ChatOllama(
-    model=local_llm,
-    temperature=0,
-    format="json"
+    A run whose items are all answered by the inference cache or by triage never
+    waits for Ollama. If no endpoint answers, the error is raised again on every
+    later call instead of waiting once per item.
+
+    Raises:
+        Exception: If no Ollama endpoint is ready
+    """
+    global _pool, _pool_error
+    with _pool_lock:
+        if _pool is None:
+            if _pool_error is not None:
+                raise _pool_error
+            pool = EndpointPool(OLLAMA_HOSTS, local_llm, num_ctx=context_size())
+            try:
+                wait_for_ollama(pool)
+            except Exception as e:
+                _pool_error = e
+                raise
+            _pool = pool
+        return _pool
+
+def context_size():
+    """The `num_ctx` every call runs with: `ANALYZER_NUM_CTX`, or enough for any prompt within the budgets"""
+    return NUM_CTX or prompts.context_size(
+        (POST_SENTIMENT_PROMPT, KEYWORDS_PROMPT, COMMENT_SENTIMENT_PROMPT, FUSED_PROMPT, SIBLINGS_PROMPT)
+    )
+
+def chat_messages(system_prompt, human_content):
+    """The system and user messages of a prompt; langchain is imported on the first call"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    return [SystemMessage(content=system_prompt), HumanMessage(content=human_content)]
+
+# Bump when prompt handling changes in a way the prompt text itself does not capture
+PROMPT_VERSION = "1"
+
+# Persistent answer cache, opened by the __main__ block; None disables caching
+cache = None
+# Fits the texts of every prompt to their budgets and records the prompt lengths
+prompts = PromptBuilder(PARENT_TOKENS, TEXT_TOKENS)
+
+LLM_CALLS = metrics.counter("llm_answers_total", "Answers obtained, by task and source (cache or llm)", ("task", "source"))
+LLM_RETRIES = metrics.counter("llm_retries_total", "Failed LLM attempts that were retried, by task and error", ("task", "error"))
+LLM_FAILURES = metrics.counter("llm_failures_total", "Answers given up on after all retries", ("task",))
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens processed by the LLM, by task and type", ("task", "type"))
+LLM_ANSWER_SECONDS = metrics.histogram("llm_answer_seconds", "Time to get a valid answer from the LLM, including retries", ("task",))
+LLM_PARSE_SECONDS = metrics.histogram(
+    "llm_parse_seconds", "Time to parse and validate an LLM answer", ("task",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
 )
+ANALYZED_ITEMS = metrics.counter("analyzer_items_total", "Posts and comments analyzed", ("kind",))
 
-def analyze_post_sentiment(post_title):
-    max_retries = 3
-    retry_delay = 2
-    for i in range(max_retries):
-        try:
-            answer = llm.invoke(
-                [SystemMessage(content='''
-                You are a helpful assistant that analyzes the sentiment of a post title. 
+POST_SENTIMENT_PROMPT = '''
+                You are a helpful assistant that analyzes the sentiment of a post title.
                 You understand that the title can be nuanced, and that it can only be positive, negative, or neutral.
                 You will respond with the sentiment of the post title in the following format:
                 {
                     "sentiment": "positive" | "negative" | "neutral",
                 }
-                ''')] +
-                [HumanMessage(content=post_title)]
-            )
-            # Parse the JSON content and extract just the sentiment
-            sentiment_data = json.loads(answer.content)
-            return sentiment_data
-        except Exception as e:
-            if i < max_retries - 1:
-                print(f"Error analyzing post sentiment, retrying... (attempt {i + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to analyze post sentiment after {max_retries} retries: {str(e)}")
+                '''
 
-def analyze_keywords(sentiment, sentence):
-    max_retries = 3
-    retry_delay = 2
-    for i in range(max_retries):
-        try:
-            answer = llm.invoke(
-                [SystemMessage(content='''
-                You are a helpful assistant that understands keywords in a sentence. 
+KEYWORDS_PROMPT = '''
+                You are a helpful assistant that understands keywords in a sentence.
                 You are given a sentiment and a sentence.
                 You are to respond with a list of keywords that must come from the sentence that explains the sentiment of the sentence.
 
@@ -83,26 +145,10 @@ def analyze_keywords(sentiment, sentence):
                 {
                     "keywords": ["keyword1", "keyword2", "keyword3"]
                 }
-                ''')] +
-                [HumanMessage(content=f"Sentiment: {sentiment}, Sentence: {sentence}")]
-            )
-            keywords = json.loads(answer.content)
-            return keywords
-        except Exception as e:
-            if i < max_retries - 1:
-                print(f"Error analyzing keywords, retrying... (attempt {i + 1}/{max_retries})")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed to analyze keywords after {max_retries} retries: {str(e)}")
+                '''
 
-def analyze_comment_sentiment(comment_body, parent_body):
-    max_retries = 3
-    retry_delay = 2
-    for i in range(max_retries):
-        try:
-            answer = llm.invoke(
-                [SystemMessage(content='''
-                You are a helpful assistant that analyzes the sentiment of a comment body. 
+COMMENT_SENTIMENT_PROMPT = '''
+                You are a helpful assistant that analyzes the sentiment of a comment body.
                 You understand that the body can be nuanced, and that it can only be positive, negative, or neutral.
                 You will only use the parent body to help you understand the sentiment of the comment body.
 
@@ -110,75 +156,650 @@ def analyze_comment_sentiment(comment_body, parent_body):
                 {
                     "sentiment": "positive" | "negative" | "neutral",
                 }
-                ''')] +
-                [HumanMessage(content=f"Comment Body: {comment_body}, Parent Body: {parent_body}")]
-            )
-            # Parse the JSON content and extract just the sentiment
-            sentiment_data = json.loads(answer.content)
-            return sentiment_data
+                '''
+
+FUSED_PROMPT = '''
+                You are a helpful assistant that analyzes the sentiment of a Reddit post title or comment body, and the keywords behind it.
+                You understand that the text can be nuanced, and that its sentiment can only be positive, negative, or neutral.
+                If a parent body is given, you will only use it to help you understand the sentiment of the text.
+                The keywords must come from the text and explain its sentiment.
+
+                You will respond with the sentiment and keywords of the text in the following format:
+                {
+                    "sentiment": "positive" | "negative" | "neutral",
+                    "keywords": ["keyword1", "keyword2", "keyword3"]
+                }
+                '''
+
+SIBLINGS_PROMPT = '''
+                You are a helpful assistant that analyzes the sentiment of Reddit comments replying to the same parent, and the keywords behind each of them.
+                You understand that a comment can be nuanced, and that its sentiment can only be positive, negative, or neutral.
+                You will only use the parent body to help you understand the sentiment of each comment.
+                The keywords of a comment must come from that comment and explain its sentiment.
+
+                The comments are numbered. You will respond with one entry per comment, in the following format:
+                {
+                    "comments": [
+                        {"comment": 1, "sentiment": "positive" | "negative" | "neutral", "keywords": ["keyword1", "keyword2"]},
+                        {"comment": 2, "sentiment": "positive" | "negative" | "neutral", "keywords": ["keyword1"]}
+                    ]
+                }
+                '''
+
+def cache_key(system_prompt, human_content):
+    return InferenceCache.make_key(local_llm, PROMPT_VERSION, system_prompt, human_content)
+
+def parse_answer(answer, task, validate=None):
+    """
+    Parses and validates a JSON-mode answer, recording its token counts
+
+    Raises:
+        json.JSONDecodeError: If the answer is not valid JSON
+        ValueError: If `validate` rejects it
+    """
+    LLM_CALLS.inc(task=task, source="llm")
+    usage = getattr(answer, "usage_metadata", None) or {}
+    LLM_TOKENS.inc(usage.get("input_tokens", 0), task=task, type="prompt")
+    LLM_TOKENS.inc(usage.get("output_tokens", 0), task=task, type="completion")
+
+    with LLM_PARSE_SECONDS.time(task=task):
+        result = json.loads(answer.content)
+        return validate(result) if validate else result
+
+def invoke_json(system_prompt, human_content, task, max_retries=3, retry_delay=2, validate=None):
+    """
+    Sends a prompt to the JSON-mode model and parses the answer, retrying on failure
+
+    Args:
+        system_prompt (str): The system instructions
+        human_content (str): The user message
+        task (str): Short description used in retry and error messages
+        max_retries (int): Number of attempts before giving up
+        retry_delay (int): Seconds to wait between attempts
+        validate (callable): Optional check applied to the parsed answer; raising
+            from it counts as a failed attempt
+
+    Answers are served from and stored in the module's `cache` when it is open.
+
+    Returns:
+        dict: The parsed JSON answer
+    """
+    key = cache_key(system_prompt, human_content)
+    if cache is not None and (cached := cache.get(key)) is not None:
+        LLM_CALLS.inc(task=task, source="cache")
+        return cached
+
+    pool = get_pool()
+    prompts.record(task, system_prompt, human_content)
+    start = time.perf_counter()
+    for i in range(max_retries):
+        try:
+            answer = pool.invoke(chat_messages(system_prompt, human_content))
+            result = parse_answer(answer, task, validate)
+            if cache is not None:
+                cache.put(key, result)
+            LLM_ANSWER_SECONDS.observe(time.perf_counter() - start, task=task)
+            return result
         except Exception as e:
             if i < max_retries - 1:
-                print(f"Error analyzing comment sentiment, retrying... (attempt {i + 1}/{max_retries})")
+                LLM_RETRIES.inc(task=task, error=type(e).__name__)
+                print(f"Error analyzing {task}, retrying... (attempt {i + 1}/{max_retries})")
                 time.sleep(retry_delay)
             else:
-                raise Exception(f"Failed to analyze comment sentiment after {max_retries} retries: {str(e)}")
+                LLM_FAILURES.inc(task=task)
+                raise Exception(f"Failed to analyze {task} after {max_retries} retries: {str(e)}")
+
+async def ainvoke_json(system_prompt, human_content, task, max_retries=3, retry_delay=2, validate=None,
+                       use_cache=True):
+    """
+    Async counterpart of `invoke_json`, built on `ChatOllama.ainvoke`
+
+    `use_cache=False` skips the module's cache, for answers the caller caches itself.
+    """
+    key = cache_key(system_prompt, human_content)
+    if use_cache and cache is not None and (cached := cache.get(key)) is not None:
+        LLM_CALLS.inc(task=task, source="cache")
+        return cached
+
+    pool = get_pool()
+    prompts.record(task, system_prompt, human_content)
+    start = time.perf_counter()
+    for i in range(max_retries):
+        try:
+            answer = await pool.ainvoke(chat_messages(system_prompt, human_content))
+            result = parse_answer(answer, task, validate)
+            if use_cache and cache is not None:
+                cache.put(key, result)
+            LLM_ANSWER_SECONDS.observe(time.perf_counter() - start, task=task)
+            return result
+        except Exception as e:
+            if i < max_retries - 1:
+                LLM_RETRIES.inc(task=task, error=type(e).__name__)
+                print(f"Error analyzing {task}, retrying... (attempt {i + 1}/{max_retries})")
+                await asyncio.sleep(retry_delay)
+            else:
+                LLM_FAILURES.inc(task=task)
+                raise Exception(f"Failed to analyze {task} after {max_retries} retries: {str(e)}")
+
+def keywords_content(sentiment, sentence):
+    return f"Sentiment: {sentiment}, Sentence: {prompts.text(sentence)}"
+
+def comment_content(comment_body, parent_body):
+    return f"Comment Body: {prompts.text(comment_body)}, Parent Body: {prompts.parent(parent_body)}"
+
+def analyze_post_sentiment(post_title):
+    # Parse the JSON content and extract just the sentiment
+    return invoke_json(POST_SENTIMENT_PROMPT, prompts.text(post_title), "post sentiment")
+
+def analyze_keywords(sentiment, sentence):
+    return invoke_json(KEYWORDS_PROMPT, keywords_content(sentiment, sentence), "keywords")
+
+def analyze_comment_sentiment(comment_body, parent_body):
+    # Parse the JSON content and extract just the sentiment
+    return invoke_json(COMMENT_SENTIMENT_PROMPT, comment_content(comment_body, parent_body), "comment sentiment")
+
+async def aanalyze_post_sentiment(post_title):
+    return await ainvoke_json(POST_SENTIMENT_PROMPT, prompts.text(post_title), "post sentiment")
+
+async def aanalyze_keywords(sentiment, sentence):
+    return await ainvoke_json(KEYWORDS_PROMPT, keywords_content(sentiment, sentence), "keywords")
+
+async def aanalyze_comment_sentiment(comment_body, parent_body):
+    return await ainvoke_json(COMMENT_SENTIMENT_PROMPT, comment_content(comment_body, parent_body), "comment sentiment")
 
-if __name__ == "__main__":    
-    enhanced_data = []
-    
+def fused_content(text, parent_body=None):
+    if parent_body is None:
+        return f"Text: {prompts.text(text)}"
+    return f"Text: {prompts.text(text)}, Parent Body: {prompts.parent(parent_body)}"
+
+def analyze_sentiment_and_keywords(text, parent_body=None):
+    """Returns both sentiment and keywords of a title or comment from a single LLM call"""
+    return invoke_json(FUSED_PROMPT, fused_content(text, parent_body), "sentiment and keywords",
+                       validate=validate_analysis)
+
+async def aanalyze_sentiment_and_keywords(text, parent_body=None):
+    return await ainvoke_json(FUSED_PROMPT, fused_content(text, parent_body), "sentiment and keywords",
+                              validate=validate_analysis)
+
+def sibling_cache_key(parent_body, body):
+    """Cache key of one comment's answer from a sibling-group call, so it is reused whatever group it falls in"""
+    return cache_key(SIBLINGS_PROMPT, fused_content(body, parent_body))
+
+async def aanalyze_siblings(parent_body, bodies):
+    """
+    Gets the sentiment and keywords of comments replying to the same parent from one LLM call
+
+    Answers are cached per comment; only the comments without a cached answer are sent.
+
+    Returns:
+        tuple: For each body its {'sentiment', 'keywords'}, or None if the answer has no
+            valid entry for it; the number of LLM calls made (0 or 1); and the estimated
+            prompt tokens saved compared with one fused call per answered comment
+    """
+    task = "sibling comments"
+    analyses = [None] * len(bodies)
+    keys = [sibling_cache_key(parent_body, body) for body in bodies]
+    missing = []
+    for position, key in enumerate(keys):
+        if cache is not None and (cached := cache.get(key)) is not None:
+            LLM_CALLS.inc(task=task, source="cache")
+            analyses[position] = cached
+        else:
+            missing.append(position)
+    if not missing:
+        return analyses, 0, 0
+
+    content = siblings_content(prompts.parent(parent_body), [prompts.text(bodies[position]) for position in missing])
     try:
-        # Read processed data
-        input_file = processed_dir / "processed_reddit_data.json"
-        with open(input_file, 'r') as f:
-            data = json.load(f)
-            
-        total_posts = len(data['post_titles'])
-        total_comments = len(data['comment_bodies'])
-        total_items = total_posts + total_comments
-        current_item = 0
-            
-        print(f"\nStarting sentiment analysis for {total_posts} posts and {total_comments} comments...")
-            
-        # Process post titles
-        for idx, title in enumerate(data['post_titles'], 1):
-            current_item += 1
-            print(f"\rProcessing item {current_item}/{total_items} (Post {idx}/{total_posts})", end="", flush=True)
-            sentiment = analyze_post_sentiment(title['title'])
-            keywords = analyze_keywords(sentiment['sentiment'], title['title'])
-            enhanced_data.append({
-                'id': title['id'],
-                'created_utc': title['created_UTC'],  
-                'title': title['title'],
-                'url': title['url'],
-                'score': title['score'],
-                'sentiment': sentiment['sentiment'],
-                'keywords': keywords['keywords']
-            })
-            
-        # Process comment bodies
-        for idx, comment in enumerate(data['comment_bodies'], 1):
-            current_item += 1
-            print(f"\rProcessing item {current_item}/{total_items} (Comment {idx}/{total_comments})", end="", flush=True)
-            sentiment = analyze_comment_sentiment(comment['body'], comment['parent_body'])
-            keywords = analyze_keywords(sentiment['sentiment'], comment['body'])
-            enhanced_data.append({
-                'id': comment['id'],
-                'created_utc': comment['created_UTC'],  
-                'body': comment['body'],
-                'parent_body': comment['parent_body'],
-                'score': comment['score'],
-                'sentiment': sentiment['sentiment'],
-                'keywords': keywords['keywords']
-            })
-            
+        answer = await ainvoke_json(SIBLINGS_PROMPT, content, task, max_retries=1, use_cache=False)
+    except Exception:
+        # Malformed output: every comment of the call is split off and asked again
+        return analyses, 1, 0
+
+    single_chars = 0
+    for position, analysis in zip(missing, parse_sibling_answer(answer, len(missing))):
+        if analysis is not None:
+            analyses[position] = analysis
+            single_chars += len(FUSED_PROMPT) + len(fused_content(bodies[position], parent_body))
+            if cache is not None:
+                cache.put(keys[position], analysis)
+    # Comments left unanswered are asked again, so only the answered ones count as saved calls
+    tokens_saved = max(0, single_chars - len(SIBLINGS_PROMPT) - len(content)) // CHARS_PER_TOKEN
+    return analyses, 1, tokens_saved
+
+def build_post_record(post, sentiment, keywords):
+    return {
+        'id': post['id'],
+        'created_utc': post['created_UTC'],
+        'title': post['title'],
+        'url': post['url'],
+        'score': post['score'],
+        'sentiment': sentiment['sentiment'],
+        'keywords': normalize_keywords(keywords['keywords'])
+    }
+
+def build_comment_record(comment, sentiment, keywords):
+    return {
+        'id': comment['id'],
+        'created_utc': comment['created_UTC'],
+        'body': comment['body'],
+        'parent_body': comment['parent_body'],
+        'score': comment['score'],
+        'sentiment': sentiment['sentiment'],
+        'keywords': normalize_keywords(keywords['keywords'])
+    }
+
+async def allm_analysis(item, fused=False):
+    """Gets the sentiment and keywords of a processed record from the LLM, as {'sentiment', 'keywords'}"""
+    kind, entry = item['kind'], item
+    if fused:
+        if kind == "post":
+            return await aanalyze_sentiment_and_keywords(entry['title'])
+        return await aanalyze_sentiment_and_keywords(entry['body'], entry['parent_body'])
+
+    if kind == "post":
+        sentiment = await aanalyze_post_sentiment(entry['title'])
+        keywords = await aanalyze_keywords(sentiment['sentiment'], entry['title'])
+    else:
+        sentiment = await aanalyze_comment_sentiment(entry['body'], entry['parent_body'])
+        keywords = await aanalyze_keywords(sentiment['sentiment'], entry['body'])
+    return {'sentiment': sentiment['sentiment'], 'keywords': keywords['keywords']}
+
+async def aanalyze_item(item, fused=False, triage=None, llm_analysis=None):
+    """
+    Analyzes a single post or comment from the processed data
+
+    Args:
+        item (dict): A processed record tagged with 'kind' "post" or "comment"
+        fused (bool): Get sentiment and keywords from one LLM call instead of two
+        triage (Triage): Optional pre-classifier; items it can label, and duplicates
+            of items already analyzed, skip the LLM
+        llm_analysis (callable): Optional coroutine function returning the item's
+            {'sentiment', 'keywords'} from the LLM, instead of `allm_analysis`
+
+    Returns:
+        dict: The analyzed record written to analyzed_reddit_data.json
+    """
+    if llm_analysis is None:
+        llm_analysis = lambda: allm_analysis(item, fused)
+    if triage is None:
+        analysis = await llm_analysis()
+    else:
+        analysis = await triage.analyze(item, llm_analysis)
+
+    if item['kind'] == "post":
+        return build_post_record(item, analysis, analysis)
+    return build_comment_record(item, analysis, analysis)
+
+def analyze_processed_data(records, concurrency=DEFAULT_CONCURRENCY, show_progress=True, fused=False,
+                           skip_ids=frozenset(), on_record=None, total=None, keep_results=True, triage=None,
+                           siblings=None):
+    """
+    Analyzes every post title and comment body in the processed data
+
+    Args:
+        records (iterable): Processed records tagged with 'kind'; may be a stream or an async iterable
+        concurrency (int): Maximum number of items analyzed at once
+        show_progress (bool): Print a progress counter as items complete
+        fused (bool): Use one combined sentiment + keywords call per item
+        skip_ids (set): IDs that were already analyzed and are left out
+        on_record (callable): Optional callback receiving each record as soon as it completes
+        total (int): Number of items to analyze, shown in the progress counter if known
+        keep_results (bool): Collect and return the analyzed records
+        triage (Triage): Optional pre-classifier that spares the LLM trivial and duplicate items
+        siblings (SiblingBatcher): Optional batcher sending comments that reply to the same
+            parent in one call; `concurrency` then counts groups rather than items
+
+    Returns:
+        list: Analyzed records in input order, or None if `keep_results` is off
+    """
+    if hasattr(records, "__aiter__"):
+        items = (record async for record in records if record['id'] not in skip_ids)
+    else:
+        items = (record for record in records if record['id'] not in skip_ids)
+    completed = 0
+
+    def report_progress(index, item, result):
+        nonlocal completed
+        completed += 1
+        if on_record is not None:
+            on_record(result)
+        if show_progress:
+            print(f"\rProcessed item {completed}{f'/{total}' if total else ''}", end="", flush=True)
+
+    async def worker(item):
+        return await aanalyze_item(item, fused, triage)
+
+    if siblings is None:
+        return asyncio.run(run_concurrent(items, worker, concurrency, on_result=report_progress,
+                                          keep_results=keep_results))
+
+    def report_group(index, group, results):
+        for _, result in results:
+            report_progress(index, group, result)
+
+    async def group_worker(group):
+        return await siblings.analyze(group, lambda item, llm_analysis: aanalyze_item(item, fused, triage, llm_analysis))
+
+    results = asyncio.run(run_concurrent(siblings.sibling_groups(items), group_worker, concurrency,
+                                         on_result=report_group, keep_results=keep_results))
+    if results is None:
+        return None
+    # Groups reorder the comments of a submission; the results follow the input again
+    return [record for _, record in sorted((pair for group in results for pair in group), key=lambda pair: pair[0])]
+
+def open_inference_cache(max_mb=512, max_age_days=90):
+    """Opens the persistent answer cache used by every LLM call of this process"""
+    global cache
+    cache = InferenceCache(
+        cache_dir / "inference_cache.sqlite3",
+        max_bytes=int(max_mb * 1024 * 1024),
+        max_age_days=max_age_days
+    )
+    return cache
+
+def close_inference_cache():
+    """Evicts stale answers, prints the cache statistics and closes the cache"""
+    global cache
+    if cache is None:
+        return
+    evicted = cache.evict()
+    stats = cache.stats()
+    print(f"Inference cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries, "
+          f"{stats['bytes'] / 1024 / 1024:.1f} MB, {evicted} evicted")
+    cache.close()
+    cache = None
+
+def endpoint_report():
+    """Per-endpoint statistics of the run, empty if nothing was sent to the LLM"""
+    return _pool.report() if _pool is not None else []
+
+def print_endpoint_report():
+    print("Ollama endpoints:")
+    for stats in endpoint_report():
+        print(f"  {stats['url']}: {stats['requests']} requests, {stats['failures']} failures, "
+              f"{stats['throughput']:.2f} req/s, mean latency {stats['mean_latency']:.2f}s, "
+              f"p95 latency {stats['p95_latency']:.2f}s")
+
+def create_triage(enabled=True, threshold=None, sample_rate=None, fused=False):
+    """The pre-classifier for an analyzer run, or None when triage is turned off; unset options use the defaults"""
+    if not enabled:
+        return None
+    return Triage(
+        DEFAULT_THRESHOLD if threshold is None else threshold,
+        DEFAULT_SAMPLE_RATE if sample_rate is None else sample_rate,
+        calls_per_item=1 if fused else 2,
+    )
+
+def create_siblings(enabled=False, group_size=None, fused=False):
+    """The sibling batcher for an analyzer run, or None when comments are analyzed one by one"""
+    if not enabled:
+        return None
+    return SiblingBatcher(
+        aanalyze_siblings,
+        lambda item: allm_analysis(item, fused),
+        DEFAULT_GROUP_SIZE if group_size is None else group_size,
+        prompts,
+    )
+
+def print_siblings_report(siblings):
+    if siblings is None:
+        return
+    report = siblings.report()
+    print(f"Sibling groups: {report['groups']} groups sent in {report['calls']} calls, "
+          f"{report['answered']} comments answered in a group call, {report['retried']} retried after a "
+          f"malformed answer, {report['single']} sent alone; about {report['prompt_tokens_saved']} prompt tokens saved")
+
+def print_prompt_report():
+    report = prompts.report()
+    if not report['prompts']:
+        return
+    print(f"Prompts: {report['prompts']} sent, estimated tokens p50 {report['p50_tokens']}, "
+          f"p95 {report['p95_tokens']}, max {report['max_tokens']} (num_ctx {context_size()}); "
+          f"{report['shortened_parents']} parents and {report['shortened_texts']} texts shortened to "
+          f"{report['parent_budget']} and {report['text_budget']} tokens")
+
+def print_triage_report(triage):
+    if triage is None:
+        return
+    report = triage.report()
+    agreement = f"{report['sample_agreement']:.1%}" if report['sample_agreement'] is not None else "n/a"
+    duplicate_agreement = f"{report['duplicate_agreement']:.1%}" if report['duplicate_agreement'] is not None else "n/a"
+    print(f"Triage: {report['items']} items, {report['rule']} by rule, {report['lexicon']} by lexicon, "
+          f"{report['duplicate']} duplicates reused, {report['llm'] + report['sample']} sent to the LLM; "
+          f"{report['llm_calls_avoided']} LLM calls avoided. "
+          f"Lexicon agreed with the LLM on {agreement} of {report['lexicon_sample']} sampled items, "
+          f"reused answers on {duplicate_agreement} of {report['duplicate_sample']} sampled duplicates")
+
+def is_pending(record, analyzed_ids, since=None):
+    """Whether a processed record still needs analysis: not yet analyzed and created at or after `since`"""
+    return record['id'] not in analyzed_ids and (not since or record['created_UTC'] >= since)
+
+def prepare_checkpoint(restart=False):
+    """
+    Readies the checkpoint for a run and returns the IDs of the items already analyzed
+
+    The checkpoint is seeded from the analyzed data of the last completed run, or
+    discarded when `restart` is set so every item is analyzed again.
+    """
+    analyzed_dir.mkdir(parents=True, exist_ok=True)
+    if restart:
+        checkpoint_file.unlink(missing_ok=True)
+        rollups_path(analyzed_file).unlink(missing_ok=True)
+    elif seeded := seed_checkpoint(checkpoint_file, analyzed_file):
+        print(f"Seeded checkpoint with {seeded} previously analyzed items from {analyzed_file}")
+
+    # Items already in the checkpoint were analyzed by an earlier or crashed run
+    return checkpointed_ids(checkpoint_file)
+
+def run_analysis(records, analyzed_ids, concurrency=DEFAULT_CONCURRENCY, fused=False, since=None,
+                 total=None, show_progress=True, on_record=None, triage=None, siblings=None):
+    """
+    Analyzes the pending processed records into the checkpoint, then rewrites the analyzed data
+
+    Every record's ID is kept in input order so the analyzed file follows the processed
+    data; only records that are not in the checkpoint, and not older than `since`, are
+    sent to the LLM. Items older than `since` that were never analyzed stay out of the
+    analyzed file until a run without `since`.
+
+    Args:
+        records (iterable): Processed records tagged with 'kind'; may be a stream or an async iterable
+        analyzed_ids (set): IDs in the checkpoint, as returned by `prepare_checkpoint`
+        concurrency (int): Maximum number of items analyzed at once
+        fused (bool): Use one combined sentiment + keywords call per item
+        since (float): Optional Unix timestamp; older items are not analyzed
+        total (int): Number of pending items, shown in the progress counter if known
+        show_progress (bool): Print a progress counter as items complete
+        on_record (callable): Optional callback receiving each analyzed record once it is checkpointed
+        triage (Triage): Optional pre-classifier that spares the LLM trivial and duplicate items
+        siblings (SiblingBatcher): Optional batcher sending replies to the same parent in one call
+
+    Returns:
+        dict: Numbers of analyzed 'posts' and 'comments', and of items 'saved' to the analyzed file
+    """
+    ordered_ids = []
+    counts = {'posts': 0, 'comments': 0}
+
+    def track(record):
+        ordered_ids.append(record['id'])
+        if not is_pending(record, analyzed_ids, since):
+            return False
+        counts['posts' if record['kind'] == "post" else 'comments'] += 1
+        return True
+
+    if hasattr(records, "__aiter__"):
+        pending = (record async for record in records if track(record))
+    else:
+        pending = (record for record in records if track(record))
+
+    # Timeline rollups of the last completed run, which the new items are added to
+    rollups = load_rollups(columnar_path(analyzed_file))
+
+    # Stream the items to the LLM and each result to the checkpoint
+    with open_checkpoint(checkpoint_file) as checkpoint:
+        def write_record(record):
+            checkpoint.write(record)
+            if rollups is not None:
+                rollups.add_record(record)
+            ANALYZED_ITEMS.inc(kind="post" if is_post(record) else "comment")
+            if on_record is not None:
+                on_record(record)
+
+        analyze_processed_data(pending, concurrency, show_progress=show_progress, fused=fused,
+                               on_record=write_record, total=total, keep_results=False, triage=triage,
+                               siblings=siblings)
+    if show_progress:
         print("\n")  # New line after progress counter
-            
-        # Save analyzed data
-        output_file = analyzed_dir / "analyzed_reddit_data.json"
-        with open(output_file, 'w') as f:
-            json.dump(enhanced_data, f, indent=2)
-            
-        print(f"Successfully analyzed {len(enhanced_data)} items ({total_posts} posts and {total_comments} comments) and saved to {output_file}")
-        
+
+    counts['saved'] = publish_analyzed(ordered_ids, rollups)
+    return counts
+
+def publish_analyzed(ordered_ids, rollups=None):
+    """
+    Compacts the checkpoint into the analyzed data, and rewrites its columnar copy and rollups
+
+    The API loads the columnar copy unless the JSONL file is newer, so the JSONL is
+    compacted to a staging file first and renamed into place last, after the columns
+    and rollups. The rename keeps the staging file's older modification time, and the
+    API never falls back to parsing the JSONL in between.
+
+    Args:
+        ordered_ids (list): IDs in output order, as for `compact_checkpoint`
+        rollups (Rollups): The rollups kept up to date with the checkpoint, if any
+
+    Returns:
+        int: Number of items saved to the analyzed file
+    """
+    # Compact the checkpoint into the analyzed data the API reads
+    staged_file = analyzed_file.with_suffix(".staged.jsonl")
+    saved = compact_checkpoint(checkpoint_file, staged_file, ordered_ids)
+
+    # The compact columnar copy the API memory-maps instead of parsing the JSONL
+    data = ColumnarData.from_records(iter_jsonl(staged_file))
+
+    # Rollups that do not cover every saved item, e.g. after a crashed run, are rebuilt from the data.
+    # Both are ready before either file is replaced, so the API sees the two land close together
+    if rollups is None or rollups.items != saved:
+        rollups = Rollups.from_columns(data)
+    data.save(columnar_path(analyzed_file))
+    rollups.save(rollups_path(analyzed_file))
+
+    os.replace(staged_file, analyzed_file)
+    return saved
+
+def refresh_scores(scores):
+    """
+    Sets refreshed scores on the analyzed data, without analyzing anything again
+
+    The records whose score changed are appended to the checkpoint with their new
+    score, so a later run keeps it, and the analyzed data is published again as
+    after a run. The number of items stays the same, so saved rollups cannot show
+    whether their score weights are current; they are always rebuilt from the data.
+
+    Args:
+        scores (dict): Reddit fullname to new score
+
+    Returns:
+        int: Number of analyzed items whose score changed
+    """
+    prepare_checkpoint()
+    if not checkpoint_file.exists():
+        return 0
+
+    # The latest checkpointed record of each item whose score changed
+    changed = {}
+    for record in iter_jsonl(checkpoint_file):
+        score = scores.get(record_fullname(record))
+        if score is not None and score != record.get('score'):
+            changed[record['id']] = {**record, 'score': score}
+        else:
+            changed.pop(record['id'], None)
+    if not changed:
+        return 0
+
+    with open_checkpoint(checkpoint_file) as checkpoint:
+        for record in changed.values():
+            checkpoint.write(record)
+
+    try:
+        ordered_ids = [record['id'] for record in iter_records(analyzed_file)]
+    except FileNotFoundError:
+        ordered_ids = []
+    publish_analyzed(ordered_ids)
+    return len(changed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze sentiment and keywords of processed Reddit data")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum number of items analyzed at once (1 = sequential)")
+    parser.add_argument("--fused", action="store_true",
+                        help="Get sentiment and keywords from a single LLM call per item")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the LLM instead of reusing cached answers")
+    parser.add_argument("--cache-max-mb", type=float, default=512,
+                        help="Size budget of the inference cache in megabytes")
+    parser.add_argument("--cache-max-age-days", type=float, default=90,
+                        help="Evict cached answers not used for this many days")
+    parser.add_argument("--restart", action="store_true",
+                        help="Discard the checkpoint and re-analyze every item")
+    parser.add_argument("--since", type=float,
+                        help="Only analyze items created at or after this Unix timestamp")
+    parser.add_argument("--no-triage", action="store_true",
+                        help="Send every item to the LLM, including trivial ones and duplicates")
+    parser.add_argument("--triage-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Lexicon confidence at which an item is labelled without the LLM")
+    parser.add_argument("--triage-sample", type=float, default=DEFAULT_SAMPLE_RATE,
+                        help="Fraction of lexicon-labelled and duplicate items also sent to the LLM to measure agreement")
+    parser.add_argument("--group-siblings", action="store_true",
+                        help="Send comments replying to the same parent in one LLM call, with the parent once")
+    parser.add_argument("--group-size", type=int, default=DEFAULT_GROUP_SIZE,
+                        help="Most comments sent in one sibling-group call")
+    parser.add_argument("--report", type=Path,
+                        help="Write a JSON run report with the run's metrics to this file")
+    args = parser.parse_args()
+
+    if not args.no_cache:
+        open_inference_cache(args.cache_max_mb, args.cache_max_age_days)
+    triage = create_triage(not args.no_triage, args.triage_threshold, args.triage_sample, args.fused)
+    siblings = create_siblings(args.group_siblings, args.group_size, args.fused)
+
+    try:
+        analyzed_ids = prepare_checkpoint(args.restart)
+
+        # First pass over the processed data: the number of new items, for the progress counter
+        new_posts = new_comments = 0
+        for record in iter_records(processed_file):
+            if is_pending(record, analyzed_ids, args.since):
+                if record['kind'] == "post":
+                    new_posts += 1
+                else:
+                    new_comments += 1
+
+        print(f"\nStarting sentiment analysis for {new_posts} new posts and {new_comments} new comments "
+              f"({len(analyzed_ids)} already analyzed, concurrency {args.concurrency}{', fused' if args.fused else ''})...")
+
+        # Second pass streams the items to the LLM and each result to the checkpoint
+        counts = run_analysis(iter_records(processed_file), analyzed_ids, args.concurrency, fused=args.fused,
+                              since=args.since, total=new_posts + new_comments, triage=triage,
+                              siblings=siblings)
+
+        print(f"Successfully analyzed {counts['posts'] + counts['comments']} new items "
+              f"({counts['posts']} posts and {counts['comments']} comments) "
+              f"and saved {counts['saved']} items to {analyzed_file}")
+
     except Exception as e:
-        print(f"\nError during sentiment analysis: {str(e)}")
\ No newline at end of file
+        print(f"\nError during sentiment analysis: {str(e)}")
+
+    finally:
+        print_endpoint_report()
+        print_triage_report(triage)
+        print_siblings_report(siblings)
+        print_prompt_report()
+        close_inference_cache()
+        if args.report:
+            metrics.write_run_report(args.report, endpoints=endpoint_report(),
+                                     triage=triage.report() if triage is not None else None,
+                                     siblings=siblings.report() if siblings is not None else None,
+                                     prompts=prompts.report())
+            print(f"Wrote run report to {args.report}")
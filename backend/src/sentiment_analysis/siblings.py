@@ -0,0 +1,270 @@
+"""
+Groups comments replying to the same parent, so the parent is sent to the LLM once per group.
+
+Every comment prompt repeats the comment's parent body, so a popular post title or
+top comment with 50 replies is part of 50 prompts. In sibling mode the analyzer
+buffers the comments of a submission, groups them by `parent_id`, and sends each
+group's parent once, followed by the numbered replies, in a single JSON-mode call
+that answers for every reply.
+
+Replies whose answer is missing or invalid are split off and asked again in two
+smaller groups, down to a single reply, which goes through the usual one-item
+call; replies that were answered are never sent again. Triage still applies to
+every reply: only the ones it cannot label join the group's call. With a prompt
+builder, a group also stops growing once its replies and their answers would take
+more tokens than one reply at its full budget, so every call fits the same context.
+"""
+import asyncio
+
+from monitoring import metrics
+from sentiment_analysis.prompts import ANSWER_TOKENS, COMMENT_ANSWER_TOKENS, count_tokens
+from sentiment_analysis.schema import validate_analysis
+
+DEFAULT_GROUP_SIZE = 8
+# Comments buffered while waiting for the rest of their submission; past this many they are grouped as they are
+MAX_BUFFERED = 2000
+# Prompt characters per token, for estimating the tokens a group call saves
+CHARS_PER_TOKEN = 4
+
+SIBLING_COMMENTS = metrics.counter(
+    "sibling_comments_total", "Comments sent in sibling-group calls, by outcome (answered, retried or single)",
+    ("outcome",)
+)
+PROMPT_TOKENS_SAVED = metrics.counter(
+    "llm_prompt_tokens_saved_total", "Estimated prompt tokens saved by sending sibling comments in one call"
+)
+
+
+def siblings_content(parent_body, bodies):
+    """The user message of a sibling-group call: the parent, then the numbered comments"""
+    lines = [f"Parent Body: {parent_body}"]
+    lines += [f"Comment {number}: {body}" for number, body in enumerate(bodies, 1)]
+    return "\n".join(lines)
+
+
+def parse_sibling_answer(answer, count):
+    """
+    Splits a sibling-group answer into the analyses of its comments
+
+    Args:
+        answer (dict): The parsed JSON answer, `{"comments": [{"comment": 1, "sentiment": ..., "keywords": [...]}]}`
+        count (int): Number of comments in the group
+
+    Returns:
+        list: For each comment, its validated {'sentiment', 'keywords'}, or None if the
+            answer has no valid entry for it
+    """
+    analyses = [None] * count
+    entries = answer.get('comments') if isinstance(answer, dict) else None
+    if not isinstance(entries, list):
+        return analyses
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        number = entry.get('comment')
+        if isinstance(number, str) and number.strip().isdigit():
+            number = int(number)
+        if isinstance(number, bool) or not isinstance(number, int) or not 1 <= number <= count:
+            continue
+        if analyses[number - 1] is None:
+            try:
+                analyses[number - 1] = validate_analysis(entry)
+            except ValueError:
+                continue
+    return analyses
+
+
+class SiblingBatch:
+    """
+    The replies of one group that need the LLM, sent together
+
+    Replies are submitted by their own tasks; the ones submitted during the same
+    event loop iteration share one call. A reply submitted later, e.g. a duplicate
+    whose first occurrence failed, gets a call of its own.
+    """
+
+    def __init__(self, batcher, parent_body):
+        self.batcher = batcher
+        self.parent_body = parent_body
+        self._pending = []
+        self._tasks = set()
+
+    async def analyze(self, item):
+        """The reply's {'sentiment', 'keywords'}, from the group's call"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._send)
+        self._pending.append((item, future))
+        return await future
+
+    def _send(self):
+        pending, self._pending = self._pending, []
+        task = asyncio.ensure_future(self.batcher.resolve(self.parent_body, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class SiblingBatcher:
+    """
+    Groups the comments of an analyzer run by parent and analyzes each group in one call
+
+    One instance serves one analyzer run; its counts make up the run's sibling report.
+    """
+
+    def __init__(self, analyze_group, analyze_single, group_size=DEFAULT_GROUP_SIZE, prompts=None):
+        """
+        Args:
+            analyze_group (callable): Coroutine function `(parent_body, bodies)` returning the
+                analyses of the bodies, None for the ones not answered, the number of LLM
+                calls it made and the estimated prompt tokens they saved
+            analyze_single (callable): Coroutine function returning the analysis of one item
+            group_size (int): Most comments sent in one call
+            prompts (PromptBuilder): Optional token budgets; groups are also capped to
+                the tokens of a single reply at its full budget and its answer
+        """
+        self.analyze_group = analyze_group
+        self.analyze_single = analyze_single
+        self.group_size = max(2, int(group_size))
+        self.prompts = prompts
+        self.groups = 0
+        self.calls = 0
+        self.answered = 0
+        self.retried = 0
+        self.single = 0
+        self.tokens_saved = 0
+
+    async def sibling_groups(self, records):
+        """
+        Regroups a stream of processed records into lists of (index, record)
+
+        Posts come alone; the comments of a submission, which follow its post, are
+        buffered until the next post and grouped by `parent_id` in order of first
+        appearance, in groups cut by `split`. `index` is the record's
+        position in the stream, for restoring the input order.
+        """
+        buffer = []
+
+        def flush():
+            by_parent = {}
+            for index, record in buffer:
+                by_parent.setdefault(record.get('parent_id') or record['id'], []).append((index, record))
+            buffer.clear()
+            for siblings in by_parent.values():
+                yield from self.split(siblings)
+
+        index = 0
+        async for record in _aiterate(records):
+            if record['kind'] == "post":
+                for group in flush():
+                    yield group
+                yield [(index, record)]
+            else:
+                buffer.append((index, record))
+                if len(buffer) >= MAX_BUFFERED:
+                    for group in flush():
+                        yield group
+            index += 1
+        for group in flush():
+            yield group
+
+    def split(self, siblings):
+        """Cuts the (index, record) pairs of one parent's replies into groups within the size and token caps"""
+        if self.prompts is None:
+            for start in range(0, len(siblings), self.group_size):
+                yield siblings[start:start + self.group_size]
+            return
+
+        budget = self.prompts.text_tokens + ANSWER_TOKENS
+        group, tokens = [], 0
+        for sibling in siblings:
+            cost = min(count_tokens(sibling[1]['body']), self.prompts.text_tokens) + COMMENT_ANSWER_TOKENS
+            if group and (len(group) == self.group_size or tokens + cost > budget):
+                yield group
+                group, tokens = [], 0
+            group.append(sibling)
+            tokens += cost
+        if group:
+            yield group
+
+    async def analyze(self, group, analyze_item):
+        """
+        Analyzes a group from `sibling_groups`
+
+        Args:
+            group (list): (index, record) pairs of replies to one parent, or a single record
+            analyze_item (callable): Coroutine function `(item, llm_analysis)` returning the
+                analyzed record; it awaits `llm_analysis()` for items that need the LLM
+
+        Returns:
+            list: (index, analyzed record) pairs
+        """
+        if len(group) == 1:
+            index, item = group[0]
+            return [(index, await analyze_item(item, None))]
+
+        self.groups += 1
+        batch = SiblingBatch(self, group[0][1]['parent_body'])
+        records = await asyncio.gather(*(
+            analyze_item(item, lambda item=item: batch.analyze(item)) for _, item in group
+        ))
+        return [(index, record) for (index, _), record in zip(group, records)]
+
+    async def resolve(self, parent_body, pending):
+        """Answers the (item, future) pairs of a batch, splitting off and retrying the unanswered ones"""
+        try:
+            if len(pending) == 1:
+                item, future = pending[0]
+                self.single += 1
+                SIBLING_COMMENTS.inc(outcome="single")
+                analysis = await self.analyze_single(item)
+                if not future.done():
+                    future.set_result(analysis)
+                return
+
+            analyses, calls, tokens_saved = await self.analyze_group(
+                parent_body, [item['body'] for item, _ in pending]
+            )
+            self.calls += calls
+            self.tokens_saved += tokens_saved
+            PROMPT_TOKENS_SAVED.inc(tokens_saved)
+            failed = []
+            for (item, future), analysis in zip(pending, analyses):
+                if analysis is None:
+                    failed.append((item, future))
+                elif not future.done():
+                    future.set_result(analysis)
+            self.answered += len(pending) - len(failed)
+            SIBLING_COMMENTS.inc(len(pending) - len(failed), outcome="answered")
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if len(failed) > 1:
+            self.retried += len(failed)
+            SIBLING_COMMENTS.inc(len(failed), outcome="retried")
+        middle = (len(failed) + 1) // 2
+        halves = [half for half in (failed[:middle], failed[middle:]) if half]
+        await asyncio.gather(*(self.resolve(parent_body, half) for half in halves))
+
+    def report(self):
+        """Groups formed, calls made, and comments answered in a group call, retried or sent alone"""
+        return {
+            'groups': self.groups,
+            'calls': self.calls,
+            'answered': self.answered,
+            'retried': self.retried,
+            'single': self.single,
+            'prompt_tokens_saved': self.tokens_saved,
+        }
+
+
+async def _aiterate(records):
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
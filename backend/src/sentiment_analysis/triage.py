@@ -0,0 +1,370 @@
+"""
+Cheap pre-classification of posts and comments before they reach the LLM.
+
+Every pending item goes through three checks, cheapest first:
+
+* Rules: removed or deleted bodies, bare links and texts without any words are
+  neutral and have no keywords.
+* Lexicon: a sentiment lexicon with negation and intensifiers scores the text and
+  gives a confidence; texts scored at or above the threshold, typically short
+  reactions such as "Absolutely ruined." or "Well deserved.", get the lexicon's
+  sentiment, with the sentiment-bearing words as keywords.
+* Duplicates: texts are normalized (case, links, punctuation, repeated characters)
+  and hashed; an item whose text was already sent to the LLM in this run reuses
+  that answer, waiting for it if the call is still in flight. A comment is judged
+  against its parent, so it only reuses the answer of the same reply to the same
+  parent text.
+
+Only the remaining, ambiguous items are sent to the LLM. A small, deterministic
+sample of the items the lexicon could decide, and of the duplicates, is sent to the
+LLM anyway, and the two labels are compared, so every run reports how well the
+lexicon and the reused answers agree with it.
+"""
+import argparse
+import asyncio
+import hashlib
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+from monitoring import metrics
+from storage.jsonl import iter_records
+from storage.records import is_post
+
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_SAMPLE_RATE = 0.05
+
+# Bodies Reddit substitutes for moderated or deleted content
+PLACEHOLDER_BODIES = frozenset({"[removed]", "[deleted]"})
+
+# Word -> valence, positive or negative, on the same -3..3 scale as VADER
+LEXICON = {
+    # positive
+    "amazing": 3.0, "awesome": 3.0, "beautiful": 2.5, "beautifully": 2.5, "best": 3.0, "brilliant": 3.0,
+    "congrats": 2.5, "congratulations": 2.5, "deserved": 2.0, "deserves": 1.5, "enjoy": 2.0, "enjoyed": 2.0,
+    "excellent": 3.0, "excited": 2.0, "fantastic": 3.0, "favorite": 2.0, "favourite": 2.0, "fun": 2.0,
+    "glad": 2.0, "good": 1.9, "gorgeous": 3.0, "great": 2.5, "happy": 2.5, "incredible": 3.0, "insane": 1.0,
+    "legendary": 3.0, "love": 3.0, "loved": 3.0, "loves": 2.5, "lovely": 2.5, "masterpiece": 3.0,
+    "nice": 1.8, "perfect": 3.0, "perfectly": 2.5, "phenomenal": 3.0, "recommend": 2.0, "stunning": 3.0,
+    "superb": 3.0, "thank": 1.5, "thanks": 1.5, "underrated": 1.5, "well-deserved": 2.5, "win": 2.0,
+    "wonderful": 3.0, "worth": 1.5, "wow": 2.0,
+    # negative
+    "annoying": -2.0, "awful": -3.0, "bad": -2.5, "boring": -2.5, "broken": -2.0, "cringe": -2.5,
+    "crap": -2.5, "disappointed": -2.5, "disappointing": -2.5, "disgusting": -3.0, "dumb": -2.0,
+    "garbage": -3.0, "hate": -3.0, "hated": -3.0, "hates": -2.5, "horrible": -3.0, "idiot": -2.5,
+    "idiots": -2.5, "lame": -2.0, "losers": -2.5, "mess": -2.0, "mediocre": -2.0, "overrated": -2.0,
+    "pathetic": -3.0, "ruin": -2.5, "ruined": -2.5, "ruins": -2.5, "sad": -2.0, "shame": -2.0,
+    "shit": -2.5, "stupid": -2.5, "sucks": -2.5, "terrible": -3.0, "toxic": -2.5, "trash": -3.0,
+    "ugly": -2.5, "unplayable": -3.0, "waste": -2.5, "weak": -1.5, "worse": -2.5, "worst": -3.0,
+    "wtf": -2.0,
+}
+
+EMOJI_LEXICON = {
+    "😂": 1.5, "🤣": 1.5, "😍": 3.0, "🥰": 3.0, "❤": 3.0, "😊": 2.0, "👍": 2.0, "👏": 2.0, "🙌": 2.0,
+    "🔥": 2.0, "💯": 2.0, "🐐": 2.0, "😡": -3.0, "🤬": -3.0, "🤮": -3.0, "👎": -2.0, "💩": -2.0,
+    "😢": -2.0, "🙄": -2.0, "😒": -2.0, "😤": -2.0,
+}
+
+NEGATIONS = frozenset({"not", "no", "never", "nothing", "nobody", "none", "neither", "nor", "without"})
+# Words that strengthen the next sentiment-bearing word
+INTENSIFIERS = {
+    "absolutely": 1.3, "completely": 1.3, "extremely": 1.4, "incredibly": 1.3, "really": 1.2, "so": 1.2,
+    "super": 1.3, "totally": 1.3, "truly": 1.2, "very": 1.3, "literally": 1.1, "fucking": 1.4, "fuckin": 1.4,
+}
+# Negations flip words up to this many tokens later, scaled as in VADER
+NEGATION_SCOPE = 3
+NEGATION_SCALAR = -0.74
+# Each token that carries no sentiment adds this much doubt to the score
+UNSCORED_TOKEN_WEIGHT = 0.25
+
+URL_PATTERN = re.compile(r"\[([^\]]*)\]\((?:https?://|www\.)[^)]*\)|(?:https?://|www\.)\S+")
+TOKEN_PATTERN = re.compile(r"[a-z]+(?:['’-][a-z]+)*|[\U0001F300-\U0001FAFF☀-➿]")
+REPEATED_PATTERN = re.compile(r"(.)\1{2,}")
+NON_WORD_PATTERN = re.compile(r"[^\w\U0001F300-\U0001FAFF☀-➿]+")
+
+TRIAGE_ITEMS = metrics.counter(
+    "triage_items_total", "Items triaged, by how they were labelled (rule, lexicon, duplicate, sample or llm)", ("outcome",)
+)
+TRIAGE_AGREEMENT = metrics.counter(
+    "triage_sample_total", "Sampled items labelled by both triage and the LLM, by route (lexicon or duplicate) "
+    "and whether they agreed", ("route", "agreed")
+)
+
+
+def normalize_text(text):
+    """Case-folded text with links, punctuation, repeated characters and extra spaces removed"""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("️", "")
+    text = URL_PATTERN.sub(lambda match: f" {match.group(1) or ''} ", text)
+    text = REPEATED_PATTERN.sub(r"\1\1", text)
+    return " ".join(NON_WORD_PATTERN.sub(" ", text).split())
+
+
+def text_key(text):
+    """Hash of the normalized text; near-identical texts share it"""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+
+def duplicate_key(text, parent_body=None):
+    """Key under which duplicates share an answer: the text, and for a comment the parent it replies to"""
+    if parent_body is None:
+        return text_key(text)
+    return text_key(parent_body), text_key(text)
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKC", text).casefold().replace("️", "")
+    text = URL_PATTERN.sub(lambda match: f" {match.group(1) or ''} ", text)
+    return TOKEN_PATTERN.findall(REPEATED_PATTERN.sub(r"\1\1", text))
+
+
+def score_text(text):
+    """
+    Scores a text with the lexicon
+
+    Returns:
+        tuple: The sentiment ("positive", "negative" or "neutral"), a confidence between
+            0 and 1, and the words that carried the sentiment
+    """
+    tokens = tokenize(text)
+    positive = negative = 0.0
+    unscored = 0
+    keywords = []
+    negated_until = -1
+    intensity = 1.0
+    for index, token in enumerate(tokens):
+        valence = LEXICON.get(token)
+        if valence is None:
+            valence = EMOJI_LEXICON.get(token)
+        if valence is None:
+            if token in NEGATIONS or token.endswith(("n't", "n’t")):
+                negated_until = index + NEGATION_SCOPE
+            elif token in INTENSIFIERS:
+                intensity *= INTENSIFIERS[token]
+            else:
+                unscored += 1
+            continue
+
+        valence *= intensity
+        intensity = 1.0
+        if index <= negated_until:
+            valence *= NEGATION_SCALAR
+        if valence > 0:
+            positive += valence
+        else:
+            negative -= valence
+        if token not in keywords and token not in EMOJI_LEXICON:
+            keywords.append(token)
+
+    if not positive and not negative:
+        return "neutral", 0.0, []
+
+    confidence = abs(positive - negative) / (positive + negative + UNSCORED_TOKEN_WEIGHT * unscored + 1.0)
+    # Questions and sarcasm markers turn the words' plain meaning around too often
+    stripped = text.rstrip()
+    if stripped.endswith("?"):
+        confidence *= 0.5
+    if stripped.endswith("/s"):
+        confidence = 0.0
+    return "positive" if positive > negative else "negative", confidence, keywords
+
+
+def apply_rules(text):
+    """The analysis of a text that needs no scoring at all, or None"""
+    if text.strip() in PLACEHOLDER_BODIES or not normalize_text(URL_PATTERN.sub(" ", text)):
+        return {'sentiment': "neutral", 'keywords': []}
+    return None
+
+
+def item_text(item):
+    return item['title'] if item['kind'] == "post" else item['body']
+
+
+def item_parent(item):
+    return None if item['kind'] == "post" else item['parent_body']
+
+
+class Triage:
+    """
+    Labels the items the LLM is not needed for, and shares LLM answers between duplicates
+
+    One instance serves one analyzer run; its counts make up the run's triage report.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, sample_rate=DEFAULT_SAMPLE_RATE, calls_per_item=2):
+        """
+        Args:
+            threshold (float): Lexicon confidence at which an item is labelled without the LLM;
+                above 1 turns lexicon labelling off, leaving only the rules and duplicates
+            sample_rate (float): Fraction of lexicon-decidable and duplicate items sent to the
+                LLM anyway, to measure agreement
+            calls_per_item (int): LLM calls an item costs (2 split, 1 fused), for the report
+        """
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.calls_per_item = calls_per_item
+        self.counts = Counter()
+        self.agreement = Counter()
+        self._answers = {}
+
+    def in_sample(self, item):
+        digest = hashlib.blake2b(item['id'].encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") < self.sample_rate * 2 ** 64
+
+    def classify(self, text):
+        """
+        Labels a text from the rules and the lexicon
+
+        Returns:
+            tuple: The analysis ({'sentiment', 'keywords'}) and "rule" or "lexicon", or
+                (None, None) if the text is ambiguous
+        """
+        analysis = apply_rules(text)
+        if analysis is not None:
+            return analysis, "rule"
+        sentiment, confidence, keywords = score_text(text)
+        if confidence >= self.threshold:
+            return {'sentiment': sentiment, 'keywords': keywords}, "lexicon"
+        return None, None
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        TRIAGE_ITEMS.inc(outcome=outcome)
+
+    async def _sample(self, route, analysis, llm_analysis):
+        """Sends an item triage could label to the LLM anyway, records whether they agree, and returns the LLM's answer"""
+        answer = await llm_analysis()
+        agreed = answer['sentiment'] == analysis['sentiment']
+        self.agreement[(route, analysis['sentiment'], answer['sentiment'])] += 1
+        TRIAGE_AGREEMENT.inc(route=route, agreed=str(agreed).lower())
+        self._count("sample")
+        return answer
+
+    def _route_agreement(self, route):
+        pairs = {(label, llm): count for (sampled, label, llm), count in self.agreement.items() if sampled == route}
+        sampled = sum(pairs.values())
+        agreed = sum(count for (label, llm), count in pairs.items() if label == llm)
+        confusion = {f"{label}->{llm}": count for (label, llm), count in sorted(pairs.items())}
+        return sampled, agreed / sampled if sampled else None, confusion
+
+    async def analyze(self, item, llm_analysis):
+        """
+        Returns the analysis of a processed record, calling `llm_analysis()` only if needed
+
+        Args:
+            item (dict): A processed record tagged with 'kind'
+            llm_analysis (callable): Coroutine function returning {'sentiment', 'keywords'} from the LLM
+        """
+        text = item_text(item)
+        analysis, outcome = self.classify(text)
+        if analysis is not None:
+            if outcome == "lexicon" and self.in_sample(item):
+                return await self._sample("lexicon", analysis, llm_analysis)
+            self._count(outcome)
+            return analysis
+
+        key = duplicate_key(text, item_parent(item))
+        future = self._answers.get(key)
+        if future is not None:
+            answer = dict(await asyncio.shield(future))
+            if self.in_sample(item):
+                return await self._sample("duplicate", answer, llm_analysis)
+            self._count("duplicate")
+            return answer
+
+        future = self._answers[key] = asyncio.get_running_loop().create_future()
+        try:
+            answer = await llm_analysis()
+        except BaseException as e:
+            # Duplicates already waiting fail with this item; later ones try again
+            del self._answers[key]
+            future.set_exception(e if isinstance(e, Exception) else asyncio.CancelledError())
+            future.exception()
+            raise
+        future.set_result(answer)
+        self._count("llm")
+        return answer
+
+    def report(self):
+        """Items labelled by each route, LLM calls avoided, and agreement on the lexicon and duplicate samples"""
+        avoided = self.counts["rule"] + self.counts["lexicon"] + self.counts["duplicate"]
+        lexicon_sampled, lexicon_agreement, lexicon_confusion = self._route_agreement("lexicon")
+        duplicate_sampled, duplicate_agreement, duplicate_confusion = self._route_agreement("duplicate")
+        return {
+            'items': sum(self.counts.values()),
+            'rule': self.counts["rule"],
+            'lexicon': self.counts["lexicon"],
+            'duplicate': self.counts["duplicate"],
+            'llm': self.counts["llm"],
+            'sample': self.counts["sample"],
+            'llm_calls_avoided': avoided * self.calls_per_item,
+            'threshold': self.threshold,
+            'lexicon_sample': lexicon_sampled,
+            'sample_agreement': lexicon_agreement,
+            'sample_confusion': lexicon_confusion,
+            'duplicate_sample': duplicate_sampled,
+            'duplicate_agreement': duplicate_agreement,
+            'duplicate_confusion': duplicate_confusion,
+        }
+
+
+def evaluate(records, thresholds):
+    """
+    Compares lexicon labels with the LLM labels of already analyzed records
+
+    Returns:
+        list: Per threshold, the share of items decided without the LLM and how often
+            those decisions match the LLM's sentiment, with how often the LLM gave
+            duplicates the sentiment of their first occurrence
+    """
+    scored = []
+    first_labels = {}
+    # (first occurrence's sentiment, duplicate's sentiment) of every later occurrence of a text
+    repeats = []
+    for record in records:
+        post = is_post(record)
+        text = record['title'] if post else record['body']
+        key = duplicate_key(text, None if post else record.get('parent_body', ""))
+        if key in first_labels:
+            repeats.append((first_labels[key], record['sentiment']))
+        else:
+            first_labels[key] = record['sentiment']
+        if apply_rules(text) is not None:
+            scored.append(("rule", "neutral", 1.0, record['sentiment']))
+        else:
+            sentiment, confidence, _ = score_text(text)
+            scored.append(("lexicon", sentiment, confidence, record['sentiment']))
+
+    duplicate_agreement = sum(first == llm for first, llm in repeats) / len(repeats) if repeats else None
+    results = []
+    for threshold in thresholds:
+        decided = [(label, llm) for kind, label, confidence, llm in scored if kind == "rule" or confidence >= threshold]
+        lexicon = [(label, llm) for kind, label, confidence, llm in scored if kind == "lexicon" and confidence >= threshold]
+        results.append({
+            'threshold': threshold,
+            'items': len(scored),
+            'decided': len(decided),
+            'duplicates': len(repeats),
+            'duplicate_agreement': duplicate_agreement,
+            'agreement': sum(label == llm for label, llm in decided) / len(decided) if decided else None,
+            'lexicon_agreement': sum(label == llm for label, llm in lexicon) / len(lexicon) if lexicon else None,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    analyzed_file = Path(__file__).resolve().parents[2] / "data" / "analyzed" / "analyzed_reddit_data.jsonl"
+
+    parser = argparse.ArgumentParser(description="Measure how well the triage lexicon agrees with LLM labels")
+    parser.add_argument("source", nargs="?", type=Path, default=analyzed_file, help="Analyzed JSON/JSONL data")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.4, 0.5, 0.6, 0.7, 0.8])
+    args = parser.parse_args()
+
+    print(f"{'threshold':>9} {'items':>7} {'decided':>8} {'share':>6} {'agree':>6} {'lexicon agree':>14} {'duplicates':>10} {'dup agree':>9}")
+    for result in evaluate(iter_records(args.source), args.threshold):
+        share = result['decided'] / result['items'] if result['items'] else 0.0
+        agreement = f"{result['agreement']:.1%}" if result['agreement'] is not None else "-"
+        lexicon_agreement = f"{result['lexicon_agreement']:.1%}" if result['lexicon_agreement'] is not None else "-"
+        duplicate_agreement = f"{result['duplicate_agreement']:.1%}" if result['duplicate_agreement'] is not None else "-"
+        print(f"{result['threshold']:>9.2f} {result['items']:>7} {result['decided']:>8} {share:>6.1%} "
+              f"{agreement:>6} {lexicon_agreement:>14} {result['duplicates']:>10} {duplicate_agreement:>9}")
@@ -0,0 +1,305 @@
+"""
+Compact columnar storage for analyzed data, loaded by memory-mapping.
+
+An analyzed data file is a single binary file with one section per column:
+
+    magic (8 bytes) | header length (8 bytes) | JSON header | sections, each 8-byte aligned
+
+Items are stored sorted by creation time. Timestamps, scores, sentiments and kinds
+are numeric arrays. Strings live in UTF-8 blobs addressed through offsets arrays:
+short ones (IDs, URLs, keywords) in `strings`, and post titles and comment bodies
+in a separate `texts` blob that is only paged in for the records a query returns.
+Keywords and parent bodies are interned, so each distinct value is stored once.
+Keywords per item are CSR-style: item i owns
+`keyword_refs[keyword_offsets[i]:keyword_offsets[i + 1]]`.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from storage.jsonl import JsonlWriter, iter_records
+from storage.records import created_at
+
+MAGIC = b"PSRCOL01"
+ALIGNMENT = 8
+NO_REF = -1
+KIND_COMMENT, KIND_POST = 0, 1
+
+# Column name -> array typecode
+COLUMNS = {
+    'timestamps': 'd',
+    'scores': 'q',
+    'sentiment_ids': 'B',
+    'kinds': 'B',
+    'id_refs': 'I',
+    'text_refs': 'I',
+    'parent_refs': 'i',
+    'url_refs': 'i',
+    'parent_id_refs': 'i',
+    'keyword_offsets': 'I',
+    'keyword_refs': 'I',
+    'string_offsets': 'Q',
+    'strings': 'B',
+    'text_offsets': 'Q',
+    'texts': 'B',
+}
+
+
+def columnar_path(path):
+    """The columnar artifact stored next to a JSON/JSONL data file"""
+    return Path(path).with_suffix(".columns")
+
+
+class StringTable:
+    """Accumulates strings into one UTF-8 blob, storing interned values once"""
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array('Q', [0])
+        self._interned = {}
+
+    def add(self, value):
+        self.blob += value.encode('utf-8')
+        self.offsets.append(len(self.blob))
+        return len(self.offsets) - 2
+
+    def intern(self, value):
+        ref = self._interned.get(value)
+        if ref is None:
+            ref = self._interned[value] = self.add(value)
+        return ref
+
+
+class ColumnarData:
+    """
+    Read-only analyzed data in columnar form
+
+    Columns are memoryviews, either over an mmapped file or over in-memory arrays, so
+    the numeric columns can be bisected and counted without building Python objects
+    per item. `record(i)` and iteration rebuild the original analyzed records.
+    """
+
+    def __init__(self, columns, sentiments, buffer=None):
+        """
+        Args:
+            columns (dict): Column name to a memoryview cast to the column's typecode
+            sentiments (list): Sentiment strings indexed by `sentiment_ids`
+            buffer: The mmap backing the columns, kept open for their lifetime
+        """
+        self.columns = columns
+        self.sentiments = sentiments
+        self.buffer = buffer
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.record(index)
+
+    def string(self, ref):
+        return str(self.strings[self.string_offsets[ref]:self.string_offsets[ref + 1]], 'utf-8')
+
+    def text(self, ref):
+        return str(self.texts[self.text_offsets[ref]:self.text_offsets[ref + 1]], 'utf-8')
+
+    def keywords(self, index):
+        return [self.string(ref) for ref in self.keyword_refs[self.keyword_offsets[index]:self.keyword_offsets[index + 1]]]
+
+    def record(self, index):
+        """Rebuilds item `index` as a record in the analyzed data format"""
+        record = {'id': self.string(self.id_refs[index]), 'created_utc': self.timestamps[index]}
+        if self.kinds[index] == KIND_POST:
+            record['title'] = self.text(self.text_refs[index])
+            record['url'] = self.string(self.url_refs[index])
+        else:
+            record['body'] = self.text(self.text_refs[index])
+            record['parent_body'] = self.text(self.parent_refs[index])
+            # Only comments from older analyzed files carry their parent ID
+            if self.parent_id_refs[index] != NO_REF:
+                record['parent_id'] = self.string(self.parent_id_refs[index])
+        record['score'] = self.scores[index]
+        record['sentiment'] = self.sentiments[self.sentiment_ids[index]]
+        record['keywords'] = self.keywords(index)
+        return record
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Builds the columns in memory from analyzed records
+
+        Raises:
+            ValueError: If there are more than 256 distinct sentiments
+            KeyError: If a record lacks a required field
+        """
+        strings = StringTable()
+        texts = StringTable()
+        sentiments = {}
+        blobs = ('string_offsets', 'strings', 'text_offsets', 'texts')
+        built = {name: array(typecode) for name, typecode in COLUMNS.items() if name not in blobs}
+        built['keyword_offsets'].append(0)
+
+        for record in records:
+            sentiment_id = sentiments.setdefault(record['sentiment'], len(sentiments))
+            if sentiment_id > 255:
+                raise ValueError("More than 256 distinct sentiments")
+            built['timestamps'].append(created_at(record))
+            built['scores'].append(record['score'])
+            built['sentiment_ids'].append(sentiment_id)
+            built['id_refs'].append(strings.add(record['id']))
+            if 'title' in record:
+                built['kinds'].append(KIND_POST)
+                built['text_refs'].append(texts.add(record['title']))
+                built['parent_refs'].append(NO_REF)
+                built['url_refs'].append(strings.add(record['url']))
+                built['parent_id_refs'].append(NO_REF)
+            else:
+                built['kinds'].append(KIND_COMMENT)
+                built['text_refs'].append(texts.add(record['body']))
+                built['parent_refs'].append(texts.intern(record['parent_body']))
+                built['url_refs'].append(NO_REF)
+                built['parent_id_refs'].append(strings.intern(record['parent_id']) if 'parent_id' in record else NO_REF)
+            built['keyword_refs'].extend(strings.intern(keyword) for keyword in record['keywords'])
+            built['keyword_offsets'].append(len(built['keyword_refs']))
+
+        # Reorder every per-item column by creation time; the sort is stable, so ties keep input order
+        order = sorted(range(len(built['timestamps'])), key=built['timestamps'].__getitem__)
+        columns = {}
+        for name in ('timestamps', 'scores', 'sentiment_ids', 'kinds', 'id_refs', 'text_refs', 'parent_refs', 'url_refs', 'parent_id_refs'):
+            column = built[name]
+            columns[name] = array(column.typecode, map(column.__getitem__, order))
+        offsets, refs = built['keyword_offsets'], built['keyword_refs']
+        columns['keyword_offsets'] = array('I', [0])
+        columns['keyword_refs'] = array('I')
+        for index in order:
+            columns['keyword_refs'].extend(refs[offsets[index]:offsets[index + 1]])
+            columns['keyword_offsets'].append(len(columns['keyword_refs']))
+        columns['string_offsets'] = strings.offsets
+        columns['strings'] = array('B', strings.blob)
+        columns['text_offsets'] = texts.offsets
+        columns['texts'] = array('B', texts.blob)
+
+        return cls({name: memoryview(column) for name, column in columns.items()}, list(sentiments))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-maps a columnar file; pages are read from disk only as they are touched
+
+        Raises:
+            ValueError: If the file is not a columnar data file or was written on a machine
+                of the other byte order
+        """
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            buffer.close()
+            raise ValueError(f"Not a columnar data file: {path}")
+        (header_length,) = struct.unpack_from('<Q', buffer, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(buffer[header_start:header_start + header_length])
+        if header['byteorder'] != sys.byteorder:
+            buffer.close()
+            raise ValueError(f"{path} was written with {header['byteorder']}-endian byte order")
+
+        view = memoryview(buffer)
+        columns = {
+            name: view[offset:offset + length].cast(COLUMNS[name])
+            for name, (offset, length) in header['sections'].items()
+        }
+        return cls(columns, header['sentiments'], buffer)
+
+    def save(self, path):
+        """Writes the columns to `path`, replacing it atomically"""
+        path = Path(path)
+        sections = {}
+        offset = 0
+        for name in COLUMNS:
+            length = self.columns[name].nbytes
+            sections[name] = [offset, length]
+            offset += -(-length // ALIGNMENT) * ALIGNMENT
+
+        def encoded_header(data_start):
+            return json.dumps({
+                'format': 1,
+                'byteorder': sys.byteorder,
+                'items': len(self),
+                'sentiments': self.sentiments,
+                'sections': {name: [data_start + start, length] for name, (start, length) in sections.items()},
+            }).encode('utf-8')
+
+        # The section offsets are absolute, so grow the data start until the header fits before it
+        prefix = len(MAGIC) + 8
+        data_start = prefix
+        while True:
+            header = encoded_header(data_start)
+            needed = -(-(prefix + len(header)) // ALIGNMENT) * ALIGNMENT
+            if needed <= data_start:
+                break
+            data_start = needed
+        header = header.ljust(data_start - prefix)
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for name in COLUMNS:
+                column = self.columns[name]
+                f.write(column)
+                f.write(b"\0" * (-column.nbytes % ALIGNMENT))
+        os.replace(tmp_path, path)
+
+
+def write_columnar(records, path):
+    """
+    Writes analyzed records as a columnar file
+
+    Returns:
+        int: Number of items written
+    """
+    data = ColumnarData.from_records(records)
+    data.save(path)
+    return len(data)
+
+
+def export_jsonl(path, jsonl_path):
+    """
+    Exports a columnar file as analyzed JSONL, in creation time order
+
+    Returns:
+        int: Number of records written
+    """
+    with JsonlWriter(jsonl_path) as writer:
+        return writer.write_all(ColumnarData.open(path))
+
+
+if __name__ == "__main__":
+    analyzed_file = Path(__file__).resolve().parents[2] / "data" / "analyzed" / "analyzed_reddit_data.jsonl"
+
+    parser = argparse.ArgumentParser(description="Build or export the columnar analyzed data file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the columnar file from analyzed JSON/JSONL")
+    build_parser.add_argument("source", nargs="?", type=Path, default=analyzed_file)
+    build_parser.add_argument("output", nargs="?", type=Path)
+    export_parser = subparsers.add_parser("export", help="Export the columnar file as analyzed JSONL")
+    export_parser.add_argument("source", nargs="?", type=Path, default=columnar_path(analyzed_file))
+    export_parser.add_argument("output", nargs="?", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        output = args.output or columnar_path(args.source)
+        count = write_columnar(iter_records(args.source), output)
+        print(f"Wrote {count} items from {args.source} to {output}")
+    else:
+        output = args.output or args.source.with_suffix(".export.jsonl")
+        count = export_jsonl(args.source, output)
+        print(f"Exported {count} items from {args.source} to {output}")
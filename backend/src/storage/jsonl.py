@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+
+def legacy_records(json_data):
+    """
+    Yields records from data in one of the pipeline's original JSON layouts
+
+    Handles a list of submissions or analyzed items, a single submission dict, and
+    the cleaner's {'post_titles': [...], 'comment_bodies': [...]} output, whose
+    entries are tagged with 'kind' as in processed JSONL files.
+    """
+    if isinstance(json_data, list):
+        yield from json_data
+    elif isinstance(json_data, dict) and 'post_titles' in json_data:
+        for post in json_data['post_titles']:
+            yield {'kind': 'post', **post}
+        for comment in json_data.get('comment_bodies', []):
+            yield {'kind': 'comment', **comment}
+    elif isinstance(json_data, dict):
+        yield json_data
+
+
+def resolve_path(path):
+    """
+    Returns `path`, or its legacy .json sibling if only that exists
+
+    Lets every stage read files written before the switch to JSONL.
+    """
+    path = Path(path)
+    legacy_path = path.with_suffix(".json")
+    if path.suffix == ".jsonl" and not path.exists() and legacy_path.exists():
+        return legacy_path
+    return path
+
+
+def iter_jsonl(path):
+    """
+    Streams records from a JSONL file, one line at a time
+
+    A trailing line cut short by a crash mid-write is skipped.
+
+    Args:
+        path (Path): The JSONL file
+
+    Yields:
+        dict: One record per non-empty line
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line {line_number} in {path}")
+
+
+def iter_records(path):
+    """
+    Streams records from a JSONL file, or from a legacy JSON file if that is what `path` resolves to
+
+    Legacy JSON files are parsed in one go; convert them with `convert_json_to_jsonl`
+    to get constant-memory reads.
+
+    Raises:
+        FileNotFoundError: If neither the file nor its legacy sibling exists
+        json.JSONDecodeError: If a legacy JSON file is invalid
+    """
+    path = resolve_path(path)
+    if path.suffix == ".jsonl":
+        yield from iter_jsonl(path)
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from legacy_records(json.load(f))
+
+
+def repair_tail(path, chunk_size=65536):
+    """
+    Cuts a JSONL file back to its last complete line
+
+    A crash mid-write leaves a line without its newline; a record appended after it
+    would be glued onto the fragment, and both lost to readers. The fragment itself
+    is never a whole record, so dropping it loses nothing that was written.
+
+    Args:
+        path (Path): The JSONL file; nothing is done if it does not exist
+
+    Returns:
+        int: Number of bytes cut off
+    """
+    try:
+        f = open(path, 'rb+')
+    except FileNotFoundError:
+        return 0
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            chunk = f.read(end - start)
+            if end == size and chunk.endswith(b"\n"):
+                return 0
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+        return size - end
+
+
+class JsonlWriter:
+    """
+    Writes records to a JSONL file, one line per record
+
+    In 'w' mode the records go to a temporary file that replaces `path` on a clean
+    close, so readers never see a half-written file. In 'a' mode a line left
+    incomplete by an earlier crash is cut off first, then each record is flushed as
+    it is written, and also fsynced when `durable` is set.
+    """
+
+    def __init__(self, path, mode='w', durable=False):
+        if mode not in ('w', 'a'):
+            raise ValueError(f"Unsupported mode: {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.durable = durable
+        self.count = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._target = self.path.with_name(self.path.name + ".tmp") if mode == 'w' else self.path
+        # Bytes of an incomplete last line cut off before appending
+        self.repaired = repair_tail(self.path) if mode == 'a' else 0
+        if self.repaired:
+            print(f"Cut an incomplete last line of {self.repaired} bytes from {self.path}")
+        self._file = open(self._target, mode, encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+        if self.mode == 'a':
+            self._file.flush()
+            if self.durable:
+                os.fsync(self._file.fileno())
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def close(self, commit=True):
+        self._file.close()
+        if self.mode == 'w':
+            if commit:
+                os.replace(self._target, self.path)
+            else:
+                self._target.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+
+
+def convert_json_to_jsonl(json_path, jsonl_path=None):
+    """
+    Converts a legacy JSON data file to JSONL
+
+    Args:
+        json_path (Path): The JSON file to convert
+        jsonl_path (Path): Output path, defaults to `json_path` with a .jsonl suffix
+
+    Returns:
+        int: Number of records written
+    """
+    json_path = Path(json_path)
+    jsonl_path = Path(jsonl_path) if jsonl_path else json_path.with_suffix(".jsonl")
+    with open(json_path, 'r', encoding='utf-8') as f:
+        json_data = json.load(f)
+    with JsonlWriter(jsonl_path) as writer:
+        return writer.write_all(legacy_records(json_data))
+
+
+if __name__ == "__main__":
+    backend_dir = Path(__file__).resolve().parents[2]
+    data_dir = backend_dir / "data"
+    default_files = [
+        data_dir / "raw" / "reddit_data.json",
+        data_dir / "processed" / "processed_reddit_data.json",
+        data_dir / "analyzed" / "analyzed_reddit_data.json",
+    ]
+
+    parser = argparse.ArgumentParser(description="Convert the pipeline's JSON data files to JSONL")
+    parser.add_argument("files", nargs="*", type=Path, default=default_files,
+                        help="JSON files to convert (defaults to the raw, processed and analyzed data)")
+    args = parser.parse_args()
+
+    for json_path in args.files:
+        if not json_path.exists():
+            print(f"Skipping {json_path}: file not found")
+            continue
+        count = convert_json_to_jsonl(json_path)
+        print(f"Converted {count} records from {json_path} to {json_path.with_suffix('.jsonl')}")
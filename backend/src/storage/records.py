@@ -0,0 +1,19 @@
+"""
+The key probing the stages share to read post and comment records.
+
+Records travel between the stages as JSON objects whose keys grew apart over time:
+the cleaner writes `created_UTC` and tags each record with its `kind`, the analyzer
+writes `created_utc` and tells posts by their `title`, and analyzed files from
+before that store `created_UTC` too. `is_post` and `created_at` read any of these
+layouts, so the probing happens here once.
+"""
+
+
+def is_post(record):
+    """Whether a processed record (tagged with 'kind') or an analyzed record (posts have a 'title') is a post"""
+    return record['kind'] == "post" if 'kind' in record else 'title' in record
+
+
+def created_at(record):
+    """The creation time of a record dict, stored as created_utc by the analyzer and as created_UTC elsewhere"""
+    return record['created_utc'] if 'created_utc' in record else record['created_UTC']
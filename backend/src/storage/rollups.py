@@ -0,0 +1,205 @@
+"""
+Time-bucketed sentiment rollups of the analyzed data, stored next to it.
+
+For each granularity (hour, day, week, month) the rollups hold, per UTC bucket and
+per stored sentiment, the number of items and their score weight: the sum of the
+items' scores, counting negative scores as 0. Weeks start on Monday.
+
+The analyzer adds each newly analyzed item to the rollups as it writes it, so a run
+costs time proportional to its new items rather than to the whole data; the rollups
+are only rebuilt from the data when they do not cover it. They are saved as
+`analyzed_reddit_data.rollups.json`, which the API loads instead of bucketing every
+item again.
+"""
+import argparse
+import calendar
+import json
+import os
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import compress, repeat
+from pathlib import Path
+
+from storage.columnar import ColumnarData
+from storage.records import created_at
+
+GRANULARITIES = ("hour", "day", "week", "month")
+HOUR = 3600
+DAY = 24 * HOUR
+# 1970-01-01 was a Thursday; weeks start on the Monday three days before the epoch
+WEEK_OFFSET = 3 * DAY
+
+
+def rollups_path(path):
+    """The rollups artifact stored next to a JSON/JSONL or columnar data file"""
+    return Path(path).with_suffix(".rollups.json")
+
+
+def bucket_start(timestamp, granularity):
+    """Unix timestamp of the start of the UTC bucket containing `timestamp`"""
+    if granularity == "hour":
+        return int(timestamp // HOUR) * HOUR
+    if granularity == "day":
+        return int(timestamp // DAY) * DAY
+    if granularity == "week":
+        return int((timestamp + WEEK_OFFSET) // (7 * DAY)) * 7 * DAY - WEEK_OFFSET
+    if granularity == "month":
+        moment = datetime.fromtimestamp(timestamp, timezone.utc)
+        return calendar.timegm((moment.year, moment.month, 1, 0, 0, 0))
+    raise ValueError(f"Unknown granularity: {granularity!r}")
+
+
+def bucket_end(start, granularity):
+    """Unix timestamp of the start of the bucket after the one starting at `start`"""
+    if granularity == "month":
+        moment = datetime.fromtimestamp(start, timezone.utc)
+        year, month = divmod(moment.year * 12 + moment.month, 12)
+        return calendar.timegm((year, month + 1, 1, 0, 0, 0))
+    return start + {"hour": HOUR, "day": DAY, "week": 7 * DAY}[granularity]
+
+
+def bucket_label(start, granularity):
+    """Readable UTC label of a bucket: the hour, the day, the Monday of a week, or the month"""
+    moment = datetime.fromtimestamp(start, timezone.utc)
+    if granularity == "hour":
+        return moment.strftime('%Y-%m-%d %H:00')
+    if granularity == "month":
+        return moment.strftime('%Y-%m')
+    return moment.strftime('%Y-%m-%d')
+
+
+def score_weight(score):
+    return max(int(score), 0)
+
+
+class Rollups:
+    """
+    Item counts and score weights per UTC time bucket and sentiment
+
+    `buckets[granularity][start][sentiment]` is a `[count, weight]` pair.
+    """
+
+    def __init__(self, buckets=None, items=0):
+        self.buckets = buckets or {granularity: {} for granularity in GRANULARITIES}
+        self.items = items
+
+    def add(self, timestamp, sentiment, score):
+        """Adds an item with the timestamp, sentiment and score to every granularity"""
+        weight = score_weight(score)
+        for granularity in GRANULARITIES:
+            totals = self.buckets[granularity].setdefault(bucket_start(timestamp, granularity), {})
+            pair = totals.setdefault(sentiment, [0, 0])
+            pair[0] += 1
+            pair[1] += weight
+        self.items += 1
+
+    def add_record(self, record):
+        """Adds an analyzed record, as written by the analyzer"""
+        self.add(created_at(record), record['sentiment'], record.get('score') or 0)
+
+    @classmethod
+    def from_columns(cls, data):
+        """
+        Builds the rollups of columnar data
+
+        Items are sorted by time, so each hour's items are found with a bisect and
+        counted per sentiment over their slice; the coarser granularities are then
+        summed from the hours.
+        """
+        timestamps, sentiment_ids = data.timestamps, data.sentiment_ids
+        n_items = len(data)
+        # Score weights of all items, negative scores counting as 0
+        weights = array('q', map(max, data.scores, repeat(0)))
+        hours = {}
+        index = 0
+        while index < n_items:
+            start = bucket_start(timestamps[index], "hour")
+            end = bisect_left(timestamps, start + HOUR, index)
+            ids = bytes(sentiment_ids[index:end])
+            hours[start] = {
+                data.sentiments[sentiment_id]: [
+                    ids.count(sentiment_id),
+                    sum(compress(weights[index:end], map(sentiment_id.__eq__, ids)))
+                ]
+                for sentiment_id in set(ids)
+            }
+            index = end
+
+        rollups = cls(items=n_items)
+        rollups.buckets["hour"] = hours
+        for granularity in GRANULARITIES[1:]:
+            buckets = rollups.buckets[granularity]
+            for start, totals in hours.items():
+                merged = buckets.setdefault(bucket_start(start, granularity), {})
+                for sentiment, (count, weight) in totals.items():
+                    pair = merged.setdefault(sentiment, [0, 0])
+                    pair[0] += count
+                    pair[1] += weight
+        return rollups
+
+    def to_dict(self):
+        return {
+            'format': 1,
+            'items': self.items,
+            'buckets': {
+                granularity: {str(start): totals for start, totals in sorted(buckets.items())}
+                for granularity, buckets in self.buckets.items()
+            },
+        }
+
+    def save(self, path):
+        """Writes the rollups to `path`, replacing it atomically"""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        buckets = {
+            granularity: {int(start): totals for start, totals in saved['buckets'].get(granularity, {}).items()}
+            for granularity in GRANULARITIES
+        }
+        return cls(buckets, saved['items'])
+
+
+def load_rollups(data_path, items=None):
+    """
+    Loads the rollups saved next to a data file, if they are up to date
+
+    Args:
+        data_path (Path): The data file the rollups were built from
+        items (int): Optional number of items in the data, which the rollups must cover
+
+    Returns:
+        Rollups: The rollups, or None if they are missing, older than the data file,
+            cover another number of items or cannot be read
+    """
+    path = rollups_path(data_path)
+    try:
+        if os.stat(path).st_mtime_ns < os.stat(data_path).st_mtime_ns:
+            return None
+        rollups = Rollups.load(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if items is not None and rollups.items != items:
+        return None
+    return rollups
+
+
+if __name__ == "__main__":
+    columns_file = Path(__file__).resolve().parents[2] / "data" / "analyzed" / "analyzed_reddit_data.columns"
+
+    parser = argparse.ArgumentParser(description="Rebuild the time-bucketed rollups of the columnar analyzed data")
+    parser.add_argument("input", type=Path, nargs="?", default=columns_file, help="Columnar analyzed data file")
+    args = parser.parse_args()
+
+    rollups = Rollups.from_columns(ColumnarData.open(args.input))
+    rollups.save(rollups_path(args.input))
+    print(f"Wrote rollups of {rollups.items} items to {rollups_path(args.input)}: " +
+          ", ".join(f"{len(rollups.buckets[granularity])} {granularity}s" for granularity in GRANULARITIES))
@@ -44,12 +44,15 @@ interface Post {
 interface TopPostsResponse {
   posts: Post[];
   total_posts: number;
+  next_cursor: string | null;
 }
 
 type Tab = 'sentiment' | 'keywords' | 'posts';
 type KeywordSentiment = 'all' | 'positive' | 'negative' | 'neutral';
 
 const BASE_URL = 'http://localhost:8000';
+const KEYWORD_CHART_SIZE = 20;
+const POSTS_PAGE_SIZE = 20;
 
 const MainPage = () => {
   const [loading, setLoading] = useState(false);
@@ -77,8 +80,8 @@ const MainPage = () => {
       setLoading(true);
       const sentimentToUse = sentiment || selectedSentiment;
       const url = sentimentToUse === 'all' 
-        ? `${BASE_URL}/keywords`
-        : `${BASE_URL}/keywords?sentiment=${sentimentToUse}`;
+        ? `${BASE_URL}/keywords?top_k=${KEYWORD_CHART_SIZE}`
+        : `${BASE_URL}/keywords?top_k=${KEYWORD_CHART_SIZE}&sentiment=${sentimentToUse}`;
       const response = await fetch(url);
       const data = await response.json();
       setKeywordData(data);
@@ -89,12 +92,18 @@ const MainPage = () => {
     }
   };
 
-  const fetchTopPosts = async () => {
+  const fetchTopPosts = async (cursor?: string) => {
     try {
       setLoading(true);
-      const response = await fetch(`${BASE_URL}/top-posts`);
-      const data = await response.json();
-      setTopPosts(data);
+      const url = cursor
+        ? `${BASE_URL}/top-posts?limit=${POSTS_PAGE_SIZE}&cursor=${encodeURIComponent(cursor)}`
+        : `${BASE_URL}/top-posts?limit=${POSTS_PAGE_SIZE}`;
+      const response = await fetch(url);
+      const data: TopPostsResponse = await response.json();
+      // Later pages are appended to the posts already shown
+      setTopPosts(previous => cursor && previous
+        ? { ...data, posts: [...previous.posts, ...data.posts] }
+        : data);
     } catch (error) {
       console.error('Error fetching top posts:', error);
     } finally {
@@ -235,7 +244,7 @@ const MainPage = () => {
               <div className="w-full h-[600px] mt-4">
                 <ResponsiveContainer width="100%" height="100%">
                   <BarChart
-                    data={keywordData.keywords.slice(0, 20)}
+                    data={keywordData.keywords.slice(0, KEYWORD_CHART_SIZE)}
                     margin={{
                       top: 20,
                       right: 30,
@@ -276,7 +285,7 @@ const MainPage = () => {
         return (
           <>
             <Button 
-              onClick={fetchTopPosts} 
+              onClick={() => fetchTopPosts()} 
               disabled={loading}
               className="mb-4"
             >
@@ -334,6 +343,16 @@ const MainPage = () => {
                     </div>
                   </div>
                 ))}
+                {topPosts.next_cursor && (
+                  <Button
+                    variant="outline"
+                    onClick={() => fetchTopPosts(topPosts.next_cursor!)}
+                    disabled={loading}
+                    className="w-full"
+                  >
+                    {loading ? "Loading..." : `Load More (${topPosts.posts.length} of ${topPosts.total_posts})`}
+                  </Button>
+                )}
               </div>
             )}
           </>
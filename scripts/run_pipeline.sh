@@ -15,24 +15,25 @@ log() {
 
 # Function to check if Ollama is running
 check_ollama() {
-    if ! pgrep -x "ollama" > /dev/null; then
+    if pgrep -x "ollama" > /dev/null; then
+        log "Ollama is already running"
+    elif [[ "$(uname)" == "Darwin" ]]; then
         log "Starting Ollama service..."
         open -a Ollama
         # Wait for Ollama to start
         sleep 5
+    elif command -v ollama > /dev/null; then
+        log "Starting Ollama service..."
+        ollama serve > /dev/null 2>&1 &
+        sleep 5
     else
-        log "Ollama is already running"
+        log "Ollama is not running locally; using OLLAMA_HOST/OLLAMA_HOSTS"
     fi
 }
 
-# Function to run a python script with Poetry
-run_python_script() {
-    local dir=$1
-    local script=$2
-    log "Running $script in $dir"
-    cd "$BACKEND_DIR"
-    
-    # Export environment variables by reading the file
+# Export environment variables once, by reading the file
+load_env() {
+    [[ -f "$BACKEND_DIR/.env" ]] || return 0
     while IFS='=' read -r key value; do
         # Skip empty lines and comments
         [[ $key =~ ^[[:space:]]*$ ]] || [[ $key =~ ^# ]] && continue
@@ -40,13 +41,6 @@ run_python_script() {
         value=$(echo "$value" | tr -d '"'"'")
         export "$key=$value"
     done < "$BACKEND_DIR/.env"
-    
-    if poetry run python "src/$dir/$script"; then
-        log "Successfully completed $script"
-    else
-        log "Error running $script"
-        exit 1
-    fi
 }
 
 # Main pipeline
@@ -57,19 +51,22 @@ log "Setting up Poetry environment"
 cd "$BACKEND_DIR"
 poetry install --no-root # Skip installing the project itself
 
-# Step 2: Scrape Reddit data
-log "Scraping Reddit data"
-run_python_script "scraping" "reddit_scraper.py"
-
-# Step 3: Process Reddit data
-log "Processing Reddit data"
-run_python_script "processing" "data_cleaner.py"
-
-# Step 4: Ensure Ollama is running and run sentiment analysis
-log "Checking Ollama service"
-check_ollama
+load_env
+# Make the src packages importable from each stage
+export PYTHONPATH="$BACKEND_DIR/src"
 
-log "Running sentiment analysis"
-run_python_script "sentiment_analysis" "sentiment_analyzer.py"
+# Step 2: Ensure Ollama is running, unless the analyze stage is skipped
+if [[ "$*" != *"--stages"* ]] || [[ "$*" == *"analyze"* ]]; then
+    log "Checking Ollama service"
+    check_ollama
+fi
 
-log "Reddit data analysis pipeline completed successfully"
+# Step 3: Scrape, clean and analyze as one streaming pipeline; arguments such as
+# --stages clean,analyze or --since 2024-01-01 are passed through
+log "Running pipeline"
+if poetry run python src/pipeline/orchestrator.py "$@"; then
+    log "Reddit data analysis pipeline completed successfully"
+else
+    log "Error running pipeline"
+    exit 1
+fi